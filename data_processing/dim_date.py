@@ -1,6 +1,6 @@
 import pandas as pd
 from datetime import datetime, timedelta
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, text
 
 import os
 from dotenv import load_dotenv
@@ -17,20 +17,31 @@ db_url = f"postgresql://{PG_USER}:{PG_PASSWORD}@{PG_HOST}:{PG_PORT}/{PG_DB}"
 engine = create_engine(db_url)
 
 
-# Config
-start_date = datetime(2020, 1, 1)
-end_date = datetime(2030, 12, 31)
+# Config. Migration 0012 already fills 2015-2035 and the capacity rollup extends it to
+# sprint start dates (extend_dim_date(), migration 0018); run this to extend it further.
+start_date = datetime(2015, 1, 1)
+end_date = datetime(2035, 12, 31)
 dates = pd.date_range(start=start_date, end=end_date)
 
 df = pd.DataFrame({"date": dates})
+df["date_key"] = df["date"].dt.year * 10000 + df["date"].dt.month * 100 + df["date"].dt.day
 df["full_date"] = df["date"].dt.strftime("%Y-%m-%d")
 df["year"] = df["date"].dt.year
 df["quarter"] = df["date"].dt.quarter
 df["month"] = df["date"].dt.month
+df["iso_year"] = df["date"].dt.isocalendar().year
 df["week"] = df["date"].dt.isocalendar().week
 df["day"] = df["date"].dt.day
 df["day_name"] = df["date"].dt.day_name()
 
-# PostgreSQL connection
-df.to_sql("dim_date", engine, index=False, if_exists="replace")
-print("✅ dim_date created")
+# Insert only missing days: dim_date is keyed on date_key and the facts join on it,
+# so the table is never replaced.
+with engine.begin() as conn:
+    df.drop(columns="date").to_sql("dim_date_load", conn, index=False, if_exists="replace")
+    added = conn.execute(text("""
+        INSERT INTO dim_date (date_key, full_date, year, quarter, month, iso_year, week, day, day_name)
+        SELECT date_key, full_date, year, quarter, month, iso_year, week, day, day_name FROM dim_date_load
+        ON CONFLICT (date_key) DO NOTHING
+    """)).rowcount
+    conn.execute(text("DROP TABLE dim_date_load"))
+print(f"✅ dim_date updated ({added} days added)")
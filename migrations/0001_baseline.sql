@@ -0,0 +1,101 @@
+-- Baseline schema for the tables the pages read and write.
+-- Uses IF NOT EXISTS so it can be applied to databases created before migrations existed.
+
+CREATE TABLE IF NOT EXISTS app_users (
+    email TEXT PRIMARY KEY,
+    username TEXT NOT NULL,
+    password TEXT NOT NULL,
+    role TEXT NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS dim_user (
+    user_name TEXT PRIMARY KEY
+);
+
+CREATE TABLE IF NOT EXISTS dim_status (
+    status_name TEXT PRIMARY KEY
+);
+
+CREATE TABLE IF NOT EXISTS workflow (
+    workflow_id SERIAL PRIMARY KEY,
+    workflow_name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE IF NOT EXISTS workflow_status (
+    status_id SERIAL PRIMARY KEY,
+    workflow_id INTEGER NOT NULL REFERENCES workflow (workflow_id) ON DELETE CASCADE,
+    status_name TEXT NOT NULL,
+    done_ratio NUMERIC(4, 2) NOT NULL DEFAULT 0,
+    UNIQUE (workflow_id, status_name)
+);
+
+CREATE TABLE IF NOT EXISTS dim_project (
+    project_key TEXT PRIMARY KEY,
+    project_name TEXT,
+    total_mm NUMERIC,
+    project_type TEXT,
+    scope TEXT,
+    owner TEXT,
+    status TEXT,
+    start_date DATE,
+    end_date DATE,
+    is_deleted BOOLEAN NOT NULL DEFAULT FALSE,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE TABLE IF NOT EXISTS dim_sprint (
+    sprint_name TEXT NOT NULL,
+    project_key TEXT NOT NULL,
+    status TEXT,
+    start_date DATE,
+    end_date DATE,
+    PRIMARY KEY (sprint_name, project_key)
+);
+
+CREATE TABLE IF NOT EXISTS sprint_info (
+    sprint_name TEXT NOT NULL,
+    project_key TEXT NOT NULL,
+    sprint_capacity INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (sprint_name, project_key)
+);
+
+CREATE TABLE IF NOT EXISTS fact_pcv_metrics (
+    pcv_id SERIAL PRIMARY KEY,
+    project_key TEXT NOT NULL,
+    pcv_score NUMERIC(5, 2) NOT NULL,
+    assessment_date DATE NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS dim_date (
+    full_date TEXT,
+    year INTEGER,
+    quarter INTEGER,
+    month INTEGER,
+    week INTEGER,
+    day INTEGER,
+    day_name TEXT
+);
+
+CREATE TABLE IF NOT EXISTS fact_deals (
+    deal_name TEXT,
+    project_type TEXT,
+    deal_amount DOUBLE PRECISION,
+    deal_received_date TIMESTAMP,
+    proposal_sent_date TIMESTAMP,
+    pending_date TIMESTAMP,
+    lost_date TIMESTAMP,
+    won_date TIMESTAMP,
+    division TEXT,
+    division_1_pct TEXT,
+    division_2_pct TEXT,
+    reasons TEXT,
+    status TEXT,
+    month DOUBLE PRECISION,
+    week DOUBLE PRECISION,
+    day DOUBLE PRECISION,
+    quarter DOUBLE PRECISION,
+    year DOUBLE PRECISION
+);
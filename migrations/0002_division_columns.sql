@@ -0,0 +1,43 @@
+-- Division becomes a real column on PCV assessments (pcv_utils no longer probes for it)
+-- and on projects (used by the sprint capacity rollup).
+
+ALTER TABLE fact_pcv_metrics ADD COLUMN IF NOT EXISTS division TEXT;
+UPDATE fact_pcv_metrics SET division = 'Division 1' WHERE division IS NULL;
+ALTER TABLE fact_pcv_metrics ALTER COLUMN division SET DEFAULT 'Division 1';
+ALTER TABLE fact_pcv_metrics ALTER COLUMN division SET NOT NULL;
+
+-- Keep the oldest assessment when legacy rows collide, then enforce uniqueness
+-- for the bulk importer's ON CONFLICT target. The other rows are moved, not dropped:
+-- they stay in fact_pcv_metrics_duplicates (with the pcv_id that was kept) for an
+-- operator to review or restore.
+CREATE TABLE IF NOT EXISTS fact_pcv_metrics_duplicates AS
+SELECT f.*, kept.pcv_id AS kept_pcv_id, NOW() AS moved_at
+FROM fact_pcv_metrics f
+JOIN (
+    SELECT project_key, division, assessment_date, MIN(pcv_id) AS pcv_id
+    FROM fact_pcv_metrics
+    GROUP BY project_key, division, assessment_date
+    HAVING COUNT(*) > 1
+) kept ON kept.project_key = f.project_key
+      AND kept.division = f.division
+      AND kept.assessment_date = f.assessment_date
+WHERE f.pcv_id > kept.pcv_id;
+
+DELETE FROM fact_pcv_metrics
+WHERE pcv_id IN (SELECT pcv_id FROM fact_pcv_metrics_duplicates);
+
+DO $$
+DECLARE
+    moved INTEGER;
+BEGIN
+    SELECT COUNT(*) INTO moved FROM fact_pcv_metrics_duplicates;
+    IF moved > 0 THEN
+        RAISE NOTICE '% duplicate PCV assessment(s) moved to fact_pcv_metrics_duplicates', moved;
+    END IF;
+END;
+$$;
+
+CREATE UNIQUE INDEX IF NOT EXISTS ux_fact_pcv_metrics_project_division_date
+    ON fact_pcv_metrics (project_key, division, assessment_date);
+
+ALTER TABLE dim_project ADD COLUMN IF NOT EXISTS division TEXT;
@@ -0,0 +1,18 @@
+-- Indexes for the queries in utils.migrations.HOT_QUERIES.
+
+-- 0001 only creates app_users if it is missing, so an older table may lack its email
+-- primary key; lookups by email and the app_sessions foreign key (0013) need this index.
+CREATE UNIQUE INDEX IF NOT EXISTS ix_app_users_email
+    ON app_users (email);
+
+CREATE INDEX IF NOT EXISTS ix_fact_pcv_metrics_project_date
+    ON fact_pcv_metrics (project_key, assessment_date DESC);
+
+CREATE INDEX IF NOT EXISTS ix_dim_project_owner_active
+    ON dim_project (owner) WHERE is_deleted = FALSE;
+
+CREATE INDEX IF NOT EXISTS ix_sprint_info_project_key
+    ON sprint_info (project_key);
+
+CREATE INDEX IF NOT EXISTS ix_dim_date_full_date
+    ON dim_date (full_date);
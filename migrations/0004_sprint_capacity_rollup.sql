@@ -0,0 +1,37 @@
+-- Capacity rollup maintained by utils.sprint_rollup.refresh_capacity_rollup.
+
+CREATE TABLE IF NOT EXISTS agg_sprint_capacity (
+    project_key TEXT NOT NULL,
+    division TEXT NOT NULL,
+    period_type TEXT NOT NULL,
+    period_year INTEGER NOT NULL,
+    period_num INTEGER NOT NULL,
+    sprint_count INTEGER NOT NULL,
+    total_capacity NUMERIC NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (project_key, division, period_type, period_year, period_num)
+);
+
+-- One-time backfill; afterwards the rollup is maintained per project on every sprint write.
+INSERT INTO agg_sprint_capacity
+    (project_key, division, period_type, period_year, period_num, sprint_count, total_capacity)
+SELECT
+    s.project_key,
+    COALESCE(p.division, 'Division 1'),
+    per.period_type,
+    per.period_year,
+    per.period_num,
+    COUNT(*),
+    SUM(COALESCE(s.sprint_capacity, 0))
+FROM sprint_info s
+JOIN dim_sprint ds ON ds.sprint_name = s.sprint_name AND ds.project_key = s.project_key
+JOIN dim_project p ON p.project_key = s.project_key
+JOIN dim_date dd ON dd.full_date = TO_CHAR(CAST(ds.start_date AS date), 'YYYY-MM-DD')
+CROSS JOIN LATERAL (
+    VALUES ('week', dd.year, dd.week),
+           ('month', dd.year, dd.month),
+           ('quarter', dd.year, dd.quarter)
+) AS per(period_type, period_year, period_num)
+GROUP BY s.project_key, COALESCE(p.division, 'Division 1'),
+         per.period_type, per.period_year, per.period_num
+ON CONFLICT DO NOTHING;
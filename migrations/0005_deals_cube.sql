@@ -0,0 +1,28 @@
+-- Presales rollup cube rebuilt by utils.presales_utils.refresh_deals_cube on each import.
+
+CREATE TABLE IF NOT EXISTS agg_deals_cube (
+    year INTEGER,
+    quarter INTEGER,
+    month INTEGER,
+    week INTEGER,
+    division TEXT,
+    status TEXT,
+    project_type TEXT,
+    deal_count INTEGER NOT NULL,
+    total_amount NUMERIC NOT NULL,
+    refreshed_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+INSERT INTO agg_deals_cube
+    (year, quarter, month, week, division, status, project_type, deal_count, total_amount)
+SELECT
+    year, quarter, month, week,
+    COALESCE(division, 'Unassigned'),
+    status,
+    COALESCE(project_type, 'Other'),
+    COUNT(*),
+    COALESCE(SUM(deal_amount), 0)
+FROM fact_deals
+WHERE NOT EXISTS (SELECT 1 FROM agg_deals_cube)
+GROUP BY year, quarter, month, week,
+         COALESCE(division, 'Unassigned'), status, COALESCE(project_type, 'Other');
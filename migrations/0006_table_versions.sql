@@ -0,0 +1,39 @@
+-- Change counters for the small, frequently listed tables; read by utils.snapshot_cache.
+-- A statement-level trigger bumps the counter once per writing statement, so revalidating
+-- a cached list costs a single primary-key lookup instead of re-reading the table.
+
+CREATE TABLE IF NOT EXISTS table_versions (
+    table_name TEXT PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    changed_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE OR REPLACE FUNCTION bump_table_version() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO table_versions (table_name, version, changed_at)
+    VALUES (TG_TABLE_NAME, 1, NOW())
+    ON CONFLICT (table_name) DO UPDATE
+    SET version = table_versions.version + 1,
+        changed_at = NOW();
+    RETURN NULL;
+END;
+$$;
+
+DO $$
+DECLARE
+    t TEXT;
+BEGIN
+    FOREACH t IN ARRAY ARRAY[
+        'app_users', 'dim_user', 'dim_status', 'workflow', 'workflow_status',
+        'dim_project', 'dim_sprint', 'sprint_info'
+    ]
+    LOOP
+        EXECUTE 'DROP TRIGGER IF EXISTS trg_' || t || '_version ON ' || quote_ident(t);
+        EXECUTE 'CREATE TRIGGER trg_' || t || '_version'
+             || ' AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON ' || quote_ident(t)
+             || ' FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version()';
+        INSERT INTO table_versions (table_name) VALUES (t) ON CONFLICT DO NOTHING;
+    END LOOP;
+END;
+$$;
@@ -0,0 +1,59 @@
+-- Support for incremental refresh of fact_pcv_metrics and dim_project (utils.delta_cache).
+
+-- Every update stamps updated_at, whichever statement made it.
+CREATE OR REPLACE FUNCTION touch_updated_at() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    NEW.updated_at = NOW();
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_fact_pcv_metrics_touch ON fact_pcv_metrics;
+CREATE TRIGGER trg_fact_pcv_metrics_touch BEFORE UPDATE ON fact_pcv_metrics
+    FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
+
+DROP TRIGGER IF EXISTS trg_dim_project_touch ON dim_project;
+CREATE TRIGGER trg_dim_project_touch BEFORE UPDATE ON dim_project
+    FOR EACH ROW EXECUTE FUNCTION touch_updated_at();
+
+CREATE INDEX IF NOT EXISTS ix_fact_pcv_metrics_updated_at ON fact_pcv_metrics (updated_at);
+CREATE INDEX IF NOT EXISTS ix_dim_project_updated_at ON dim_project (updated_at);
+
+-- Hard deletes leave a tombstone so caches can drop the row; kept for 7 days.
+CREATE TABLE IF NOT EXISTS row_tombstones (
+    table_name TEXT NOT NULL,
+    row_key TEXT NOT NULL,
+    deleted_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS ix_row_tombstones_table_deleted
+    ON row_tombstones (table_name, deleted_at);
+
+-- TG_ARGV[0] names the key column.
+CREATE OR REPLACE FUNCTION record_tombstone() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO row_tombstones (table_name, row_key)
+    SELECT TG_TABLE_NAME, to_jsonb(o) ->> TG_ARGV[0] FROM old_rows o;
+    DELETE FROM row_tombstones WHERE deleted_at < NOW() - INTERVAL '7 days';
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_fact_pcv_metrics_tombstone ON fact_pcv_metrics;
+CREATE TRIGGER trg_fact_pcv_metrics_tombstone AFTER DELETE ON fact_pcv_metrics
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_tombstone('pcv_id');
+
+DROP TRIGGER IF EXISTS trg_dim_project_tombstone ON dim_project;
+CREATE TRIGGER trg_dim_project_tombstone AFTER DELETE ON dim_project
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION record_tombstone('project_key');
+
+-- Change counter (see 0006) so an unchanged table costs one lookup per refresh.
+DROP TRIGGER IF EXISTS trg_fact_pcv_metrics_version ON fact_pcv_metrics;
+CREATE TRIGGER trg_fact_pcv_metrics_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON fact_pcv_metrics
+    FOR EACH STATEMENT EXECUTE FUNCTION bump_table_version();
+INSERT INTO table_versions (table_name) VALUES ('fact_pcv_metrics') ON CONFLICT DO NOTHING;
@@ -0,0 +1,15 @@
+-- Audit trail written in batches by utils.audit.
+
+CREATE TABLE IF NOT EXISTS audit_log (
+    audit_id BIGSERIAL PRIMARY KEY,
+    changed_at TIMESTAMP NOT NULL,
+    actor TEXT NOT NULL,
+    table_name TEXT NOT NULL,
+    row_key TEXT NOT NULL,
+    action TEXT NOT NULL,
+    before JSONB,
+    after JSONB
+);
+
+CREATE INDEX IF NOT EXISTS ix_audit_log_table_key ON audit_log (table_name, row_key, changed_at DESC);
+CREATE INDEX IF NOT EXISTS ix_audit_log_changed_at ON audit_log (changed_at);
@@ -0,0 +1,17 @@
+-- Background import jobs run by utils.jobs.
+
+CREATE TABLE IF NOT EXISTS import_jobs (
+    job_id BIGSERIAL PRIMARY KEY,
+    kind TEXT NOT NULL,
+    file_name TEXT,
+    submitted_by TEXT,
+    status TEXT NOT NULL DEFAULT 'queued',
+    progress NUMERIC NOT NULL DEFAULT 0,
+    message TEXT,
+    rows_loaded INTEGER,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    started_at TIMESTAMP,
+    finished_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_import_jobs_status ON import_jobs (status) WHERE status IN ('queued', 'running');
@@ -0,0 +1,66 @@
+-- Presales imports merge on deal_name (utils.presales_etl.load_deals) instead of appending.
+
+-- Rows without a name cannot be merged, and earlier imports appended duplicates. Both
+-- are moved to fact_deals_removed (with the reason) for an operator to review or restore.
+-- fact_deals has no id or update time; of each name the copy with the latest activity
+-- (the most recent of its stage dates, then its period) is kept, physical order only
+-- breaking exact ties.
+CREATE TABLE IF NOT EXISTS fact_deals_removed AS
+SELECT f.*, CAST(NULL AS TEXT) AS reason, NOW() AS moved_at
+FROM fact_deals f
+WITH NO DATA;
+
+CREATE TEMPORARY TABLE fact_deals_ranked ON COMMIT DROP AS
+SELECT ctid AS row_id,
+       ROW_NUMBER() OVER (
+           PARTITION BY deal_name
+           ORDER BY GREATEST(won_date, lost_date, pending_date, proposal_sent_date, deal_received_date)
+                        DESC NULLS LAST,
+                    year DESC NULLS LAST, month DESC NULLS LAST, day DESC NULLS LAST,
+                    ctid DESC
+       ) AS copy
+FROM fact_deals
+WHERE deal_name IS NOT NULL;
+
+INSERT INTO fact_deals_removed
+SELECT f.*, 'no deal name', NOW() FROM fact_deals f WHERE f.deal_name IS NULL;
+INSERT INTO fact_deals_removed
+SELECT f.*, 'older duplicate', NOW()
+FROM fact_deals f JOIN fact_deals_ranked r ON r.row_id = f.ctid
+WHERE r.copy > 1;
+
+DELETE FROM fact_deals WHERE deal_name IS NULL;
+DELETE FROM fact_deals
+WHERE ctid IN (SELECT row_id FROM fact_deals_ranked WHERE copy > 1);
+
+DO $$
+DECLARE
+    unnamed INTEGER;
+    duplicates INTEGER;
+BEGIN
+    SELECT COUNT(*) FILTER (WHERE reason = 'no deal name'), COUNT(*) FILTER (WHERE reason = 'older duplicate')
+    INTO unnamed, duplicates
+    FROM fact_deals_removed;
+    IF unnamed + duplicates > 0 THEN
+        RAISE NOTICE '% unnamed and % duplicate deal(s) moved to fact_deals_removed', unnamed, duplicates;
+    END IF;
+END;
+$$;
+
+ALTER TABLE fact_deals ALTER COLUMN deal_name SET NOT NULL;
+CREATE UNIQUE INDEX IF NOT EXISTS ux_fact_deals_deal_name ON fact_deals (deal_name);
+
+-- Rebuild the cube from the de-duplicated facts.
+DELETE FROM agg_deals_cube;
+INSERT INTO agg_deals_cube
+    (year, quarter, month, week, division, status, project_type, deal_count, total_amount)
+SELECT
+    year, quarter, month, week,
+    COALESCE(division, 'Unassigned'),
+    status,
+    COALESCE(project_type, 'Other'),
+    COUNT(*),
+    COALESCE(SUM(deal_amount), 0)
+FROM fact_deals
+GROUP BY year, quarter, month, week,
+         COALESCE(division, 'Unassigned'), status, COALESCE(project_type, 'Other');
@@ -0,0 +1,14 @@
+-- Rows an import rejected during validation, kept per job for download.
+
+ALTER TABLE import_jobs ADD COLUMN IF NOT EXISTS rows_rejected INTEGER;
+
+CREATE TABLE IF NOT EXISTS import_rejects (
+    job_id BIGINT NOT NULL REFERENCES import_jobs (job_id) ON DELETE CASCADE,
+    file_name TEXT,
+    sheet TEXT,
+    row_number INTEGER,
+    reject_reasons TEXT NOT NULL,
+    row_data JSONB NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_import_rejects_job ON import_rejects (job_id);
@@ -0,0 +1,62 @@
+-- Integer yyyymmdd surrogate keys joining the fact tables to dim_date.
+-- Period attributes (year, quarter, month, ISO week, day) live only in dim_date;
+-- facts store a date_key and analytics join on it.
+
+CREATE OR REPLACE FUNCTION date_key(d date) RETURNS integer
+LANGUAGE sql IMMUTABLE PARALLEL SAFE RETURNS NULL ON NULL INPUT
+AS $$
+    SELECT CAST(EXTRACT(YEAR FROM d) * 10000 + EXTRACT(MONTH FROM d) * 100 + EXTRACT(DAY FROM d) AS integer)
+$$;
+
+-- dim_date: rebuild with date_key as primary key. Rows loaded by
+-- data_processing/dim_date.py are regenerated, so the calendar is the same.
+DROP TABLE IF EXISTS dim_date;
+CREATE TABLE dim_date (
+    date_key INTEGER PRIMARY KEY,
+    full_date TEXT NOT NULL,
+    year INTEGER NOT NULL,
+    quarter INTEGER NOT NULL,
+    month INTEGER NOT NULL,
+    week INTEGER NOT NULL,
+    day INTEGER NOT NULL,
+    day_name TEXT NOT NULL
+);
+
+INSERT INTO dim_date (date_key, full_date, year, quarter, month, week, day, day_name)
+SELECT
+    date_key(CAST(d AS date)),
+    TO_CHAR(d, 'YYYY-MM-DD'),
+    EXTRACT(YEAR FROM d),
+    EXTRACT(QUARTER FROM d),
+    EXTRACT(MONTH FROM d),
+    EXTRACT(WEEK FROM d),
+    EXTRACT(DAY FROM d),
+    TRIM(TO_CHAR(d, 'Day'))
+FROM generate_series(DATE '2015-01-01', DATE '2035-12-31', INTERVAL '1 day') AS d;
+
+CREATE INDEX IF NOT EXISTS ix_dim_date_full_date ON dim_date (full_date);
+
+-- PCV assessments and sprints: keys derived from the existing DATE columns, so the
+-- writers are unchanged.
+ALTER TABLE fact_pcv_metrics
+    ADD COLUMN IF NOT EXISTS assessment_date_key INTEGER GENERATED ALWAYS AS (date_key(assessment_date)) STORED;
+CREATE INDEX IF NOT EXISTS ix_fact_pcv_metrics_assessment_date_key ON fact_pcv_metrics (assessment_date_key);
+
+ALTER TABLE dim_sprint
+    ADD COLUMN IF NOT EXISTS start_date_key INTEGER GENERATED ALWAYS AS (date_key(start_date)) STORED,
+    ADD COLUMN IF NOT EXISTS end_date_key INTEGER GENERATED ALWAYS AS (date_key(end_date)) STORED;
+CREATE INDEX IF NOT EXISTS ix_dim_sprint_start_date_key ON dim_sprint (start_date_key);
+
+-- Deals: the period date (the deal date closest to the import) becomes a key; the
+-- decomposed month/week/day/quarter/year columns are dropped.
+ALTER TABLE fact_deals ADD COLUMN IF NOT EXISTS period_date_key INTEGER;
+UPDATE fact_deals
+SET period_date_key = CAST(year * 10000 + month * 100 + day AS integer)
+WHERE year IS NOT NULL AND month IS NOT NULL AND day IS NOT NULL;
+ALTER TABLE fact_deals
+    DROP COLUMN IF EXISTS month,
+    DROP COLUMN IF EXISTS week,
+    DROP COLUMN IF EXISTS day,
+    DROP COLUMN IF EXISTS quarter,
+    DROP COLUMN IF EXISTS year;
+CREATE INDEX IF NOT EXISTS ix_fact_deals_period_date_key ON fact_deals (period_date_key);
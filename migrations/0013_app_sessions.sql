@@ -0,0 +1,11 @@
+-- Server-side login sessions (utils.sessions). The browser only holds a signed session id.
+
+CREATE TABLE IF NOT EXISTS app_sessions (
+    session_id TEXT PRIMARY KEY,
+    email TEXT NOT NULL REFERENCES app_users (email) ON DELETE CASCADE,
+    created_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    expires_at TIMESTAMP NOT NULL,
+    revoked_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS ix_app_sessions_email ON app_sessions (email) WHERE revoked_at IS NULL;
@@ -0,0 +1,58 @@
+-- Workflow-weighted progress maintained by utils.progress.refresh_progress.
+-- Each sprint counts as done by the done_ratio its status has in the project's workflow
+-- (dim_project.scope names the workflow); projects weight their sprints by capacity.
+
+CREATE TABLE IF NOT EXISTS agg_sprint_progress (
+    project_key TEXT NOT NULL,
+    sprint_name TEXT NOT NULL,
+    workflow_id INTEGER,
+    status TEXT,
+    -- NULL when the status is not part of the project's workflow.
+    done_ratio NUMERIC(4, 2),
+    capacity INTEGER NOT NULL,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (project_key, sprint_name)
+);
+
+CREATE TABLE IF NOT EXISTS agg_project_progress (
+    project_key TEXT PRIMARY KEY,
+    workflow_id INTEGER,
+    sprints INTEGER NOT NULL,
+    unmapped_sprints INTEGER NOT NULL,
+    total_capacity NUMERIC NOT NULL,
+    done_capacity NUMERIC NOT NULL,
+    done_ratio NUMERIC,
+    updated_at TIMESTAMP NOT NULL DEFAULT NOW()
+);
+
+-- Finds the projects that follow a workflow when its ratios change.
+CREATE INDEX IF NOT EXISTS idx_dim_project_scope_active
+    ON dim_project (scope) WHERE is_deleted = FALSE;
+
+-- One-time backfill; afterwards rows are refreshed per project on every relevant write.
+INSERT INTO agg_sprint_progress (project_key, sprint_name, workflow_id, status, done_ratio, capacity)
+SELECT ds.project_key, ds.sprint_name, w.workflow_id, ds.status, ws.done_ratio,
+       COALESCE(si.sprint_capacity, 0)
+FROM dim_sprint ds
+JOIN dim_project p ON p.project_key = ds.project_key AND p.is_deleted = FALSE
+LEFT JOIN workflow w ON w.workflow_name = p.scope
+LEFT JOIN workflow_status ws ON ws.workflow_id = w.workflow_id AND ws.status_name = ds.status
+LEFT JOIN sprint_info si ON si.sprint_name = ds.sprint_name AND si.project_key = ds.project_key
+ON CONFLICT DO NOTHING;
+
+INSERT INTO agg_project_progress
+    (project_key, workflow_id, sprints, unmapped_sprints, total_capacity, done_capacity, done_ratio)
+SELECT p.project_key, w.workflow_id,
+       COUNT(sp.sprint_name),
+       COUNT(sp.sprint_name) - COUNT(sp.done_ratio),
+       COALESCE(SUM(sp.capacity), 0),
+       COALESCE(SUM(sp.capacity * COALESCE(sp.done_ratio, 0)), 0),
+       CASE WHEN SUM(sp.capacity) > 0
+            THEN SUM(sp.capacity * COALESCE(sp.done_ratio, 0)) / SUM(sp.capacity)
+            ELSE AVG(COALESCE(sp.done_ratio, 0)) END
+FROM dim_project p
+LEFT JOIN workflow w ON w.workflow_name = p.scope
+LEFT JOIN agg_sprint_progress sp ON sp.project_key = p.project_key
+WHERE p.is_deleted = FALSE
+GROUP BY p.project_key, w.workflow_id
+ON CONFLICT DO NOTHING;
@@ -0,0 +1,8 @@
+-- Liveness of import jobs. The server process that submitted a job bumps heartbeat_at
+-- while the job is queued or running; utils.jobs fails only jobs whose heartbeat went
+-- stale, so starting one replica no longer fails the jobs other replicas are running.
+
+ALTER TABLE import_jobs ADD COLUMN IF NOT EXISTS heartbeat_at TIMESTAMP;
+UPDATE import_jobs SET heartbeat_at = COALESCE(started_at, created_at)
+WHERE heartbeat_at IS NULL AND status IN ('queued', 'running');
+ALTER TABLE import_jobs ALTER COLUMN heartbeat_at SET DEFAULT NOW();
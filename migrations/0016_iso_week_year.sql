@@ -0,0 +1,133 @@
+-- ISO weeks belong to an ISO year: 2024-12-30 is in week 1 of 2025 and 2021-01-01 is in
+-- week 53 of 2020. dim_date gains iso_year and week buckets use it instead of year.
+-- The capacity rollup moves into refresh_capacity_rollup(), which utils.sprint_rollup
+-- and the triggers below share, so it also follows dim_sprint dates and project divisions.
+
+ALTER TABLE dim_date ADD COLUMN IF NOT EXISTS iso_year INTEGER;
+UPDATE dim_date SET iso_year = EXTRACT(ISOYEAR FROM CAST(full_date AS date)) WHERE iso_year IS NULL;
+ALTER TABLE dim_date ALTER COLUMN iso_year SET NOT NULL;
+
+ALTER TABLE agg_deals_cube ADD COLUMN IF NOT EXISTS iso_year INTEGER;
+DELETE FROM agg_deals_cube;
+INSERT INTO agg_deals_cube
+    (year, quarter, month, iso_year, week, division, status, project_type, deal_count, total_amount)
+SELECT
+    dd.year, dd.quarter, dd.month, dd.iso_year, dd.week,
+    COALESCE(f.division, 'Unassigned'),
+    f.status,
+    COALESCE(f.project_type, 'Other'),
+    COUNT(*),
+    COALESCE(SUM(f.deal_amount), 0)
+FROM fact_deals f
+LEFT JOIN dim_date dd ON dd.date_key = f.period_date_key
+GROUP BY dd.year, dd.quarter, dd.month, dd.iso_year, dd.week,
+         COALESCE(f.division, 'Unassigned'), f.status, COALESCE(f.project_type, 'Other');
+
+-- Sprint capacity is attributed to the week/month/quarter in which the sprint starts.
+-- NULL project_keys recomputes every project.
+CREATE OR REPLACE FUNCTION refresh_capacity_rollup(project_keys text[]) RETURNS void
+LANGUAGE sql AS $$
+    DELETE FROM agg_sprint_capacity
+    WHERE project_keys IS NULL OR project_key = ANY(project_keys);
+
+    INSERT INTO agg_sprint_capacity
+        (project_key, division, period_type, period_year, period_num, sprint_count, total_capacity)
+    SELECT
+        s.project_key,
+        COALESCE(p.division, 'Division 1'),
+        per.period_type,
+        per.period_year,
+        per.period_num,
+        COUNT(*),
+        SUM(COALESCE(s.sprint_capacity, 0))
+    FROM sprint_info s
+    JOIN dim_sprint ds ON ds.sprint_name = s.sprint_name AND ds.project_key = s.project_key
+    JOIN dim_project p ON p.project_key = s.project_key
+    JOIN dim_date dd ON dd.date_key = ds.start_date_key
+    CROSS JOIN LATERAL (
+        VALUES ('week', dd.iso_year, dd.week),
+               ('month', dd.year, dd.month),
+               ('quarter', dd.year, dd.quarter)
+    ) AS per(period_type, period_year, period_num)
+    WHERE project_keys IS NULL OR s.project_key = ANY(project_keys)
+    GROUP BY s.project_key, COALESCE(p.division, 'Division 1'),
+             per.period_type, per.period_year, per.period_num;
+$$;
+
+SELECT refresh_capacity_rollup(NULL);
+
+-- Statement-level, so a bulk load of dim_sprint refreshes each touched project once.
+-- Only rows whose start date, project or division actually changed count.
+CREATE OR REPLACE FUNCTION capacity_rollup_on_sprints() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM refresh_capacity_rollup(ARRAY(SELECT DISTINCT project_key FROM new_rows));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM refresh_capacity_rollup(ARRAY(SELECT DISTINCT project_key FROM old_rows));
+    ELSE
+        PERFORM refresh_capacity_rollup(ARRAY(
+            SELECT project_key FROM (
+                SELECT sprint_name, project_key, start_date FROM new_rows
+                EXCEPT SELECT sprint_name, project_key, start_date FROM old_rows
+            ) added
+            UNION
+            SELECT project_key FROM (
+                SELECT sprint_name, project_key, start_date FROM old_rows
+                EXCEPT SELECT sprint_name, project_key, start_date FROM new_rows
+            ) removed
+        ));
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION capacity_rollup_on_projects() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM refresh_capacity_rollup(ARRAY(SELECT project_key FROM new_rows));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM refresh_capacity_rollup(ARRAY(SELECT project_key FROM old_rows));
+    ELSE
+        PERFORM refresh_capacity_rollup(ARRAY(
+            SELECT project_key FROM (
+                SELECT project_key, division FROM new_rows
+                EXCEPT SELECT project_key, division FROM old_rows
+            ) added
+            UNION
+            SELECT project_key FROM (
+                SELECT project_key, division FROM old_rows
+                EXCEPT SELECT project_key, division FROM new_rows
+            ) removed
+        ));
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_capacity_rollup_sprints_insert ON dim_sprint;
+CREATE TRIGGER trg_capacity_rollup_sprints_insert AFTER INSERT ON dim_sprint
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION capacity_rollup_on_sprints();
+DROP TRIGGER IF EXISTS trg_capacity_rollup_sprints_update ON dim_sprint;
+CREATE TRIGGER trg_capacity_rollup_sprints_update AFTER UPDATE ON dim_sprint
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION capacity_rollup_on_sprints();
+DROP TRIGGER IF EXISTS trg_capacity_rollup_sprints_delete ON dim_sprint;
+CREATE TRIGGER trg_capacity_rollup_sprints_delete AFTER DELETE ON dim_sprint
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION capacity_rollup_on_sprints();
+
+DROP TRIGGER IF EXISTS trg_capacity_rollup_projects_insert ON dim_project;
+CREATE TRIGGER trg_capacity_rollup_projects_insert AFTER INSERT ON dim_project
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION capacity_rollup_on_projects();
+DROP TRIGGER IF EXISTS trg_capacity_rollup_projects_update ON dim_project;
+CREATE TRIGGER trg_capacity_rollup_projects_update AFTER UPDATE ON dim_project
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION capacity_rollup_on_projects();
+DROP TRIGGER IF EXISTS trg_capacity_rollup_projects_delete ON dim_project;
+CREATE TRIGGER trg_capacity_rollup_projects_delete AFTER DELETE ON dim_project
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION capacity_rollup_on_projects();
@@ -0,0 +1,82 @@
+-- Stored progress follows dim_sprint, which is loaded outside the app. The refresh SQL
+-- moves into refresh_workflow_progress(), shared by utils.progress and the triggers
+-- below. NULL project_keys recomputes every project.
+
+CREATE OR REPLACE FUNCTION refresh_workflow_progress(project_keys text[]) RETURNS void
+LANGUAGE sql AS $$
+    DELETE FROM agg_sprint_progress
+    WHERE project_keys IS NULL OR project_key = ANY(project_keys);
+    DELETE FROM agg_project_progress
+    WHERE project_keys IS NULL OR project_key = ANY(project_keys);
+
+    -- A sprint is done by the done_ratio of its status in the workflow named by the
+    -- project's scope; statuses outside it count as 0.
+    INSERT INTO agg_sprint_progress (project_key, sprint_name, workflow_id, status, done_ratio, capacity)
+    SELECT ds.project_key, ds.sprint_name, w.workflow_id, ds.status, ws.done_ratio,
+           COALESCE(si.sprint_capacity, 0)
+    FROM dim_sprint ds
+    JOIN dim_project p ON p.project_key = ds.project_key AND p.is_deleted = FALSE
+    LEFT JOIN workflow w ON w.workflow_name = p.scope
+    LEFT JOIN workflow_status ws ON ws.workflow_id = w.workflow_id AND ws.status_name = ds.status
+    LEFT JOIN sprint_info si ON si.sprint_name = ds.sprint_name AND si.project_key = ds.project_key
+    WHERE project_keys IS NULL OR ds.project_key = ANY(project_keys);
+
+    -- Capacity-weighted; projects with no capacity entered fall back to the plain average.
+    INSERT INTO agg_project_progress
+        (project_key, workflow_id, sprints, unmapped_sprints, total_capacity, done_capacity, done_ratio)
+    SELECT p.project_key, w.workflow_id,
+           COUNT(sp.sprint_name),
+           COUNT(sp.sprint_name) - COUNT(sp.done_ratio),
+           COALESCE(SUM(sp.capacity), 0),
+           COALESCE(SUM(sp.capacity * COALESCE(sp.done_ratio, 0)), 0),
+           CASE WHEN SUM(sp.capacity) > 0
+                THEN SUM(sp.capacity * COALESCE(sp.done_ratio, 0)) / SUM(sp.capacity)
+                ELSE AVG(COALESCE(sp.done_ratio, 0)) END
+    FROM dim_project p
+    LEFT JOIN workflow w ON w.workflow_name = p.scope
+    LEFT JOIN agg_sprint_progress sp ON sp.project_key = p.project_key
+    WHERE p.is_deleted = FALSE AND (project_keys IS NULL OR p.project_key = ANY(project_keys))
+    GROUP BY p.project_key, w.workflow_id;
+$$;
+
+-- Statement-level, so a bulk load refreshes each touched project once. Updates only
+-- count rows whose status or project changed.
+CREATE OR REPLACE FUNCTION workflow_progress_on_sprints() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM refresh_workflow_progress(ARRAY(SELECT DISTINCT project_key FROM new_rows));
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM refresh_workflow_progress(ARRAY(SELECT DISTINCT project_key FROM old_rows));
+    ELSE
+        PERFORM refresh_workflow_progress(ARRAY(
+            SELECT project_key FROM (
+                SELECT sprint_name, project_key, status FROM new_rows
+                EXCEPT SELECT sprint_name, project_key, status FROM old_rows
+            ) added
+            UNION
+            SELECT project_key FROM (
+                SELECT sprint_name, project_key, status FROM old_rows
+                EXCEPT SELECT sprint_name, project_key, status FROM new_rows
+            ) removed
+        ));
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_workflow_progress_sprints_insert ON dim_sprint;
+CREATE TRIGGER trg_workflow_progress_sprints_insert AFTER INSERT ON dim_sprint
+    REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION workflow_progress_on_sprints();
+DROP TRIGGER IF EXISTS trg_workflow_progress_sprints_update ON dim_sprint;
+CREATE TRIGGER trg_workflow_progress_sprints_update AFTER UPDATE ON dim_sprint
+    REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION workflow_progress_on_sprints();
+DROP TRIGGER IF EXISTS trg_workflow_progress_sprints_delete ON dim_sprint;
+CREATE TRIGGER trg_workflow_progress_sprints_delete AFTER DELETE ON dim_sprint
+    REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION workflow_progress_on_sprints();
+
+-- Catch up with loads made before the triggers existed.
+SELECT refresh_workflow_progress(NULL);
@@ -0,0 +1,57 @@
+-- dim_date was filled for 2015-2035 only, and the capacity rollup inner-joins it, so
+-- sprints starting outside that range silently dropped out of agg_sprint_capacity.
+-- extend_dim_date() adds any missing days, and the rollup extends the calendar to the
+-- sprint start dates it is about to aggregate.
+
+CREATE OR REPLACE FUNCTION extend_dim_date(first_day date, last_day date) RETURNS void
+LANGUAGE sql AS $$
+    INSERT INTO dim_date (date_key, full_date, year, quarter, month, iso_year, week, day, day_name)
+    SELECT
+        date_key(CAST(d AS date)),
+        TO_CHAR(d, 'YYYY-MM-DD'),
+        EXTRACT(YEAR FROM d),
+        EXTRACT(QUARTER FROM d),
+        EXTRACT(MONTH FROM d),
+        EXTRACT(ISOYEAR FROM d),
+        EXTRACT(WEEK FROM d),
+        EXTRACT(DAY FROM d),
+        TRIM(TO_CHAR(d, 'Day'))
+    FROM generate_series(first_day, last_day, INTERVAL '1 day') AS d
+    ON CONFLICT (date_key) DO NOTHING;
+$$;
+
+CREATE OR REPLACE FUNCTION refresh_capacity_rollup(project_keys text[]) RETURNS void
+LANGUAGE sql AS $$
+    SELECT extend_dim_date(MIN(start_date), MAX(start_date))
+    FROM dim_sprint
+    WHERE project_keys IS NULL OR project_key = ANY(project_keys)
+    HAVING MIN(start_date) IS NOT NULL;
+
+    DELETE FROM agg_sprint_capacity
+    WHERE project_keys IS NULL OR project_key = ANY(project_keys);
+
+    INSERT INTO agg_sprint_capacity
+        (project_key, division, period_type, period_year, period_num, sprint_count, total_capacity)
+    SELECT
+        s.project_key,
+        COALESCE(p.division, 'Division 1'),
+        per.period_type,
+        per.period_year,
+        per.period_num,
+        COUNT(*),
+        SUM(COALESCE(s.sprint_capacity, 0))
+    FROM sprint_info s
+    JOIN dim_sprint ds ON ds.sprint_name = s.sprint_name AND ds.project_key = s.project_key
+    JOIN dim_project p ON p.project_key = s.project_key
+    JOIN dim_date dd ON dd.date_key = ds.start_date_key
+    CROSS JOIN LATERAL (
+        VALUES ('week', dd.iso_year, dd.week),
+               ('month', dd.year, dd.month),
+               ('quarter', dd.year, dd.quarter)
+    ) AS per(period_type, period_year, period_num)
+    WHERE project_keys IS NULL OR s.project_key = ANY(project_keys)
+    GROUP BY s.project_key, COALESCE(p.division, 'Division 1'),
+             per.period_type, per.period_year, per.period_num;
+$$;
+
+SELECT refresh_capacity_rollup(NULL);
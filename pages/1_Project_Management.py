@@ -1,10 +1,13 @@
 import streamlit as st
-from sqlalchemy import text
 from utils.auth import require_role, login_form
+from utils.metrics import track_rerun
 from utils.getter import (
-    get_data, get_user_data, get_prj_data, clear_form
+    get_projects, get_user_data, get_prj_data, clear_form
 )
 from utils.getter import clear_project_cache
+from utils.queries import execute
+from utils import audit, mirror
+from utils.progress import refresh_progress
 import pandas as pd
 
 st.set_page_config(page_title="Project Info", page_icon="📂")
@@ -15,12 +18,10 @@ from utils.header_nav import header_nav
 header_nav(current_page="project")
 # ================================================================
 
-@st.cache_data(ttl=30)
-def get_workflow_names(_conn):
-    """Fetches all workflow names from the database."""
+def get_workflow_names():
+    """Fetches all workflow names from the local dimension mirror."""
     try:
-        df = _conn.query("SELECT workflow_name FROM workflow ORDER BY workflow_name;", ttl=10)
-        return df['workflow_name'].tolist()
+        return mirror.get_workflow_names()
     except Exception:
         # Fallback in case the table doesn't exist or there's an error
         return ["Workflow 1", "Workflow 2", "Workflow 3"]
@@ -34,7 +35,7 @@ def show_project_management():
     
     if st.button("🔄 Refresh"):
         clear_project_cache()
-        get_workflow_names.clear()
+        mirror.resync()
         st.rerun()
 
     user_role = st.session_state.get("user_role")
@@ -42,12 +43,9 @@ def show_project_management():
 
     # -------------------- Load project data --------------------
     if user_role in ['admin', 'manager']:
-        df = get_data("project_key, project_name, total_mm, project_type, scope, status, owner, start_date, end_date, created_at, updated_at", "dim_project WHERE owner IS NOT NULL AND is_deleted = FALSE")
+        df = get_projects()
     else:  # pm
-        df = conn.query(
-            "SELECT project_key, project_name, total_mm, project_type, scope, owner, status, start_date, end_date, created_at, updated_at FROM dim_project WHERE is_deleted = FALSE AND owner = :user_name",
-            params={"user_name": user_name}
-        )
+        df = get_projects(owner=user_name)
 
     if df is None or df.empty:
         st.warning("No projects found.")
@@ -63,7 +61,7 @@ def show_project_management():
     if page_option == "Add Project":
         owner_list = get_user_data()
         project_key_list = get_prj_data()
-        workflow_list = get_workflow_names(conn)
+        workflow_list = get_workflow_names()
         st.subheader("➕ Add Project")
 
         with st.form("add_project"):
@@ -83,34 +81,19 @@ def show_project_management():
                     st.error("⚠️ Project Key and Project Name are required!")
                 else:
                     with conn.session as session:
-                        session.execute(
-                            text('''
-                                INSERT INTO dim_project (
-                                    project_key, project_name, total_mm, project_type, scope,
-                                    owner, start_date, end_date, status, is_deleted
-                                )
-                                VALUES (
-                                    :project_key, :project_name, :total_mm, :project_type, :scope,
-                                    :owner, :start_date, :end_date, :status, FALSE
-                                )
-                                ON CONFLICT (project_key) DO UPDATE
-                                SET project_name = EXCLUDED.project_name,
-                                    total_mm = EXCLUDED.total_mm,
-                                    project_type = EXCLUDED.project_type,
-                                    scope = EXCLUDED.scope,
-                                    owner = EXCLUDED.owner,
-                                    start_date = EXCLUDED.start_date,
-                                    end_date = EXCLUDED.end_date,
-                                    status = EXCLUDED.status,
-                                    is_deleted = FALSE
-                            '''),
-                            {
-                                "project_key": project_key, "project_name": project_name, "total_mm": total_mm,
-                                "project_type": project_type, "scope": scope, "owner": owner,
-                                "start_date": start_date, "end_date": end_date, "status": status
-                            }
+                        execute(
+                            session, "project_upsert",
+                            project_key=project_key, project_name=project_name, total_mm=total_mm,
+                            project_type=project_type, scope=scope, owner=owner,
+                            start_date=start_date, end_date=end_date, status=status
                         )
+                        refresh_progress(session, [project_key])
                         session.commit()
+                        audit.record("dim_project", project_key, "upsert", after={
+                            "project_name": project_name, "total_mm": total_mm, "project_type": project_type,
+                            "scope": scope, "owner": owner, "start_date": start_date,
+                            "end_date": end_date, "status": status
+                        })
                         clear_project_cache()
                         clear_form()
                     st.success("✅ Project saved!")
@@ -123,7 +106,7 @@ def show_project_management():
             project_to_edit = st.selectbox("Select project to edit:", df["project_key"].tolist(), key="edit_selector")
             current_project = df[df["project_key"] == project_to_edit].iloc[0]
             owner_list = get_user_data()
-            workflow_list = get_workflow_names(conn)
+            workflow_list = get_workflow_names()
 
             with st.form("edit_project"):
                 st.text_input("Project Key", value=current_project["project_key"], disabled=True)
@@ -190,22 +173,20 @@ def show_project_management():
                         st.error("⚠️ Project Name is required!")
                     else:
                         with conn.session as session:
-                            session.execute(
-                                text('''
-                                    UPDATE dim_project 
-                                    SET project_name = :project_name, total_mm = :total_mm,
-                                        project_type = :project_type, scope = :scope, owner = :owner,
-                                        start_date = :start_date, end_date = :end_date, status = :status
-                                    WHERE project_key = :project_key AND is_deleted = FALSE
-                                '''),
-                                {
-                                    "project_key": project_to_edit, "project_name": edit_project_name,
-                                    "total_mm": edit_total_mm, "project_type": edit_project_type,
-                                    "scope": edit_scope, "owner": edit_owner, "start_date": edit_start_date,
-                                    "end_date": edit_end_date, "status": edit_status
-                                }
+                            execute(
+                                session, "project_update",
+                                project_key=project_to_edit, project_name=edit_project_name,
+                                total_mm=edit_total_mm, project_type=edit_project_type,
+                                scope=edit_scope, owner=edit_owner, start_date=edit_start_date,
+                                end_date=edit_end_date, status=edit_status
                             )
+                            refresh_progress(session, [project_to_edit])
                             session.commit()
+                            audit.record("dim_project", project_to_edit, "update", before=current_project, after={
+                                "project_name": edit_project_name, "total_mm": edit_total_mm,
+                                "project_type": edit_project_type, "scope": edit_scope, "owner": edit_owner,
+                                "start_date": edit_start_date, "end_date": edit_end_date, "status": edit_status
+                            })
                             clear_project_cache()
                         st.success(f"✅ Project {project_to_edit} updated successfully!")
                         st.rerun()
@@ -217,13 +198,15 @@ def show_project_management():
             project_to_delete = st.selectbox("Select project to delete:", df["project_key"].tolist())
             if st.button("Delete project"):
                 with conn.session as session:
-                    session.execute(
-                        text("UPDATE dim_project SET is_deleted = TRUE WHERE project_key = :project_key"),
-                        {"project_key": project_to_delete}
-                    )
+                    execute(session, "project_soft_delete", project_key=project_to_delete)
+                    refresh_progress(session, [project_to_delete])
                     session.commit()
+                    audit.record("dim_project", project_to_delete, "delete",
+                                 before=df[df["project_key"] == project_to_delete].iloc[0],
+                                 after={"is_deleted": True})
                     clear_project_cache()
                 st.success(f"🚮 Project {project_to_delete} deleted.")
                 st.rerun()
 
-show_project_management()
\ No newline at end of file
+with track_rerun("project"):
+    show_project_management()
@@ -1,8 +1,15 @@
 import streamlit as st
 import pandas as pd
-from sqlalchemy import text
 from utils.auth import require_role, login_form
+from utils.metrics import track_rerun
 from utils.getter import get_data
+from utils import audit, snapshot_cache
+from utils.queries import execute
+from utils.sprint_rollup import (
+    PERIOD_TYPES, refresh_capacity_rollup, get_capacity_rollup
+)
+from utils.forecast import CAPACITY_PER_MM, get_portfolio_forecast, get_burndown
+from utils.progress import refresh_progress, get_project_progress, get_sprint_progress, clear_progress_cache
 
 st.set_page_config(page_title="Sprint Capacity", page_icon="📊")
 login_form()
@@ -26,12 +33,9 @@ def show_sprint_management():
     st.title("SMD Sprint Management")
 
     if st.button("Refresh"):
-        try:
-            get_data.clear()
-            st.cache_data.clear()
-            st.cache_resource.clear()
-        except Exception:
-            pass
+        snapshot_cache.clear()
+        get_capacity_rollup.clear()
+        clear_progress_cache()
         st.rerun()
 
     # ------------------------------------------------------------
@@ -39,41 +43,16 @@ def show_sprint_management():
     # ------------------------------------------------------------
     try:
         if user_role in ['admin', 'manager']:
-            prj_df = conn.query("""
-                SELECT project_key, project_name, owner, is_deleted
-                FROM dim_project;
-            """)
-
-            sprint_df = conn.query("""
-                SELECT s.*
-                FROM sprint_info s
-                JOIN dim_project p ON s.project_key = p.project_key
-                WHERE p.is_deleted = FALSE
-            """)
-
-            dim_sprint = conn.query("""
-                SELECT d.sprint_name, d.status, d.project_key
-                FROM dim_sprint d
-                JOIN dim_project p ON d.project_key = p.project_key
-                WHERE p.is_deleted = FALSE
-            """)
+            prj_df = get_data("projects_brief_all")
+            sprint_df = get_data("sprints_active")
+            dim_sprint = get_data("dim_sprints_active")
 
         elif user_role == 'pm':
-            prj_df = conn.query(
-                """
-                SELECT project_key, project_name, owner, is_deleted
-                FROM dim_project
-                WHERE owner = :owner_name AND is_deleted = FALSE;
-                """,
-                params={"owner_name": user_name}
-            )
-
-            all_sprints = get_data("*", "sprint_info")
-            all_dim_sprint = get_data(col="sprint_name, status, project_key", table_name="dim_sprint")
+            prj_df = get_data("projects_brief_by_owner", owner=user_name)
 
             project_keys = prj_df['project_key'].tolist() if not prj_df.empty else []
-            sprint_df = all_sprints[all_sprints['project_key'].isin(project_keys)] if not all_sprints.empty else pd.DataFrame()
-            dim_sprint = all_dim_sprint[all_dim_sprint['project_key'].isin(project_keys)] if not all_dim_sprint.empty else pd.DataFrame()
+            sprint_df = get_data("sprints_by_projects", project_keys=project_keys)
+            dim_sprint = get_data("dim_sprints_by_projects", project_keys=project_keys)
 
         else:
             st.error("Unknown role. Contact admin.")
@@ -93,6 +72,81 @@ def show_sprint_management():
     st.subheader("Sprint list")
     st.dataframe(sprint_df, use_container_width=True, hide_index=True)
 
+    # ===================== Capacity Rollup ==========================
+    st.subheader("Capacity by period")
+    try:
+        period_type = st.radio("Period", PERIOD_TYPES, index=1, horizontal=True, key="rollup_period")
+        rollup_keys = None if user_role in ['admin', 'manager'] else tuple(sorted(prj_df['project_key'].tolist()))
+        rollup_df = get_capacity_rollup(period_type, rollup_keys)
+        if rollup_df.empty:
+            st.info("No sprint capacity recorded yet.")
+        else:
+            rollup_df = rollup_df.assign(
+                period=rollup_df['period_year'].astype(str) + "-" + period_type[0].upper() + rollup_df['period_num'].astype(str).str.zfill(2)
+            )
+            pivot = rollup_df.pivot_table(
+                index="period", columns="project_key", values="total_capacity", aggfunc="sum", fill_value=0
+            )
+            st.bar_chart(pivot)
+            st.dataframe(
+                rollup_df.groupby(["period", "division"], as_index=False)[["sprint_count", "total_capacity"]].sum(),
+                use_container_width=True, hide_index=True
+            )
+    except Exception as e:
+        st.error(f"Error loading capacity rollup: {e}")
+
+    # ===================== Budget Forecast ==========================
+    st.subheader("Budget forecast")
+    st.caption(f"Sprint capacity is counted in man-days, {CAPACITY_PER_MM} per man-month of `total_mm`.")
+    try:
+        forecast_keys = None if user_role in ['admin', 'manager'] else prj_df['project_key'].tolist()
+        forecast_df = get_portfolio_forecast(forecast_keys)
+        forecast_df = forecast_df[forecast_df['sprints'] > 0]
+        if forecast_df.empty:
+            st.info("No sprints with dates to forecast from yet.")
+        else:
+            col1, col2 = st.columns(2)
+            col1.metric("Projects over budget (planned)", int(forecast_df['overrun_planned'].sum()))
+            col2.metric("Budget left (MM)", f"{forecast_df['remaining_mm'].clip(lower=0).sum():,.1f}")
+            st.dataframe(
+                forecast_df.sort_values('exhaustion_date', na_position='last'),
+                use_container_width=True, hide_index=True,
+                column_config={
+                    "budget_used_pct": st.column_config.ProgressColumn("Budget used", format="%.0f%%", min_value=0, max_value=100),
+                    "burn_mm_per_month": st.column_config.NumberColumn("MM / month", format="%.2f"),
+                    "exhaustion_date": st.column_config.DateColumn("Budget runs out"),
+                    "overrun_planned": st.column_config.CheckboxColumn("Planned overrun"),
+                }
+            )
+            burndown_key = st.selectbox("Burn-down of project", forecast_df['project_key'].tolist(), key="burndown_project")
+            burndown_df = get_burndown(burndown_key)
+            st.line_chart(burndown_df.set_index('end_date')[['remaining_mm']])
+    except Exception as e:
+        st.error(f"Error loading budget forecast: {e}")
+
+    # ===================== Workflow Progress ==========================
+    st.subheader("Progress")
+    st.caption("Each sprint counts by the done ratio of its status in the project's workflow, weighted by capacity.")
+    try:
+        progress_keys = None if user_role in ['admin', 'manager'] else tuple(sorted(prj_df['project_key'].tolist()))
+        progress_df = get_project_progress(progress_keys)
+        if progress_df.empty:
+            st.info("No project progress recorded yet.")
+        else:
+            st.dataframe(
+                progress_df.drop(columns=['updated_at']).assign(done_pct=progress_df['done_ratio'].astype(float) * 100),
+                use_container_width=True, hide_index=True,
+                column_config={
+                    "done_ratio": None,
+                    "done_pct": st.column_config.ProgressColumn("Done", format="%.0f%%", min_value=0, max_value=100),
+                    "unmapped_sprints": st.column_config.NumberColumn("Status not in workflow"),
+                }
+            )
+            progress_key = st.selectbox("Sprints of project", progress_df['project_key'].tolist(), key="progress_project")
+            st.dataframe(get_sprint_progress(progress_key), use_container_width=True, hide_index=True)
+    except Exception as e:
+        st.error(f"Error loading progress: {e}")
+
     # --- Helper ---
     def format_sprint_row(row):
         return f"{row['sprint_name']} | {row['project_key']}"
@@ -134,24 +188,21 @@ def show_sprint_management():
                 if submitted:
                     try:
                         with conn.session as session:
-                            session.execute(
-                                text(
-                                    """
-                                    INSERT INTO sprint_info (sprint_name, project_key, sprint_capacity, updated_at)
-                                    VALUES (:sprint_name, :project_key, :sprint_capacity, NOW())
-                                    ON CONFLICT (sprint_name, project_key) DO UPDATE
-                                    SET sprint_capacity = EXCLUDED.sprint_capacity,
-                                        updated_at = NOW();
-                                    """
-                                ),
-                                {
-                                    "sprint_name": sprint_name,
-                                    "project_key": project_key,
-                                    "sprint_capacity": int(sprint_capacity),
-                                }
+                            execute(
+                                session, "sprint_upsert",
+                                sprint_name=sprint_name,
+                                project_key=project_key,
+                                sprint_capacity=int(sprint_capacity),
                             )
+                            refresh_capacity_rollup(session, project_key)
+                            refresh_progress(session, [project_key])
                             session.commit()
-                            get_data.clear()
+                            get_capacity_rollup.clear()
+                            get_project_progress.clear()
+                        audit.record(
+                            "sprint_info", {"sprint_name": sprint_name, "project_key": project_key}, "upsert",
+                            after={"sprint_capacity": int(sprint_capacity)}
+                        )
                         st.success(f"Sprint '{sprint_name}' for project '{project_key}' saved.")
                         st.rerun()
                     except Exception as e:
@@ -188,22 +239,22 @@ def show_sprint_management():
                     if update_clicked:
                         try:
                             with conn.session as session:
-                                session.execute(
-                                    text(
-                                        """
-                                        UPDATE sprint_info
-                                        SET sprint_capacity = :sprint_capacity, updated_at = NOW()
-                                        WHERE sprint_name = :sprint_name AND project_key = :project_key
-                                        """
-                                    ),
-                                    {
-                                        "sprint_name": current["sprint_name"],
-                                        "project_key": current["project_key"],
-                                        "sprint_capacity": int(edit_capacity)
-                                    }
+                                execute(
+                                    session, "sprint_update",
+                                    sprint_name=current["sprint_name"],
+                                    project_key=current["project_key"],
+                                    sprint_capacity=int(edit_capacity)
                                 )
+                                refresh_capacity_rollup(session, current["project_key"])
+                                refresh_progress(session, [current["project_key"]])
                                 session.commit()
-                                get_data.clear()
+                                get_capacity_rollup.clear()
+                                get_project_progress.clear()
+                            audit.record(
+                                "sprint_info",
+                                {"sprint_name": current["sprint_name"], "project_key": current["project_key"]},
+                                "update", before=current, after={"sprint_capacity": int(edit_capacity)}
+                            )
                             st.success(f"Sprint '{current['sprint_name']}' updated.")
                             st.rerun()
                         except Exception as e:
@@ -229,18 +280,28 @@ def show_sprint_management():
                             st.stop()
 
                     with conn.session as session:
-                        session.execute(
-                            text(
-                                "DELETE FROM sprint_info WHERE sprint_name = :sprint_name AND project_key = :project_key"
-                            ),
-                            {"sprint_name": sprint_name_selected, "project_key": project_key_selected}
+                        execute(
+                            session, "sprint_delete",
+                            sprint_name=sprint_name_selected, project_key=project_key_selected
                         )
+                        refresh_capacity_rollup(session, project_key_selected)
+                        refresh_progress(session, [project_key_selected])
                         session.commit()
-                        get_data.clear()
+                        get_capacity_rollup.clear()
+                        get_project_progress.clear()
+                    deleted_rows = sprint_df[
+                        (sprint_df['sprint_name'] == sprint_name_selected) &
+                        (sprint_df['project_key'] == project_key_selected)
+                    ]
+                    audit.record(
+                        "sprint_info", {"sprint_name": sprint_name_selected, "project_key": project_key_selected},
+                        "delete", before=deleted_rows.iloc[0] if not deleted_rows.empty else None
+                    )
                     st.success(f"Deleted sprint '{sprint_name_selected}' for project '{project_key_selected}'.")
                     st.rerun()
                 except Exception as e:
                     st.exception(e)
                     st.error("Failed to delete sprint.")
 
-show_sprint_management()
\ No newline at end of file
+with track_rerun("sprint"):
+    show_sprint_management()
@@ -1,130 +1,94 @@
-from datetime import datetime
 import streamlit as st
-import pandas as pd
-from sqlalchemy import create_engine
-import sqlalchemy as sa
-import os
-from dotenv import load_dotenv
+from functools import partial
 from utils.header_nav import header_nav
 from utils.auth import require_role, login_form
+from utils.metrics import track_rerun
+from utils.presales_utils import get_deals_cube
+from utils.jobs import submit_presales_import, get_recent_jobs, job_rejects_csv
 login_form()
 # ============================ Header ============================
 header_nav(current_page="presales")
 # ================================================================
 
+def has_active_jobs(jobs_df):
+    return not jobs_df.empty and jobs_df['status'].isin(['queued', 'running']).any()
+
+@st.fragment(run_every=2)
+def poll_import_jobs():
+    """Job list while imports are queued or running; re-runs on its own every 2 seconds without rerunning the page."""
+    jobs_df = get_recent_jobs()
+    render_import_jobs(jobs_df)
+    if not has_active_jobs(jobs_df):
+        # The last import finished: one full rerun renders the list without the timer.
+        st.rerun()
+
+def show_import_jobs():
+    """Job list; polled only while an import is queued or running."""
+    jobs_df = get_recent_jobs()
+    if has_active_jobs(jobs_df):
+        poll_import_jobs()
+    else:
+        render_import_jobs(jobs_df)
+
+def render_import_jobs(jobs_df):
+    if jobs_df.empty:
+        st.caption("No imports yet.")
+        return
+
+    active = jobs_df[jobs_df['status'].isin(['queued', 'running'])]
+    for _, job in active.iterrows():
+        st.progress(float(job['progress']), text=f"#{job['job_id']} {job['file_name']}: {job['message'] or job['status']}")
+
+    # Drop the cached cube once per finished job so the analytics page shows new deals.
+    seen = st.session_state.setdefault("presales_jobs_seen", set())
+    finished = set(jobs_df.loc[jobs_df['status'] == 'succeeded', 'job_id']) - seen
+    if finished and seen:
+        get_deals_cube.clear()
+    seen.update(finished)
+
+    st.dataframe(
+        jobs_df[['job_id', 'file_name', 'submitted_by', 'status', 'message', 'rows_loaded', 'rows_rejected',
+                 'created_at', 'finished_at']],
+        use_container_width=True, hide_index=True
+    )
+
+    # Rows that failed validation are kept per job; the file is built only when clicked.
+    with_rejects = jobs_df[jobs_df['rows_rejected'].fillna(0) > 0]
+    if not with_rejects.empty:
+        col1, col2 = st.columns([2, 1])
+        job_id = col1.selectbox(
+            "Rejected rows of import", with_rejects['job_id'].tolist(), key="rejects_job",
+            format_func=lambda j: f"#{j} ({int(with_rejects.set_index('job_id').at[j, 'rows_rejected'])} rows)"
+        )
+        col2.download_button(
+            "⬇️ Download rejects", data=partial(job_rejects_csv, int(job_id)),
+            file_name=f"presales_import_{job_id}_rejects.csv", mime="text/csv"
+        )
+
 @require_role(allowed_roles=['admin'])
 def show_presales_importer():
     """Main function to show the presales importer page, restricted to admins."""
     st.title("Presales Importer")
-    st.write("Upload your Excel file to import presales deals into the database.")
+    st.write("Upload one or more Excel workbooks or CSV exports to import presales deals into the "
+             "database. Every sheet with the deal columns is read; a deal found in several files is "
+             "taken from the last one. CSV files import much faster than workbooks.")
 
-    load_dotenv()
-    PG_USER = os.getenv("PG_USER")
-    PG_PASSWORD = os.getenv("PG_PASSWORD")
-    PG_HOST = os.getenv("PG_HOST")
-    PG_DB = os.getenv("PG_DB")
-    PG_PORT = os.getenv("PG_PORT", 5432)
+    uploaded_files = st.file_uploader(
+        "Drag and drop Excel or CSV files here", type=["xlsx", "csv"], accept_multiple_files=True
+    )
 
-    def load_dim_table(df: pd.DataFrame, table_name: str, if_exists="append"):
-        """Load data into a dimension table in PostgreSQL."""
-        engine = create_engine(f"postgresql://{PG_USER}:{PG_PASSWORD}@{PG_HOST}:{PG_PORT}/{PG_DB}")
+    if uploaded_files and st.button("🚀 Start import", type="primary"):
         try:
-            print(f"PostgreSQL connect success.")
-            df.to_sql(table_name, engine, if_exists=if_exists, index=False)
-            print(f"Write to table {table_name} successfully")
-        except Exception as e:
-            print(f"❌ Error {table_name}:", e)
-
-    def upsert_dataframe_to_table(df, table_name, unique_column):
-        """Perform an upsert operation for a DataFrame to a database table."""
-        if df.empty:
-            return 0, 0
-        engine = create_engine(f"postgresql://{PG_USER}:{PG_PASSWORD}@{PG_HOST}:{PG_PORT}/{PG_DB}")
-        print(f"PostgreSQL connect success.")
-        try:
-            with engine.begin() as connection:
-                query = f"SELECT {unique_column} FROM {table_name}"
-                existing_records = pd.read_sql(query, connection)
-                existing_values = set(existing_records[unique_column].values) if not existing_records.empty else set()
-                df_values = set(df[unique_column].values)
-                to_update_values = df_values.intersection(existing_values)
-                to_insert_values = df_values - existing_values
-                to_update_df = df[df[unique_column].isin(to_update_values)]
-                to_insert_df = df[df[unique_column].isin(to_insert_values)]
-
-                for _, row in to_update_df.iterrows():
-                    update_columns = [col for col in row.index if col != unique_column]
-                    if not update_columns:
-                        continue
-                    set_clauses = [f"{col} = :{col}" for col in update_columns]
-                    params = {col: (row[col] if pd.notna(row[col]) else None) for col in update_columns}
-                    params[unique_column] = row[unique_column]
-                    update_sql = f"""UPDATE {table_name} SET {', '.join(set_clauses)} WHERE {unique_column} = :{unique_column}"""
-                    connection.execute(sa.text(update_sql), params)
-
-                if not to_insert_df.empty:
-                    to_insert_df = to_insert_df.where(pd.notna(to_insert_df), None)
-                    to_insert_df.to_sql(name=table_name, con=connection, if_exists='append', index=False)
-
-                return len(to_insert_df), len(to_update_df)
-        except Exception as e:
-            print(f"❌ Error upserting to {table_name}: {e}")
-            return 0, 0
-
-    uploaded_file = st.file_uploader("Drag and drop Excel file here", type=["xlsx"])
-
-    if uploaded_file:
-        try:
-            df = pd.read_excel(uploaded_file, sheet_name="Official Deal", header=1)
-            df.columns = df.columns.str.strip()
-            df = df.dropna(subset=['Deal Name'], how='any')
-            df = df[[
-                'Deal Name', 'Project Type', 'Deal Amount',
-                'Deal Received(MM/DD/YY)', 'Proposal Sent', 'Pending',
-                'Lost/Canceled', 'Won',
-                'Division', 'Division 1 - %', 'Division 2 - %','Reasons'
-            ]]
-            df = df.rename(columns={
-                'Deal Name': 'deal_name', 'Project Type': 'project_type', 'Deal Amount': 'deal_amount',
-                'Deal Received(MM/DD/YY)': 'deal_received_date', 'Proposal Sent': 'proposal_sent_date',
-                'Lost/Canceled': 'lost_date', 'Won': 'won_date', 'Pending': 'pending_date',
-                'Division': 'division', 'Division 1 - %': 'division_1_pct', 'Division 2 - %': 'division_2_pct',
-                'Reasons': 'reasons'
-            })
-
-            for col in ['deal_received_date', 'proposal_sent_date', 'pending_date', 'won_date', 'lost_date']:
-                df[col] = pd.to_datetime(df[col], errors='coerce')
-
-            df['deal_amount'] = df['deal_amount'].replace('[\$,]', '', regex=True).astype(float)
-
-            def determine_status(row):
-                if pd.notnull(row['won_date']): return 'Won'
-                if pd.notnull(row['lost_date']): return 'Lost'
-                if pd.notnull(row['pending_date']): return 'Pending'
-                if pd.notnull(row['proposal_sent_date']): return 'Proposal Sent'
-                return 'Preparing Proposal'
-
-            df['status'] = df.apply(determine_status, axis=1)
-
-            date_cols = ['won_date', 'pending_date', 'deal_received_date', 'lost_date']
-            current_date = datetime.now()
-
-            def get_closest_date_info(row):
-                valid_dates = [d for d in row[date_cols] if pd.notnull(d)]
-                if not valid_dates: return None, None, None, None, None
-                closest_date = min(valid_dates, key=lambda x: abs((x - current_date).days))
-                return (closest_date.month, closest_date.isocalendar()[1], closest_date.day, closest_date.quarter, closest_date.year)
-
-            df[['month', 'week', 'day', 'quarter', 'year']] = df.apply(lambda row: pd.Series(get_closest_date_info(row)), axis=1)
-
-            db_url = f"postgresql://{PG_USER}:{PG_PASSWORD}@{PG_HOST}:{PG_PORT}/{PG_DB}"
-            engine = create_engine(db_url)
-
-            load_dim_table(df, "fact_deals")
-            st.dataframe(df.head())
-            st.success("✅ ETL Completed: fact_deals updated.")
+            job_id = submit_presales_import(
+                [(f.name, f.getvalue()) for f in uploaded_files], st.session_state.get("user_email")
+            )
+            st.success(f"✅ Import #{job_id} queued. You can keep working; progress is shown below.")
         except Exception as e:
             st.error(f"❌ Error: {e}")
 
+    st.subheader("Imports")
+    show_import_jobs()
+
 # --- Entry Point ---
-show_presales_importer()
\ No newline at end of file
+with track_rerun("presales"):
+    show_presales_importer()
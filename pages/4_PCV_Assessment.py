@@ -1,140 +1,223 @@
 import streamlit as st
 import pandas as pd
+import plotly.express as px
 from datetime import date
 from utils.header_nav import header_nav
 from utils.auth import require_role, login_form
+from utils.metrics import track_rerun
 from utils.pcv_utils import (
     get_pcv_data, get_active_projects, clear_pcv_cache,
     create_pcv_assessment, update_pcv_assessment, delete_pcv_assessment,
-    get_recent_assessments, get_pcv_stats_by_division
+    get_recent_assessments, get_pcv_stats_by_division, get_pcv_trend,
+    read_pcv_assessment_file, bulk_create_pcv_assessments
 )
+from utils.queries import run_query
 login_form()
 st.set_page_config(page_title="PCV Assessment", page_icon="📊", layout="wide")
 
 header_nav(current_page="pcv")
 
+# Each tab body is its own fragment: widgets inside a tab rerun only that tab, and a
+# tab's data is loaded only while the tab is open.
 
-@require_role(["admin"])
-def action_button(user_role, owned_project_keys, tab1, tab2, tab3, tab4):
-    """ Action buttons for CRUD operations and analytics tabs.
-    """
-    
-    crud_projects_df = get_active_projects()
+def _crud_projects(user_role, owned_project_keys):
+    projects_df = get_active_projects()
     if user_role == 'pm':
-        crud_projects_df = crud_projects_df[crud_projects_df['project_key'].isin(owned_project_keys)]
+        projects_df = projects_df[projects_df['project_key'].isin(owned_project_keys)]
+    return projects_df
 
-    with tab1:
-        st.subheader("➕ Create New PCV Assessment")
-        if crud_projects_df.empty:
-            st.warning("No active projects assigned to you to create an assessment for.")
-        else:
-            with st.form("create_pcv"):
-                project_options = [f"{row['project_key']} - {row['project_name']}" for _, row in crud_projects_df.iterrows()]
-                selected_project = st.selectbox("Project *", project_options)
-                project_key = selected_project.split(" - ")[0] if selected_project else ""
-                division = st.selectbox("Division *", ["Division 1", "Division 2"])
-                pcv_score = st.number_input("PCV Score (%) *", min_value=0.0, max_value=100.0, value=80.0, step=0.1)
-                assessment_date = st.date_input("Assessment Date *", value=date.today())
-                
-                if st.form_submit_button("Submit Assessment", type="primary"):
-                    success, result = create_pcv_assessment(project_key, division, pcv_score, assessment_date)
-                    if success:
-                        st.success(f"✅ PCV Assessment created successfully! (ID: {result})")
-                        st.rerun()
-                    else:
-                        st.error(f"❌ {result}")
 
-    pcv_crud_df = get_pcv_data("All", "All", 500)
+def _crud_assessments(user_role, owned_project_keys):
+    pcv_df = get_pcv_data("All", "All", 500)
     if user_role == 'pm':
-        pcv_crud_df = pcv_crud_df[pcv_crud_df['project_key'].isin(owned_project_keys)]
+        pcv_df = pcv_df[pcv_df['project_key'].isin(owned_project_keys)]
+    return pcv_df
 
-    with tab2:
-        st.subheader("✏️ Update PCV Assessment")
-        if pcv_crud_df.empty:
-            st.info("No existing assessments to update.")
-        else:
-            update_options = [f"{row['pcv_id']}: {row['project_key']} - {row['division']} ({row['assessment_date']})" for _, row in pcv_crud_df.iterrows()]
-            selected_record = st.selectbox("Select Assessment to Update", [""] + update_options, key="update_select")
-            if selected_record:
-                pcv_id = int(selected_record.split(":")[0])
-                record = pcv_crud_df[pcv_crud_df['pcv_id'] == pcv_id].iloc[0]
-                with st.form("update_pcv_form"):
-                    new_score = st.number_input("New PCV Score", min_value=0.0, max_value=100.0, value=float(record['pcv_score']), step=0.1)
-                    new_date = st.date_input("New Assessment Date", value=record['assessment_date'])
-                    division = st.selectbox("Division", pcv_crud_df['division'].unique(), index=list(pcv_crud_df['division'].unique()).index(record['division']) if 'division' in record else 0)
-                    if st.form_submit_button("Update Assessment", type="primary"):
-                        success, msg = update_pcv_assessment(pcv_id, new_score, new_date, division)
-                        if success:
-                            st.success(msg)
-                            st.rerun()
-                        else:
-                            st.error(msg)
-    with tab3:
-        st.subheader("🗑️ Delete PCV Assessment")
-        if pcv_crud_df.empty:
-            st.info("No assessments to delete.")
-        else:
-            delete_options = [f"{row['pcv_id']}: {row['project_key']} - {row['division']} ({row['assessment_date']})" for _, row in pcv_crud_df.iterrows()]
-            selected_delete = st.selectbox("Select Assessment to Delete", [""] + delete_options, key="del_select")
-            if selected_delete:
-                pcv_id = int(selected_delete.split(":")[0])
-                if st.button("Delete Assessment", key="delete_btn_tab3"):
-                    success, msg = delete_pcv_assessment(pcv_id)
+
+@st.fragment
+def create_tab(user_role, owned_project_keys):
+    st.subheader("➕ Create New PCV Assessment")
+    crud_projects_df = _crud_projects(user_role, owned_project_keys)
+    if crud_projects_df.empty:
+        st.warning("No active projects assigned to you to create an assessment for.")
+    else:
+        with st.form("create_pcv"):
+            project_options = [f"{row['project_key']} - {row['project_name']}" for _, row in crud_projects_df.iterrows()]
+            selected_project = st.selectbox("Project *", project_options)
+            project_key = selected_project.split(" - ")[0] if selected_project else ""
+            division = st.selectbox("Division *", ["Division 1", "Division 2"])
+            pcv_score = st.number_input("PCV Score (%) *", min_value=0.0, max_value=100.0, value=80.0, step=0.1)
+            assessment_date = st.date_input("Assessment Date *", value=date.today())
+
+            if st.form_submit_button("Submit Assessment", type="primary"):
+                success, result = create_pcv_assessment(project_key, division, pcv_score, assessment_date)
+                if success:
+                    st.success(f"✅ PCV Assessment created successfully! (ID: {result})")
+                    st.rerun()
+                else:
+                    st.error(f"❌ {result}")
+
+
+@st.fragment
+def update_tab(user_role, owned_project_keys):
+    st.subheader("✏️ Update PCV Assessment")
+    pcv_crud_df = _crud_assessments(user_role, owned_project_keys)
+    if pcv_crud_df.empty:
+        st.info("No existing assessments to update.")
+    else:
+        update_options = [f"{row['pcv_id']}: {row['project_key']} - {row['division']} ({row['assessment_date']})" for _, row in pcv_crud_df.iterrows()]
+        selected_record = st.selectbox("Select Assessment to Update", [""] + update_options, key="update_select")
+        if selected_record:
+            pcv_id = int(selected_record.split(":")[0])
+            record = pcv_crud_df[pcv_crud_df['pcv_id'] == pcv_id].iloc[0]
+            with st.form("update_pcv_form"):
+                new_score = st.number_input("New PCV Score", min_value=0.0, max_value=100.0, value=float(record['pcv_score']), step=0.1)
+                new_date = st.date_input("New Assessment Date", value=record['assessment_date'])
+                division = st.selectbox("Division", pcv_crud_df['division'].unique(), index=list(pcv_crud_df['division'].unique()).index(record['division']) if 'division' in record else 0)
+                if st.form_submit_button("Update Assessment", type="primary"):
+                    success, msg = update_pcv_assessment(pcv_id, new_score, new_date, division)
                     if success:
                         st.success(msg)
                         st.rerun()
                     else:
                         st.error(msg)
-    with tab4:
-        st.subheader("📈 Analytics & Insights")
-        analytics_df = get_pcv_data("All", "All", 500)
+
+
+@st.fragment
+def delete_tab(user_role, owned_project_keys):
+    st.subheader("🗑️ Delete PCV Assessment")
+    pcv_crud_df = _crud_assessments(user_role, owned_project_keys)
+    if pcv_crud_df.empty:
+        st.info("No assessments to delete.")
+    else:
+        delete_options = [f"{row['pcv_id']}: {row['project_key']} - {row['division']} ({row['assessment_date']})" for _, row in pcv_crud_df.iterrows()]
+        selected_delete = st.selectbox("Select Assessment to Delete", [""] + delete_options, key="del_select")
+        if selected_delete:
+            pcv_id = int(selected_delete.split(":")[0])
+            if st.button("Delete Assessment", key="delete_btn_tab3"):
+                success, msg = delete_pcv_assessment(pcv_id)
+                if success:
+                    st.success(msg)
+                    st.rerun()
+                else:
+                    st.error(msg)
+
+
+TREND_SERIES = {"pcv_score": "Score", "rolling_avg_3": "Avg of last 3", "rolling_avg_90d": "90-day avg"}
+
+
+def show_pcv_trend(trend_df):
+    """Latest score and change per division, and the score lines with rolling averages."""
+    latest = trend_df.groupby('division').tail(1)
+    for col, (_, row) in zip(st.columns(len(latest)), latest.iterrows()):
+        change = None if pd.isna(row['score_change']) else f"{row['score_change']:+.1f}"
+        col.metric(row['division'], f"{row['pcv_score']:.1f}%", change)
+
+    long_df = trend_df.melt(
+        id_vars=['division', 'assessment_date', 'bucket_min', 'bucket_max'],
+        value_vars=list(TREND_SERIES), var_name='series', value_name='score'
+    )
+    long_df['series'] = long_df['series'].map(TREND_SERIES)
+    fig = px.line(
+        long_df, x='assessment_date', y='score', color='division', line_dash='series',
+        markers=True, hover_data=['bucket_min', 'bucket_max'],
+        labels={'assessment_date': 'Assessment Date', 'score': 'PCV Score (%)'}
+    )
+    st.plotly_chart(fig, use_container_width=True)
+    if (trend_df.groupby('division')['assessments'].first() > trend_df.groupby('division').size()).any():
+        st.caption("Long histories are downsampled; hover a point for the score range it covers.")
+
+
+@st.fragment
+def analytics_tab(user_role, owned_project_keys):
+    st.subheader("📈 Analytics & Insights")
+    analytics_df = _crud_assessments(user_role, owned_project_keys)
+
+    if analytics_df.empty:
+        st.info("No data available for analytics.")
+    else:
+        st.subheader("🏢 Division Comparison")
+        division_stats = get_pcv_stats_by_division()
         if user_role == 'pm':
-            analytics_df = analytics_df[analytics_df['project_key'].isin(owned_project_keys)]
-        
-        if analytics_df.empty:
-            st.info("No data available for analytics.")
+            division_stats = division_stats[division_stats['division'].isin(analytics_df['division'].unique())]
+        st.dataframe(division_stats, use_container_width=True)
+
+        st.subheader("📉 Score Trend")
+        trend_project = st.selectbox("Project", sorted(analytics_df['project_key'].unique()), key="trend_project")
+        trend_df = get_pcv_trend(trend_project)
+        if trend_df.empty:
+            st.info("No assessments for this project yet.")
         else:
-            st.subheader("🏢 Division Comparison")
-            division_stats = get_pcv_stats_by_division()
-            if user_role == 'pm':
-                division_stats = division_stats[division_stats['division'].isin(analytics_df['division'].unique())]
-            st.dataframe(division_stats, use_container_width=True)
-
-            st.subheader("🕒 Recent Assessments")
-            recent_df = pd.DataFrame()
-            for key in analytics_df['project_key'].unique():
-                recent = get_recent_assessments(key, limit=3)
-                recent['project_key'] = key
-                recent_df = pd.concat([recent_df, recent], ignore_index=True)
-            if not recent_df.empty:
-                st.dataframe(recent_df, use_container_width=True)
-            else:
-                st.info("No recent assessments found.")
+            show_pcv_trend(trend_df)
 
+        st.subheader("🕒 Recent Assessments")
+        recent_df = pd.DataFrame()
+        for key in analytics_df['project_key'].unique():
+            recent = get_recent_assessments(key, limit=3)
+            recent['project_key'] = key
+            recent_df = pd.concat([recent_df, recent], ignore_index=True)
+        if not recent_df.empty:
+            st.dataframe(recent_df, use_container_width=True)
+        else:
+            st.info("No recent assessments found.")
 
-@require_role(allowed_roles=['admin', 'manager', 'pm'])
-def show_pcv_page():
-    st.title("📊 Process Compliance Verification (PCV)")
-    st.markdown("---")
 
-    user_role = st.session_state.get("user_role")
-    user_name = st.session_state.get("user_name")
-    conn = st.connection("neon", type="sql")
+@st.fragment
+def bulk_import_tab(user_role, owned_project_keys):
+    st.subheader("📥 Bulk Import PCV Assessments")
+    st.write("Upload a CSV or Excel file with columns `project_key`, `division`, `pcv_score`, `assessment_date`.")
+    uploaded_file = st.file_uploader("Assessment file", type=["csv", "xlsx"], key="pcv_bulk_file")
+    if uploaded_file:
+        try:
+            import_df = read_pcv_assessment_file(uploaded_file)
+        except Exception as e:
+            st.error(f"❌ Could not read file: {e}")
+            import_df = None
+        if import_df is not None:
+            crud_projects_df = _crud_projects(user_role, owned_project_keys)
+            unknown = ~import_df['project_key'].isin(crud_projects_df['project_key'])
+            if unknown.any():
+                st.warning(f"⚠️ Skipping {int(unknown.sum())} rows for unknown or inactive projects.")
+                import_df = import_df[~unknown]
+            st.write(f"{len(import_df)} assessments ready to import.")
+            if st.button("Import Assessments", type="primary", key="pcv_bulk_import"):
+                success, result = bulk_create_pcv_assessments(import_df)
+                if success:
+                    inserted = int((result['result'] == 'inserted').sum())
+                    st.success(f"✅ Imported {inserted} assessments, {len(result) - inserted} duplicates skipped.")
+                    duplicates = result[result['result'] == 'duplicate']
+                    if not duplicates.empty:
+                        st.dataframe(duplicates, use_container_width=True, hide_index=True)
+                else:
+                    st.error(f"❌ {result}")
 
-    # --- Get projects for the current user ---
-    owned_project_keys = []
-    if user_role == 'pm':
-        owned_projects_df = conn.query("SELECT project_key FROM dim_project WHERE owner = :owner_email;", params={"owner_email": user_name})
-        if not owned_projects_df.empty:
-            owned_project_keys = owned_projects_df['project_key'].tolist()
 
-    if st.button("🔄 Refresh Data"):
-        clear_pcv_cache()
-        st.rerun()
+PCV_TABS = {
+    "➕ Create": create_tab,
+    "✏️ Update": update_tab,
+    "🗑️ Delete": delete_tab,
+    "📈 Analytics": analytics_tab,
+    "📥 Bulk Import": bulk_import_tab,
+}
 
-    st.subheader("📋 Current PCV Assessments")
-    
-    # Filters
+
+@st.fragment
+@require_role(["admin"])
+def action_tabs(user_role, owned_project_keys):
+    """CRUD, analytics and import tabs.
+
+    Only the open tab runs; switching tabs reruns this fragment, not the page.
+    """
+    tabs = st.tabs(list(PCV_TABS), key="pcv_tab", on_change="rerun")
+    for tab, render_tab in zip(tabs, PCV_TABS.values()):
+        if tab.open:
+            with tab:
+                render_tab(user_role, owned_project_keys)
+
+
+@st.fragment
+def show_pcv_list(user_role, owned_project_keys):
+    """Filters and the assessment table; changing a filter reruns only this block."""
     col1, col2, col3 = st.columns(3)
     projects_df = get_active_projects()
     if user_role == 'pm':
@@ -163,9 +246,31 @@ def show_pcv_page():
             "updated_at": st.column_config.DatetimeColumn("Last Updated"),
         }, hide_index=True)
 
+
+@require_role(allowed_roles=['admin', 'manager', 'pm'])
+def show_pcv_page():
+    st.title("📊 Process Compliance Verification (PCV)")
+    st.markdown("---")
+
+    user_role = st.session_state.get("user_role")
+    user_name = st.session_state.get("user_name")
+
+    # --- Get projects for the current user ---
+    owned_project_keys = []
+    if user_role == 'pm':
+        owned_projects_df = run_query("project_keys_by_owner", owner=user_name)
+        if not owned_projects_df.empty:
+            owned_project_keys = owned_projects_df['project_key'].tolist()
+
+    if st.button("🔄 Refresh Data"):
+        clear_pcv_cache()
+        st.rerun()
+
+    st.subheader("📋 Current PCV Assessments")
+    show_pcv_list(user_role, owned_project_keys)
+
     st.markdown("---")
-    
-    tab1, tab2, tab3, tab4 = st.tabs(["➕ Create", "✏️ Update", "🗑️ Delete", "📈 Analytics"])
-    action_button(user_role, owned_project_keys, tab1, tab2, tab3, tab4)
+    action_tabs(user_role, owned_project_keys)
 
-show_pcv_page()
\ No newline at end of file
+with track_rerun("pcv"):
+    show_pcv_page()
@@ -2,7 +2,10 @@ import streamlit as st
 import time
 import re
 from utils.auth import require_role, _hash_password, login_form
+from utils.metrics import track_rerun
 from utils.getter import get_user_data
+from utils.queries import execute
+from utils import audit, mirror, sessions
 
 # Configure page
 st.set_page_config(
@@ -85,6 +88,271 @@ def validate_password(password):
         return False, "Password must contain at least one number"
     return True, "Password is strong"
 
+# Each tab body is its own fragment: widgets inside a tab rerun only that tab, and a
+# tab's data is loaded only while the tab is open.
+
+@st.fragment
+def create_user_tab():
+    conn = st.connection("neon", type="sql")
+    st.markdown('<div class="form-section">', unsafe_allow_html=True)
+    st.subheader("Create New User Account")
+
+    with st.form("create_user_form", clear_on_submit=True):
+        col1, col2 = st.columns(2)
+
+        with col1:
+            email = st.text_input("📧 Email Address", placeholder="user@example.com")
+            username = st.selectbox("👤 Username", options=get_user_data())
+
+        with col2:
+            password = st.text_input("🔒 Password", type="password", help="Min 8 chars, 1 uppercase, 1 lowercase, 1 number")
+            confirm_password = st.text_input("🔒 Confirm Password", type="password")
+
+        role = st.selectbox("🎭 Role", ["admin", "manager", "pm"], 
+                          help="Admin: Full access, Manager: Limited access, PM: Project access only")
+
+        # Password strength indicator
+        if password:
+            is_strong, message = validate_password(password)
+            if is_strong:
+                st.success(f"✅ {message}")
+            else:
+                st.warning(f"⚠️ {message}")
+
+        submitted = st.form_submit_button("🚀 Create Account", type="primary", use_container_width=True)
+
+        if submitted:
+            # Enhanced validation
+            errors = []
+
+            if not email or not password or not confirm_password or not username:
+                errors.append("Please fill in all fields!")
+
+            if email and not validate_email(email):
+                errors.append("Please enter a valid email address!")
+
+            if password != confirm_password:
+                errors.append("Passwords do not match!")
+
+            if password:
+                is_strong, message = validate_password(password)
+                if not is_strong:
+                    errors.append(message)
+
+            if errors:
+                for error in errors:
+                    st.error(f"❌ {error}")
+            else:
+                try:
+                    with conn.session as session:
+                        existing = execute(session, "app_user_exists", email=email).fetchone()
+
+                        if existing:
+                            st.error(f"❌ Account with email {email} already exists!")
+                        else:
+                            password_hash = _hash_password(password)
+                            execute(
+                                session, "app_user_insert",
+                                email=email, username=username, password=password_hash, role=role
+                            )
+                            session.commit()
+                            mirror.resync("app_users")
+                            audit.record("app_users", email, "insert", after={"username": username, "role": role})
+                            st.success(f"✅ Successfully created account for {email}!")
+                            st.balloons()
+                            time.sleep(2)
+                            st.rerun()
+                except Exception as e:
+                    st.error(f"❌ Error creating account: {e}")
+
+    st.markdown('</div>', unsafe_allow_html=True)
+
+
+@st.fragment
+def manage_users_tab():
+    conn = st.connection("neon", type="sql")
+    st.markdown('<div class="form-section">', unsafe_allow_html=True)
+    st.subheader("Update/Delete User Account")
+
+    try:
+        users_df = mirror.get_app_users()
+
+        if not users_df.empty:
+            selected_email = st.selectbox("👤 Select user to manage:", users_df["email"].tolist(), key="update_user")
+            current_user = users_df[users_df["email"] == selected_email].iloc[0]
+
+            # Display current user info
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                st.info(f"**Email:** {current_user['email']}")
+            with col2:
+                st.info(f"**Username:** {current_user['username']}")
+            with col3:
+                st.info(f"**Role:** {current_user['role'].title()}")
+
+            with st.form("update_user_form"):
+                col1, col2 = st.columns(2)
+
+                with col1:
+                    new_username = st.text_input("👤 Username", value=current_user["username"])
+                    new_role = st.selectbox("🎭 Role", ["admin", "manager", "pm"], 
+                                          index=["admin", "manager", "pm"].index(current_user["role"]))
+
+                with col2:
+                    new_password = st.text_input("🔒 New Password (leave blank to keep current)", type="password")
+                    confirm_new_password = st.text_input("🔒 Confirm New Password", type="password") if new_password else ""
+
+                # Password strength for new password
+                if new_password:
+                    is_strong, message = validate_password(new_password)
+                    if is_strong:
+                        st.success(f"✅ {message}")
+                    else:
+                        st.warning(f"⚠️ {message}")
+
+                col1, col2 = st.columns(2)
+                with col1:
+                    update_submitted = st.form_submit_button("✏️ Update Account", type="primary", use_container_width=True)
+                with col2:
+                    delete_submitted = st.form_submit_button("🗑️ Delete Account", type="secondary", use_container_width=True)
+
+                if update_submitted:
+                    errors = []
+
+                    if new_password and new_password != confirm_new_password:
+                        errors.append("New passwords do not match!")
+
+                    if new_password:
+                        is_strong, message = validate_password(new_password)
+                        if not is_strong:
+                            errors.append(message)
+
+                    if errors:
+                        for error in errors:
+                            st.error(f"❌ {error}")
+                    else:
+                        try:
+                            with conn.session as session:
+                                if new_password:
+                                    password_hash = _hash_password(new_password)
+                                    result = execute(
+                                        session, "app_user_update_with_password",
+                                        username=new_username, role=new_role, password=password_hash, email=selected_email
+                                    )
+                                    sessions.revoke_user(session, selected_email)
+                                else:
+                                    result = execute(
+                                        session, "app_user_update",
+                                        username=new_username, role=new_role, email=selected_email
+                                    )
+                                before = result.mappings().first()
+                                session.commit()
+                            mirror.resync("app_users")
+                            after = {"username": new_username, "role": new_role}
+                            if new_password:
+                                after["password"] = "changed"
+                            audit.record("app_users", selected_email, "update",
+                                         before=dict(before) if before else None, after=after)
+                            st.success(f"✅ Updated account for {selected_email}!")
+                            time.sleep(1)
+                            st.rerun()
+                        except Exception as e:
+                            st.error(f"❌ Error updating account: {e}")
+
+                if delete_submitted:
+                    # Confirmation dialog
+                    if st.session_state.get('confirm_delete') != selected_email:
+                        st.session_state.confirm_delete = selected_email
+                        st.warning(f"⚠️ Are you sure you want to delete {selected_email}? Click Delete again to confirm.")
+                    else:
+                        try:
+                            with conn.session as session:
+                                before = execute(session, "app_user_delete", email=selected_email).mappings().first()
+                                session.commit()
+                            mirror.resync("app_users")
+                            audit.record("app_users", selected_email, "delete", before=dict(before) if before else None)
+                            st.success(f"🗑️ Deleted account for {selected_email}!")
+                            del st.session_state.confirm_delete
+                            time.sleep(1)
+                            st.rerun()
+                        except Exception as e:
+                            st.error(f"❌ Error deleting account: {e}")
+        else:
+            st.info("📭 No users found in the database.")
+    except Exception as e:
+        st.error(f"❌ Error loading users: {e}")
+
+    st.markdown('</div>', unsafe_allow_html=True)
+
+
+@st.fragment
+def user_list_tab():
+    st.subheader("📋 All Users")
+
+    try:
+        users_df = mirror.get_app_users().sort_values(["role", "email"])
+
+        if not users_df.empty:
+            # Add search functionality
+            search_term = st.text_input("🔍 Search users", placeholder="Search by email or username...")
+
+            if search_term:
+                filtered_df = users_df[
+                    users_df['email'].str.contains(search_term, case=False) |
+                    users_df['username'].str.contains(search_term, case=False)
+                ]
+            else:
+                filtered_df = users_df
+
+            # Role filter
+            roles = ["All"] + list(users_df['role'].unique())
+            selected_role = st.selectbox("Filter by role:", roles)
+
+            if selected_role != "All":
+                filtered_df = filtered_df[filtered_df['role'] == selected_role]
+
+            # Display results
+            st.write(f"Showing {len(filtered_df)} of {len(users_df)} users")
+
+            # Enhanced table display
+            for idx, user in filtered_df.iterrows():
+                with st.container():
+                    col1, col2, col3, col4 = st.columns([3, 2, 2, 1])
+
+                    with col1:
+                        st.write(f"📧 **{user['email']}**")
+                    with col2:
+                        st.write(f"👤 {user['username']}")
+                    with col3:
+                        role_emoji = {"admin": "👑", "manager": "👔", "pm": "📊"}
+                        st.write(f"{role_emoji.get(user['role'], '👤')} {user['role'].title()}")
+                    with col4:
+                        st.write("✅ Active")
+
+                    st.divider()
+        else:
+            st.info("📭 No users found in the database.")
+    except Exception as e:
+        st.error(f"❌ Error loading user list: {e}")
+
+
+USER_TABS = {
+    "➕ Create User": create_user_tab,
+    "✏️ Manage Users": manage_users_tab,
+    "📋 User List": user_list_tab,
+}
+
+
+@st.fragment
+def user_tabs():
+    """Only the open tab runs; switching tabs reruns this fragment, not the page."""
+    tabs = st.tabs(list(USER_TABS), key="user_tab", on_change="rerun")
+    for tab, render_tab in zip(tabs, USER_TABS.values()):
+        if tab.open:
+            with tab:
+                render_tab()
+
+
 @require_role(["admin"])
 def create_account_page():
     # Header
@@ -95,269 +363,22 @@ def create_account_page():
     </div>
     """, unsafe_allow_html=True)
     
-    conn = st.connection("neon", type="sql")
-    
     # Sidebar with statistics
     with st.sidebar:
         st.header("📊 Dashboard Stats")
         try:
-            users_df = conn.query("SELECT role, COUNT(*) as count FROM app_users GROUP BY role")
-            total_users = conn.query("SELECT COUNT(*) as total FROM app_users").iloc[0]['total']
+            all_users_df = mirror.get_app_users()
+            role_counts = all_users_df['role'].value_counts()
             
-            st.metric("Total Users", total_users)
+            st.metric("Total Users", len(all_users_df))
             
-            if not users_df.empty:
-                for _, row in users_df.iterrows():
-                    st.metric(f"{row['role'].title()}s", row['count'])
+            for role, count in role_counts.items():
+                st.metric(f"{role.title()}s", int(count))
         except Exception as e:
             st.error(f"Error loading stats: {e}")
     
     # Main content in tabs
-    tab1, tab2, tab3 = st.tabs(["➕ Create User", "✏️ Manage Users", "📋 User List"])
-    
-    with tab1:
-        st.markdown('<div class="form-section">', unsafe_allow_html=True)
-        st.subheader("Create New User Account")
-        
-        with st.form("create_user_form", clear_on_submit=True):
-            col1, col2 = st.columns(2)
-            
-            with col1:
-                email = st.text_input("📧 Email Address", placeholder="user@example.com")
-                username = st.selectbox("👤 Username", options=get_user_data())
-                
-            with col2:
-                password = st.text_input("🔒 Password", type="password", help="Min 8 chars, 1 uppercase, 1 lowercase, 1 number")
-                confirm_password = st.text_input("🔒 Confirm Password", type="password")
-            
-            role = st.selectbox("🎭 Role", ["admin", "manager", "pm"], 
-                              help="Admin: Full access, Manager: Limited access, PM: Project access only")
-            
-            # Password strength indicator
-            if password:
-                is_strong, message = validate_password(password)
-                if is_strong:
-                    st.success(f"✅ {message}")
-                else:
-                    st.warning(f"⚠️ {message}")
-            
-            submitted = st.form_submit_button("🚀 Create Account", type="primary", use_container_width=True)
-            
-            if submitted:
-                # Enhanced validation
-                errors = []
-                
-                if not email or not password or not confirm_password or not username:
-                    errors.append("Please fill in all fields!")
-                
-                if email and not validate_email(email):
-                    errors.append("Please enter a valid email address!")
-                
-                if password != confirm_password:
-                    errors.append("Passwords do not match!")
-                
-                if password:
-                    is_strong, message = validate_password(password)
-                    if not is_strong:
-                        errors.append(message)
-                
-                if errors:
-                    for error in errors:
-                        st.error(f"❌ {error}")
-                else:
-                    try:
-                        from sqlalchemy import text
-                        with conn.session as session:
-                            existing = session.execute(
-                                text("SELECT 1 FROM app_users WHERE email = :email"),
-                                {"email": email}
-                            ).fetchone()
-                            
-                            if existing:
-                                st.error(f"❌ Account with email {email} already exists!")
-                            else:
-                                password_hash = _hash_password(password)
-                                session.execute(
-                                    text("""
-                                        INSERT INTO app_users (email, username, password, role)
-                                        VALUES (:email, :username, :password, :role)
-                                    """),
-                                    {"email": email, "username": username, "password": password_hash, "role": role}
-                                )
-                                session.commit()
-                                st.success(f"✅ Successfully created account for {email}!")
-                                st.balloons()
-                                time.sleep(2)
-                                st.rerun()
-                    except Exception as e:
-                        st.error(f"❌ Error creating account: {e}")
-        
-        st.markdown('</div>', unsafe_allow_html=True)
-    
-    with tab2:
-        st.markdown('<div class="form-section">', unsafe_allow_html=True)
-        st.subheader("Update/Delete User Account")
-        
-        try:
-            users_df = conn.query("SELECT email, username, role FROM app_users ORDER BY email")
-            
-            if not users_df.empty:
-                selected_email = st.selectbox("👤 Select user to manage:", users_df["email"].tolist(), key="update_user")
-                current_user = users_df[users_df["email"] == selected_email].iloc[0]
-                
-                # Display current user info
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    st.info(f"**Email:** {current_user['email']}")
-                with col2:
-                    st.info(f"**Username:** {current_user['username']}")
-                with col3:
-                    st.info(f"**Role:** {current_user['role'].title()}")
-                
-                with st.form("update_user_form"):
-                    col1, col2 = st.columns(2)
-                    
-                    with col1:
-                        new_username = st.text_input("👤 Username", value=current_user["username"])
-                        new_role = st.selectbox("🎭 Role", ["admin", "manager", "pm"], 
-                                              index=["admin", "manager", "pm"].index(current_user["role"]))
-                    
-                    with col2:
-                        new_password = st.text_input("🔒 New Password (leave blank to keep current)", type="password")
-                        confirm_new_password = st.text_input("🔒 Confirm New Password", type="password") if new_password else ""
-                    
-                    # Password strength for new password
-                    if new_password:
-                        is_strong, message = validate_password(new_password)
-                        if is_strong:
-                            st.success(f"✅ {message}")
-                        else:
-                            st.warning(f"⚠️ {message}")
-                    
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        update_submitted = st.form_submit_button("✏️ Update Account", type="primary", use_container_width=True)
-                    with col2:
-                        delete_submitted = st.form_submit_button("🗑️ Delete Account", type="secondary", use_container_width=True)
-                    
-                    if update_submitted:
-                        errors = []
-                        
-                        if new_password and new_password != confirm_new_password:
-                            errors.append("New passwords do not match!")
-                        
-                        if new_password:
-                            is_strong, message = validate_password(new_password)
-                            if not is_strong:
-                                errors.append(message)
-                        
-                        if errors:
-                            for error in errors:
-                                st.error(f"❌ {error}")
-                        else:
-                            try:
-                                from sqlalchemy import text
-                                with conn.session as session:
-                                    if new_password:
-                                        password_hash = _hash_password(new_password)
-                                        session.execute(
-                                            text("""
-                                                UPDATE app_users 
-                                                SET username = :username, role = :role, password = :password 
-                                                WHERE email = :email
-                                            """),
-                                            {"username": new_username, "role": new_role, "password": password_hash, "email": selected_email}
-                                        )
-                                    else:
-                                        session.execute(
-                                            text("""
-                                                UPDATE app_users 
-                                                SET username = :username, role = :role 
-                                                WHERE email = :email
-                                            """),
-                                            {"username": new_username, "role": new_role, "email": selected_email}
-                                        )
-                                    session.commit()
-                                st.success(f"✅ Updated account for {selected_email}!")
-                                time.sleep(1)
-                                st.rerun()
-                            except Exception as e:
-                                st.error(f"❌ Error updating account: {e}")
-                    
-                    if delete_submitted:
-                        # Confirmation dialog
-                        if st.session_state.get('confirm_delete') != selected_email:
-                            st.session_state.confirm_delete = selected_email
-                            st.warning(f"⚠️ Are you sure you want to delete {selected_email}? Click Delete again to confirm.")
-                        else:
-                            try:
-                                from sqlalchemy import text
-                                with conn.session as session:
-                                    session.execute(
-                                        text("DELETE FROM app_users WHERE email = :email"),
-                                        {"email": selected_email}
-                                    )
-                                    session.commit()
-                                st.success(f"🗑️ Deleted account for {selected_email}!")
-                                del st.session_state.confirm_delete
-                                time.sleep(1)
-                                st.rerun()
-                            except Exception as e:
-                                st.error(f"❌ Error deleting account: {e}")
-            else:
-                st.info("📭 No users found in the database.")
-        except Exception as e:
-            st.error(f"❌ Error loading users: {e}")
-        
-        st.markdown('</div>', unsafe_allow_html=True)
-    
-    with tab3:
-        st.subheader("📋 All Users")
-        
-        try:
-            users_df = conn.query("SELECT email, username, role FROM app_users ORDER BY role, email")
-            
-            if not users_df.empty:
-                # Add search functionality
-                search_term = st.text_input("🔍 Search users", placeholder="Search by email or username...")
-                
-                if search_term:
-                    filtered_df = users_df[
-                        users_df['email'].str.contains(search_term, case=False) |
-                        users_df['username'].str.contains(search_term, case=False)
-                    ]
-                else:
-                    filtered_df = users_df
-                
-                # Role filter
-                roles = ["All"] + list(users_df['role'].unique())
-                selected_role = st.selectbox("Filter by role:", roles)
-                
-                if selected_role != "All":
-                    filtered_df = filtered_df[filtered_df['role'] == selected_role]
-                
-                # Display results
-                st.write(f"Showing {len(filtered_df)} of {len(users_df)} users")
-                
-                # Enhanced table display
-                for idx, user in filtered_df.iterrows():
-                    with st.container():
-                        col1, col2, col3, col4 = st.columns([3, 2, 2, 1])
-                        
-                        with col1:
-                            st.write(f"📧 **{user['email']}**")
-                        with col2:
-                            st.write(f"👤 {user['username']}")
-                        with col3:
-                            role_emoji = {"admin": "👑", "manager": "👔", "pm": "📊"}
-                            st.write(f"{role_emoji.get(user['role'], '👤')} {user['role'].title()}")
-                        with col4:
-                            st.write("✅ Active")
-                        
-                        st.divider()
-            else:
-                st.info("📭 No users found in the database.")
-        except Exception as e:
-            st.error(f"❌ Error loading user list: {e}")
+    user_tabs()
 
-create_account_page()
+with track_rerun("users"):
+    create_account_page()
@@ -1,20 +1,21 @@
 import streamlit as st
 import pandas as pd
-from sqlalchemy import text
 from utils.auth import require_role, login_form
+from utils.metrics import track_rerun
 from utils.header_nav import header_nav
+from utils.queries import execute
+from utils import audit, mirror
+from utils.progress import clear_progress_cache, refresh_progress, workflow_projects
 
 st.set_page_config(page_title="Workflow Management", page_icon="⚙️", layout="wide")
 login_form()
 
 header_nav(current_page="workflow")
 
-@st.cache_data(ttl=10)
-def get_workflows(_conn):
-    """Fetches all workflows and their associated statuses."""
+def get_workflows():
+    """Fetches all workflows and their associated statuses from the local dimension mirror."""
     try:
-        workflows_df = _conn.query("SELECT * FROM workflow ORDER BY workflow_name;", ttl=5)
-        statuses_df = _conn.query("SELECT * FROM workflow_status;", ttl=5)
+        workflows_df, statuses_df = mirror.get_workflow_tables()
         
         workflow_map = {}
         for _, workflow in workflows_df.iterrows():
@@ -36,29 +37,18 @@ def get_workflows(_conn):
         st.error(f"Error fetching workflows: {e}")
         return {}
 
-@st.cache_data(ttl=60)
-def get_status_names(_conn):
-    """Fetches all status names from dim_status."""
+def get_status_names():
+    """Fetches all status names from dim_status via the local dimension mirror."""
     try:
-        status_df = _conn.query("SELECT status_name FROM dim_status ORDER BY status_name;", ttl=60)
-        return status_df['status_name'].tolist()
+        return mirror.get_status_names()
     except Exception as e:
         st.error(f"Error fetching status names: {e}")
         return []
 
-@require_role(allowed_roles=['admin', 'manager'])
-def show_workflow_management():
-    """Main function to display the workflow management page."""
-    st.title("⚙️ Workflow Management")
-    st.write("Create, edit, and manage project workflows and their status-to-done ratios.")
-
+@st.fragment
+def create_workflow_form():
+    """Create form; a rejected submit reruns only this block."""
     conn = st.connection("neon", type="sql")
-
-    if st.button("🔄 Refresh"):
-        st.cache_data.clear()
-        st.rerun()
-
-    # --- Create New Workflow ---
     with st.form("create_workflow_form"):
         st.subheader("➕ Create New Workflow")
         new_workflow_name = st.text_input("Workflow Name")
@@ -70,105 +60,160 @@ def show_workflow_management():
             else:
                 try:
                     with conn.session as s:
-                        s.execute(
-                            text("INSERT INTO workflow (workflow_name) VALUES (:name) ON CONFLICT (workflow_name) DO NOTHING;"),
-                            {"name": new_workflow_name}
-                        )
+                        execute(s, "workflow_insert", workflow_name=new_workflow_name)
+                        # Projects may already name it as their scope.
+                        refresh_progress(s, workflow_projects(s, new_workflow_name))
                         s.commit()
+                    mirror.resync("workflow")
+                    audit.record("workflow", new_workflow_name, "insert", after={"workflow_name": new_workflow_name})
                     st.success(f"Workflow '{new_workflow_name}' created or already exists.")
-                    st.cache_data.clear()
+                    clear_progress_cache()
                     st.rerun()
                 except Exception as e:
                     st.error(f"Error creating workflow: {e}")
-    
+
+
+@st.fragment
+def workflow_panel(workflow_id, workflow_data):
+    """One workflow's status editor.
+
+    The body (and the status name lookup) runs only while the expander is open, and
+    edits rerun only this panel.
+    """
+    conn = st.connection("neon", type="sql")
+    expander = st.expander(
+        f"**{workflow_data['name']}** (ID: {workflow_id})", key=f"workflow_{workflow_id}", on_change="rerun"
+    )
+    if not expander.open:
+        return
+    with expander:
+        status_names = get_status_names()
+
+        if workflow_data['statuses']:
+            original_statuses = pd.DataFrame(workflow_data['statuses'])
+        else:
+            # Create an empty DF with the correct columns if no statuses exist
+            original_statuses = pd.DataFrame(columns=['status_id', 'status_name', 'done_ratio'])
+
+        edited_statuses = st.data_editor(
+            original_statuses,
+            num_rows="dynamic",
+            use_container_width=True,
+            hide_index=True,
+            column_config={
+                "status_id": None,
+                "status_name": st.column_config.SelectboxColumn(
+                    "Status Name",
+                    options=status_names,
+                    required=True
+                ),
+                "done_ratio": st.column_config.NumberColumn(
+                    "Done Ratio (0.0 to 1.0)",
+                    min_value=0.0,
+                    max_value=1.0,
+                    step=0.01,
+                    format="%.2f",
+                    required=True,
+                ),
+            },
+            key=f"editor_{workflow_id}"
+        )
+
+        col1, col2 = st.columns(2)
+        with col1:
+            if st.button("💾 Save Statuses", key=f"save_{workflow_id}", type="primary"):
+                try:
+                    before_by_id = original_statuses.set_index('status_id')
+                    with conn.session as s:
+                        original_ids = set(original_statuses['status_id'].dropna())
+                        edited_ids = set(edited_statuses['status_id'].dropna())
+
+                        deleted_ids = original_ids - edited_ids
+                        if deleted_ids:
+                            execute(s, "workflow_status_delete_many", status_ids=list(deleted_ids))
+                        ratios_changed = bool(deleted_ids)
+
+                        for _, row in edited_statuses.iterrows():
+                            status_id = row.get('status_id')
+                            status_name = row['status_name']
+                            done_ratio = row['done_ratio']
+
+                            if pd.isna(status_id): 
+                                execute(
+                                    s, "workflow_status_insert",
+                                    workflow_id=workflow_id, status_name=status_name, done_ratio=done_ratio
+                                )
+                                ratios_changed = True
+                            else:
+                                execute(
+                                    s, "workflow_status_update",
+                                    status_name=status_name, done_ratio=done_ratio, status_id=status_id
+                                )
+                                before = before_by_id.loc[status_id]
+                                ratios_changed |= before['status_name'] != status_name or before['done_ratio'] != done_ratio
+
+                        # Only the projects following this workflow are recomputed.
+                        if ratios_changed:
+                            refresh_progress(s, workflow_projects(s, workflow_data['name']))
+                        s.commit()
+                    mirror.resync("workflow_status")
+
+                    for status_id in deleted_ids:
+                        audit.record("workflow_status", int(status_id), "delete", before=before_by_id.loc[status_id])
+                    for _, row in edited_statuses.iterrows():
+                        after = {"workflow_id": workflow_id, "status_name": row['status_name'], "done_ratio": row['done_ratio']}
+                        if pd.isna(row.get('status_id')):
+                            audit.record("workflow_status", f"{workflow_id}|{row['status_name']}", "insert", after=after)
+                        else:
+                            before = before_by_id.loc[row['status_id']]
+                            if before['status_name'] != row['status_name'] or before['done_ratio'] != row['done_ratio']:
+                                audit.record("workflow_status", int(row['status_id']), "update", before=before, after=after)
+                    st.success("Statuses updated successfully!")
+                    clear_progress_cache()
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"Error saving statuses: {e}")
+
+        with col2:
+            if st.button("🗑️ Delete Workflow", key=f"delete_{workflow_id}"):
+                try:
+                    with conn.session as s:
+                        execute(s, "workflow_delete", workflow_id=workflow_id)
+                        refresh_progress(s, workflow_projects(s, workflow_data['name']))
+                        s.commit()
+                    mirror.resync("workflow", "workflow_status")
+                    audit.record("workflow", workflow_id, "delete", before={
+                        "workflow_name": workflow_data['name'], "statuses": workflow_data['statuses']
+                    })
+                    st.success(f"Workflow '{workflow_data['name']}' deleted.")
+                    clear_progress_cache()
+                    st.rerun()
+                except Exception as e:
+                    st.error(f"Error deleting workflow: {e}")
+
+
+@require_role(allowed_roles=['admin', 'manager'])
+def show_workflow_management():
+    """Main function to display the workflow management page."""
+    st.title("⚙️ Workflow Management")
+    st.write("Create, edit, and manage project workflows and their status-to-done ratios.")
+
+    if st.button("🔄 Refresh"):
+        clear_progress_cache()
+        mirror.resync()
+        st.rerun()
+
+    create_workflow_form()
+
     st.markdown("---")
 
-    workflows = get_workflows(conn)
-    status_names = get_status_names(conn)
+    workflows = get_workflows()
 
     if not workflows:
         st.info("No workflows found. Create one above.")
 
     for workflow_id, workflow_data in workflows.items():
-        with st.expander(f"**{workflow_data['name']}** (ID: {workflow_id})"):
-            
-            if workflow_data['statuses']:
-                original_statuses = pd.DataFrame(workflow_data['statuses'])
-            else:
-                # Create an empty DF with the correct columns if no statuses exist
-                original_statuses = pd.DataFrame(columns=['status_id', 'status_name', 'done_ratio'])
-            
-            edited_statuses = st.data_editor(
-                original_statuses,
-                num_rows="dynamic",
-                use_container_width=True,
-                hide_index=True,
-                column_config={
-                    "status_id": None,
-                    "status_name": st.column_config.SelectboxColumn(
-                        "Status Name",
-                        options=status_names,
-                        required=True
-                    ),
-                    "done_ratio": st.column_config.NumberColumn(
-                        "Done Ratio (0.0 to 1.0)",
-                        min_value=0.0,
-                        max_value=1.0,
-                        step=0.01,
-                        format="%.2f",
-                        required=True,
-                    ),
-                },
-                key=f"editor_{workflow_id}"
-            )
-
-            col1, col2 = st.columns(2)
-            with col1:
-                if st.button("💾 Save Statuses", key=f"save_{workflow_id}", type="primary"):
-                    try:
-                        with conn.session as s:
-                            original_ids = set(original_statuses['status_id'].dropna())
-                            edited_ids = set(edited_statuses['status_id'].dropna())
-
-                            deleted_ids = original_ids - edited_ids
-                            if deleted_ids:
-                                s.execute(
-                                    text("DELETE FROM workflow_status WHERE status_id = ANY(:ids)"),
-                                    {'ids': list(deleted_ids)}
-                                )
+        workflow_panel(workflow_id, workflow_data)
 
-                            for _, row in edited_statuses.iterrows():
-                                status_id = row.get('status_id')
-                                status_name = row['status_name']
-                                done_ratio = row['done_ratio']
-
-                                if pd.isna(status_id): 
-                                    s.execute(
-                                        text("INSERT INTO workflow_status (workflow_id, status_name, done_ratio) VALUES (:wid, :name, :ratio) ON CONFLICT (workflow_id, status_name) DO NOTHING;"),
-                                        {'wid': workflow_id, 'name': status_name, 'ratio': done_ratio}
-                                    )
-                                else:
-                                    s.execute(
-                                        text("UPDATE workflow_status SET status_name = :name, done_ratio = :ratio WHERE status_id = :sid;"),
-                                        {'name': status_name, 'ratio': done_ratio, 'sid': status_id}
-                                    )
-                            s.commit()
-                        st.success("Statuses updated successfully!")
-                        st.cache_data.clear()
-                        st.rerun()
-                    except Exception as e:
-                        st.error(f"Error saving statuses: {e}")
-
-            with col2:
-                if st.button("🗑️ Delete Workflow", key=f"delete_{workflow_id}"):
-                    try:
-                        with conn.session as s:
-                            s.execute(text("DELETE FROM workflow WHERE workflow_id = :wid;"), {'wid': workflow_id})
-                            s.commit()
-                        st.success(f"Workflow '{workflow_data['name']}' deleted.")
-                        st.cache_data.clear()
-                        st.rerun()
-                    except Exception as e:
-                        st.error(f"Error deleting workflow: {e}")
-
-show_workflow_management()
+with track_rerun("workflow"):
+    show_workflow_management()
@@ -0,0 +1,81 @@
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+from utils.auth import require_role, login_form
+from utils.metrics import track_rerun
+from utils.header_nav import header_nav
+from utils.presales_utils import get_deals_cube, funnel_from_cube
+
+st.set_page_config(page_title="Presales Analytics", page_icon="📈", layout="wide")
+login_form()
+
+header_nav(current_page="analytics")
+
+@require_role(allowed_roles=['admin', 'manager'])
+def show_presales_analytics():
+    """Presales pipeline dashboard. Reads only the pre-aggregated deal cube."""
+    st.title("📈 Presales Pipeline")
+
+    if st.button("🔄 Refresh"):
+        get_deals_cube.clear()
+        st.rerun()
+
+    cube_df = get_deals_cube()
+    if cube_df.empty:
+        st.info("No presales data yet. Import deals on the Pre-sales Import page.")
+        st.stop()
+
+    # -------------------- Filters --------------------
+    col1, col2, col3 = st.columns(3)
+    years = sorted(cube_df['year'].dropna().astype(int).unique().tolist(), reverse=True)
+    year_filter = col1.selectbox("Year", ["All"] + years)
+    division_filter = col2.multiselect("Division", sorted(cube_df['division'].unique().tolist()))
+    type_filter = col3.multiselect("Project Type", sorted(cube_df['project_type'].unique().tolist()))
+
+    filtered = cube_df
+    if year_filter != "All":
+        filtered = filtered[filtered['year'] == year_filter]
+    if division_filter:
+        filtered = filtered[filtered['division'].isin(division_filter)]
+    if type_filter:
+        filtered = filtered[filtered['project_type'].isin(type_filter)]
+
+    if filtered.empty:
+        st.info("No deals match the selected filters.")
+        st.stop()
+
+    # -------------------- KPIs --------------------
+    won = filtered[filtered['status'] == 'Won']
+    k1, k2, k3 = st.columns(3)
+    k1.metric("Deals", int(filtered['deal_count'].sum()))
+    k2.metric("Pipeline Amount", f"${filtered['total_amount'].sum():,.0f}")
+    k3.metric("Won Amount", f"${won['total_amount'].sum():,.0f}")
+
+    # -------------------- Funnel --------------------
+    st.subheader("Pipeline Funnel")
+    funnel_df = funnel_from_cube(filtered)
+    st.plotly_chart(px.funnel(funnel_df, x="deal_count", y="stage"), use_container_width=True)
+
+    # -------------------- Trend --------------------
+    st.subheader("Monthly Trend")
+    trend_df = (
+        filtered.dropna(subset=['year', 'month'])
+        .groupby(['year', 'month', 'status'], as_index=False)[['deal_count', 'total_amount']].sum()
+    )
+    trend_df['period'] = pd.to_datetime(
+        trend_df['year'].astype(int).astype(str) + "-" + trend_df['month'].astype(int).astype(str) + "-01"
+    )
+    metric = st.radio("Measure", ["total_amount", "deal_count"], horizontal=True,
+                      format_func=lambda m: "Amount" if m == "total_amount" else "Deals")
+    st.plotly_chart(
+        px.line(trend_df.sort_values('period'), x="period", y=metric, color="status", markers=True),
+        use_container_width=True
+    )
+
+    # -------------------- Division breakdown --------------------
+    st.subheader("By Division and Status")
+    breakdown = filtered.pivot_table(index="division", columns="status", values="total_amount", aggfunc="sum", fill_value=0)
+    st.dataframe(breakdown, use_container_width=True)
+
+with track_rerun("analytics"):
+    show_presales_analytics()
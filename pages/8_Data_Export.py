@@ -0,0 +1,48 @@
+import streamlit as st
+from functools import partial
+from utils.auth import require_role, login_form
+from utils.metrics import track_rerun
+from utils.header_nav import header_nav
+from utils.db import read_engine
+from utils.export import (
+    FORMATS, available_formats, exports_for_role, export_file_name, export_for_download,
+    MAX_DOWNLOAD_ROWS
+)
+
+st.set_page_config(page_title="Data Export", page_icon="📤")
+login_form()
+
+header_nav(current_page="export")
+
+@require_role(allowed_roles=['admin', 'manager', 'pm'])
+def show_data_export():
+    """Download tables as CSV or Parquet. PMs only get rows of projects they own."""
+    st.title("📤 Data Export")
+
+    user_role = st.session_state.get("user_role")
+    user_name = st.session_state.get("user_name")
+
+    exports = exports_for_role(user_role)
+    col1, col2 = st.columns(2)
+    table = col1.selectbox("Table", list(exports), format_func=lambda t: exports[t].label)
+    fmt = col2.radio("Format", available_formats(), horizontal=True, format_func=str.upper)
+
+    if user_role == 'pm' and exports[table].owner_scoped:
+        st.caption(f"Only rows of projects owned by {user_name} are included.")
+
+    st.caption(
+        f"Downloads are limited to {MAX_DOWNLOAD_ROWS:,} rows. "
+        "Larger tables can be exported with `python -m utils.export`."
+    )
+
+    # The export runs only when the button is clicked; Streamlit holds the result in memory.
+    st.download_button(
+        f"⬇️ Download {exports[table].label}",
+        data=partial(export_for_download, read_engine(), table, fmt, user_role, user_name),
+        file_name=export_file_name(table, fmt),
+        mime=FORMATS[fmt][0],
+        type="primary",
+    )
+
+with track_rerun("export"):
+    show_data_export()
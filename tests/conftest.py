@@ -0,0 +1,61 @@
+"""Shared fixtures.
+
+Tests that need PostgreSQL run against the database in ``TEST_DATABASE_URL`` and are
+skipped when it is not set. Use a scratch database: migrations are applied to it.
+
+    TEST_DATABASE_URL=postgresql+psycopg2://postgres@localhost/prj_test python -m pytest
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+from sqlalchemy import create_engine
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+@pytest.fixture(scope="session")
+def database_url():
+    url = os.getenv("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL is not set")
+    return url
+
+
+@pytest.fixture(scope="session")
+def engine(database_url):
+    from utils.migrations import run_migrations
+
+    engine = create_engine(database_url)
+    run_migrations(engine)
+    yield engine
+    engine.dispose()
+
+
+@pytest.fixture
+def app_secrets(tmp_path):
+    """Write a secrets.toml for ``AppTest`` runs and return a function that fills it.
+
+    ``AppTest.secrets`` only replaces ``st.secrets``; ``st.connection`` reads the secrets
+    files, so the test configuration has to live in one.
+    """
+    import streamlit as st
+    import toml
+    from streamlit import config
+    from streamlit.runtime.secrets import secrets_singleton
+
+    path = tmp_path / "secrets.toml"
+    files = config.get_option("secrets.files")
+
+    def write(secrets):
+        path.write_text(toml.dumps(secrets))
+        config.set_option("secrets.files", [str(path)])
+        secrets_singleton._secrets = None
+        st.cache_resource.clear()
+
+    yield write
+    config.set_option("secrets.files", files)
+    secrets_singleton._secrets = None
+    st.cache_resource.clear()
@@ -0,0 +1,73 @@
+"""Read-your-writes across a primary and a read endpoint.
+
+Needs a second instance (or database) besides ``TEST_DATABASE_URL``; it does not have to
+stream from the primary, in which case ``read_engine`` falls back to the lag window:
+
+    TEST_REPLICA_URL=postgresql+psycopg2://postgres@localhost/prj_replica python -m pytest
+"""
+import os
+
+import pytest
+from sqlalchemy import text
+from streamlit.testing.v1 import AppTest
+
+from utils import db
+
+
+def _script():
+    import streamlit as st
+    from sqlalchemy import text
+    from sqlalchemy.orm import Session
+
+    from utils import db
+
+    primary = db.primary_connection().engine
+    with Session(primary) as session:
+        if st.session_state.get("action") == "write":
+            session.execute(text("UPDATE dim_project SET project_name = 'RYW' WHERE project_key = 'RYW-1'"))
+        else:
+            session.execute(text("SELECT project_name FROM dim_project WHERE project_key = 'RYW-1'"))
+        session.commit()
+    st.session_state["reads_primary"] = db.read_engine() is primary
+
+
+@pytest.fixture
+def replica_url():
+    url = os.getenv("TEST_REPLICA_URL")
+    if not url:
+        pytest.skip("TEST_REPLICA_URL is not set")
+    return url
+
+
+@pytest.fixture
+def app(engine, database_url, replica_url, app_secrets):
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO dim_project (project_key, project_name) VALUES ('RYW-1', 'RYW')"))
+    app_secrets({"connections": {
+        db.PRIMARY_CONNECTION: {"url": database_url},
+        db.REPLICA_CONNECTION: {"url": replica_url},
+    }})
+    at = AppTest.from_function(_script, default_timeout=30)
+    yield at
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM dim_project WHERE project_key = 'RYW-1'"))
+
+
+def test_reads_go_to_replica_without_writes(app):
+    app.run()
+    assert not app.exception
+    assert app.session_state["reads_primary"] is False
+
+
+def test_reads_stay_on_primary_after_a_write(app, monkeypatch):
+    app.session_state["action"] = "write"
+    app.run()
+    assert not app.exception
+    assert app.session_state["reads_primary"] is True
+
+    # The second database is not a standby, so only the lag window keeps reads pinned.
+    monkeypatch.setattr(db, "REPLICA_MAX_LAG_SECONDS", 0)
+    app.session_state["action"] = "read"
+    app.run()
+    assert not app.exception
+    assert app.session_state["reads_primary"] is False
@@ -0,0 +1,126 @@
+"""Lazy tabs and fragments: an interaction reruns only its own block and loads only its data."""
+from collections import Counter
+from datetime import date
+
+import pytest
+from sqlalchemy import text
+from streamlit.testing.v1 import AppTest
+
+from tests.conftest import ROOT
+from utils import mirror
+from utils.queries import get_query_stats
+
+# Reads that only the PCV Analytics tab makes.
+ANALYTICS_QUERIES = {"pcv_stats_by_division", "pcv_recent", "pcv_trend"}
+
+
+def _calls():
+    stats = get_query_stats()
+    return Counter(dict(zip(stats["query"], stats["calls"])))
+
+
+def _queries_during(action):
+    before = _calls()
+    action()
+    return {name for name, calls in (_calls() - before).items() if calls}
+
+
+@pytest.fixture
+def pcv_data(engine):
+    with engine.begin() as connection:
+        connection.execute(text("""
+            INSERT INTO dim_project (project_key, project_name, status) VALUES ('FRAG-1', 'Fragment test', 'Active')
+        """))
+        connection.execute(text("""
+            INSERT INTO fact_pcv_metrics (project_key, division, pcv_score, assessment_date)
+            VALUES ('FRAG-1', 'Division 1', 80, :d1), ('FRAG-1', 'Division 1', 90, :d2)
+        """), {"d1": date(2024, 1, 1), "d2": date(2024, 2, 1)})
+    yield
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM fact_pcv_metrics WHERE project_key = 'FRAG-1'"))
+        connection.execute(text("DELETE FROM dim_project WHERE project_key = 'FRAG-1'"))
+
+
+@pytest.fixture
+def app(database_url, app_secrets, monkeypatch):
+    import utils.auth
+    import utils.header_nav
+
+    monkeypatch.setattr(utils.auth, "login_form", lambda: None)
+    monkeypatch.setattr(utils.header_nav, "header_nav", lambda current_page=None: None)
+
+    app_secrets({"connections": {"neon": {"url": database_url}}})
+
+    def load(page):
+        at = AppTest.from_file(str(ROOT / "pages" / page), default_timeout=60)
+        at.session_state["logged_in"] = True
+        at.session_state["user_role"] = "admin"
+        at.session_state["user_name"] = "admin"
+        at.session_state["user_email"] = "admin@example.com"
+        return at
+
+    return load
+
+
+def _clear_caches():
+    from utils.pcv_utils import clear_pcv_cache
+    from utils import snapshot_cache
+
+    clear_pcv_cache()
+    snapshot_cache.clear()
+
+
+def test_pcv_tab_interactions_stay_in_their_tab(app, pcv_data):
+    # AppTest reruns the whole script on every interaction (fragments included), so this
+    # checks the stricter property: only the open tab's body runs and loads data.
+    at = app("4_PCV_Assessment.py")
+    at.session_state["pcv_tab"] = "📈 Analytics"
+    _clear_caches()
+    ran = _queries_during(at.run)
+    assert not at.exception
+    # The open Analytics tab does load its data, so the checks below are not vacuous.
+    assert ANALYTICS_QUERIES <= ran
+
+    at.session_state["pcv_tab"] = "✏️ Update"
+    _clear_caches()
+    ran = _queries_during(at.run)
+    assert not at.exception
+    assert not ran & ANALYTICS_QUERIES
+
+    # AppTest has no tab setter and resends the tab's last frontend value, so pin it again.
+    at.session_state["pcv_tab"] = "✏️ Update"
+    _clear_caches()
+    ran = _queries_during(lambda: at.selectbox(key="update_select").select_index(1).run())
+    assert not at.exception
+    assert any(n.label == "New PCV Score" for n in at.number_input)
+    assert not ran & ANALYTICS_QUERIES
+
+    at.session_state["pcv_tab"] = "✏️ Update"
+    _clear_caches()
+    ran = _queries_during(lambda: at.selectbox(key="division_filter").select("Division 1").run())
+    assert not at.exception
+    assert not ran & ANALYTICS_QUERIES
+
+
+def test_closed_workflow_panels_load_nothing(app, engine, monkeypatch):
+    with engine.begin() as connection:
+        connection.execute(text("INSERT INTO workflow (workflow_name) VALUES ('FRAG workflow')"))
+        workflow_id = connection.execute(
+            text("SELECT workflow_id FROM workflow WHERE workflow_name = 'FRAG workflow'")
+        ).scalar()
+    loads = []
+    get_status_names = mirror.get_status_names
+    monkeypatch.setattr(mirror, "get_status_names", lambda: loads.append(1) or get_status_names())
+    try:
+        at = app("6_Workflow_Management.py")
+        at.run()
+        assert not at.exception
+        assert loads == []
+
+        at.session_state[f"workflow_{workflow_id}"] = True
+        at.run()
+        assert not at.exception
+        assert len(loads) == 1
+    finally:
+        with engine.begin() as connection:
+            connection.execute(text("DELETE FROM workflow WHERE workflow_id = :id"), {"id": workflow_id})
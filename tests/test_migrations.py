@@ -0,0 +1,15 @@
+import pytest
+
+from utils.migrations import HOT_QUERIES, check_query_plans
+from utils.queries import QUERIES
+
+
+def test_hot_queries_are_catalogued():
+    for name, (params, _) in HOT_QUERIES.items():
+        assert name in QUERIES
+        assert set(params) == {p for p, _ in QUERIES[name].params}
+
+
+@pytest.mark.parametrize("rows", [50_000])
+def test_hot_queries_use_indexes(engine, rows):
+    assert check_query_plans(engine, rows=rows) == {}
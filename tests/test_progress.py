@@ -0,0 +1,45 @@
+import pytest
+from sqlalchemy import text
+
+PROGRESS = text("SELECT sprints, done_ratio FROM agg_project_progress WHERE project_key = 'PROG-1'")
+
+
+@pytest.fixture
+def project(engine):
+    with engine.begin() as connection:
+        workflow_id = connection.execute(text(
+            "INSERT INTO workflow (workflow_name) VALUES ('PROG workflow') RETURNING workflow_id"
+        )).scalar()
+        connection.execute(text("""
+            INSERT INTO workflow_status (workflow_id, status_name, done_ratio)
+            VALUES (:id, 'Open', 0), (:id, 'Done', 1)
+        """), {"id": workflow_id})
+        connection.execute(text("""
+            INSERT INTO dim_project (project_key, project_name, scope) VALUES ('PROG-1', 'Progress', 'PROG workflow')
+        """))
+    yield
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM dim_sprint WHERE project_key = 'PROG-1'"))
+        connection.execute(text("DELETE FROM dim_project WHERE project_key = 'PROG-1'"))
+        connection.execute(text("DELETE FROM agg_project_progress WHERE project_key = 'PROG-1'"))
+        connection.execute(text("DELETE FROM workflow WHERE workflow_name = 'PROG workflow'"))
+
+
+def test_progress_follows_sprint_loads(engine, project):
+    # Loaded the way the external sprint sync does: straight into dim_sprint.
+    with engine.begin() as connection:
+        connection.execute(text("""
+            INSERT INTO dim_sprint (sprint_name, project_key, status) VALUES ('S1', 'PROG-1', 'Open'), ('S2', 'PROG-1', 'Open')
+        """))
+    with engine.connect() as connection:
+        assert connection.execute(PROGRESS).one() == (2, 0)
+
+    with engine.begin() as connection:
+        connection.execute(text("UPDATE dim_sprint SET status = 'Done' WHERE project_key = 'PROG-1'"))
+    with engine.connect() as connection:
+        assert connection.execute(PROGRESS).one() == (2, 1)
+
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM dim_sprint WHERE project_key = 'PROG-1' AND sprint_name = 'S2'"))
+    with engine.connect() as connection:
+        assert connection.execute(PROGRESS).one() == (1, 1)
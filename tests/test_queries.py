@@ -0,0 +1,19 @@
+import pytest
+
+from utils.queries import QUERIES, _declare
+from utils.snapshot_cache import source_tables
+
+
+def test_cached_reads_declare_versioned_tables():
+    for name in ("projects_brief_all", "sprints_active", "dim_sprints_active", "pcv_trend", "pcv_recent"):
+        assert source_tables(name) == QUERIES[name].tables
+
+
+def test_reads_without_declared_tables_are_not_cached():
+    with pytest.raises(ValueError, match="declares no source tables"):
+        source_tables("deals_cube_read")
+
+
+def test_declared_tables_must_appear_in_the_sql():
+    with pytest.raises(ValueError, match="does not mention: sprint_info"):
+        _declare("test_wrong_tables", "SELECT 1 FROM dim_project", tables=("sprint_info",))
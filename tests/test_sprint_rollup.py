@@ -0,0 +1,50 @@
+import pytest
+from sqlalchemy import text
+
+ROLLUP = text("""
+    SELECT division, period_type, period_year, period_num FROM agg_sprint_capacity
+    WHERE project_key = 'ROLL-1' ORDER BY period_type
+""")
+
+
+@pytest.fixture
+def project(engine):
+    with engine.begin() as connection:
+        connection.execute(text("""
+            INSERT INTO dim_project (project_key, project_name, division) VALUES ('ROLL-1', 'Rollup', 'Division 1')
+        """))
+        connection.execute(text("INSERT INTO dim_sprint (sprint_name, project_key, start_date) VALUES ('S1', 'ROLL-1', '2024-12-30')"))
+        connection.execute(text("INSERT INTO sprint_info (sprint_name, project_key, sprint_capacity) VALUES ('S1', 'ROLL-1', 10)"))
+        connection.execute(text("SELECT refresh_capacity_rollup(ARRAY['ROLL-1'])"))
+    yield
+    with engine.begin() as connection:
+        connection.execute(text("DELETE FROM sprint_info WHERE project_key = 'ROLL-1'"))
+        connection.execute(text("DELETE FROM dim_sprint WHERE project_key = 'ROLL-1'"))
+        connection.execute(text("DELETE FROM dim_project WHERE project_key = 'ROLL-1'"))
+
+
+def test_weeks_use_the_iso_year(engine, project):
+    with engine.connect() as connection:
+        rows = connection.execute(ROLLUP).all()
+    # 2024-12-30 is in ISO week 1 of 2025, but in December (Q4) of 2024.
+    assert rows == [("Division 1", "month", 2024, 12), ("Division 1", "quarter", 2024, 4),
+                    ("Division 1", "week", 2025, 1)]
+
+
+def test_rollup_follows_sprint_dates_and_divisions(engine, project):
+    with engine.begin() as connection:
+        connection.execute(text("UPDATE dim_sprint SET start_date = '2025-04-02' WHERE project_key = 'ROLL-1'"))
+        connection.execute(text("UPDATE dim_project SET division = 'Division 2' WHERE project_key = 'ROLL-1'"))
+    with engine.connect() as connection:
+        rows = connection.execute(ROLLUP).all()
+    assert rows == [("Division 2", "month", 2025, 4), ("Division 2", "quarter", 2025, 2),
+                    ("Division 2", "week", 2025, 14)]
+
+
+def test_rollup_extends_the_calendar(engine, project):
+    with engine.begin() as connection:
+        connection.execute(text("UPDATE dim_sprint SET start_date = '2040-03-05' WHERE project_key = 'ROLL-1'"))
+    with engine.connect() as connection:
+        rows = connection.execute(ROLLUP).all()
+    assert rows == [("Division 1", "month", 2040, 3), ("Division 1", "quarter", 2040, 1),
+                    ("Division 1", "week", 2040, 10)]
@@ -0,0 +1,189 @@
+"""Asynchronous audit trail for CRUD writes.
+
+Pages call ``record(...)`` after committing a write. The call only puts a row on an
+in-process queue; a background thread drains the queue and writes batches to
+``audit_log`` with ``COPY``, so a submit does not wait on the audit insert.
+
+- The queue is bounded (``MAX_QUEUE``). When it is full the caller waits up to
+  ``BACKPRESSURE_SECONDS``; if it is still full the row is written synchronously
+  rather than dropped.
+- Pending rows are flushed when the process exits.
+"""
+import atexit
+import csv
+import io
+import json
+import queue
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from utils.db import primary_connection
+
+BATCH_SIZE = 500
+FLUSH_SECONDS = 1.0
+MAX_QUEUE = 10_000
+BACKPRESSURE_SECONDS = 2.0
+
+_COLUMNS = ("changed_at", "actor", "table_name", "row_key", "action", "before", "after")
+
+_queue = queue.Queue(maxsize=MAX_QUEUE)
+_stop = threading.Event()
+_engine = None
+_writer = None
+_writer_lock = threading.Lock()
+_stats_lock = threading.Lock()
+_stats = {"queued": 0, "written": 0, "batches": 0, "sync_writes": 0, "failed": 0}
+
+
+def _count(key, n=1):
+    with _stats_lock:
+        _stats[key] += n
+
+
+def get_audit_stats():
+    """Counters since the process started, plus the current queue depth."""
+    with _stats_lock:
+        return dict(_stats, pending=_queue.qsize())
+
+
+def _jsonable(values):
+    if values is None:
+        return None
+    if isinstance(values, pd.Series):
+        values = values.to_dict()
+    return json.dumps({k: _plain(v) for k, v in values.items()}, default=str)
+
+
+def _plain(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict):
+        return {k: _plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    if pd.isna(value):
+        return None
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def _actor():
+    try:
+        return st.session_state.get("user_email") or st.session_state.get("user_name") or "unknown"
+    except Exception:
+        return "system"
+
+
+def _row_key(key):
+    if isinstance(key, dict):
+        return "|".join(str(v) for v in key.values())
+    return str(key)
+
+
+def _write_batch(rows):
+    """COPY ``rows`` into audit_log in one round trip."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow(["\\N" if v is None else v for v in row])
+    buffer.seek(0)
+
+    engine = _engine or primary_connection().engine
+    raw = engine.raw_connection()
+    try:
+        with raw.cursor() as cursor:
+            cursor.copy_expert(
+                f"COPY audit_log ({', '.join(_COLUMNS)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+                buffer
+            )
+        raw.commit()
+    finally:
+        raw.close()
+
+
+def _flush(rows):
+    if not rows:
+        return
+    try:
+        _write_batch(rows)
+        _count("written", len(rows))
+        _count("batches")
+    except Exception as e:
+        _count("failed", len(rows))
+        print(f"Audit write of {len(rows)} rows failed: {e}")
+
+
+def _drain(first=None):
+    """Collect up to ``BATCH_SIZE`` queued rows, waiting at most ``FLUSH_SECONDS`` for more."""
+    rows = [] if first is None else [first]
+    deadline = time.monotonic() + FLUSH_SECONDS
+    while len(rows) < BATCH_SIZE:
+        timeout = deadline - time.monotonic()
+        if timeout <= 0 or _stop.is_set():
+            try:
+                rows.append(_queue.get_nowait())
+                continue
+            except queue.Empty:
+                break
+        try:
+            rows.append(_queue.get(timeout=timeout))
+        except queue.Empty:
+            break
+    return rows
+
+
+def _writer_loop():
+    while not _stop.is_set():
+        try:
+            first = _queue.get(timeout=FLUSH_SECONDS)
+        except queue.Empty:
+            continue
+        _flush(_drain(first))
+
+
+def _shutdown(writer):
+    _stop.set()
+    writer.join(timeout=5)
+    while not _queue.empty():
+        _flush(_drain())
+
+
+def start_audit_writer():
+    """Start the background writer once per process."""
+    global _engine, _writer
+    with _writer_lock:
+        if _writer is None or not _writer.is_alive():
+            _engine = primary_connection().engine
+            _writer = threading.Thread(target=_writer_loop, name="audit-writer", daemon=True)
+            _writer.start()
+            atexit.register(_shutdown, _writer)
+    return _writer
+
+
+def record(table, key, action, before=None, after=None):
+    """Queue an audit row for a committed write.
+
+    Args:
+        table (str): Table that was written.
+        key: Row key; a dict of key columns is joined with '|'.
+        action (str): 'insert', 'update', 'delete' or 'upsert'.
+        before (dict | pd.Series | None): Values before the write.
+        after (dict | pd.Series | None): Values after the write.
+    """
+    row = (
+        datetime.now().isoformat(sep=" "), _actor(), table, _row_key(key), action,
+        _jsonable(before), _jsonable(after),
+    )
+    start_audit_writer()
+    try:
+        _queue.put(row, timeout=BACKPRESSURE_SECONDS)
+        _count("queued")
+    except queue.Full:
+        _count("sync_writes")
+        _flush([row])
@@ -1,23 +1,28 @@
 
+import json
 import streamlit as st
-import hashlib
+from datetime import datetime
 from functools import wraps
-import streamlit_cookies_manager as st_cookies
-from datetime import datetime, timedelta
-
-conn = st.connection("neon", type="sql")
+from utils.connection_lifecycle import start_connection_lifecycle
+from utils import sessions
+from utils.metrics import query_helper, start_metrics_exporter
+from utils.db import primary_connection
+from utils.migrations import ensure_schema
+from utils.passwords import burn_equivalent_time, hash_password, verify_password
+from utils.queries import execute, run_query
 
 def _hash_password(password: str) -> str:
-    """Hash password using SHA-256.
+    """Hash password with salted scrypt (see ``utils.passwords``).
 
     Args:
         password (str): The password to hash.
 
     Returns:
-        str: The hashed password.
+        str: The encoded hash to store.
     """
-    return hashlib.sha256(password.encode()).hexdigest()
+    return hash_password(password)
 
+@query_helper
 def _validate_user(email: str, password: str) -> tuple[bool, str, str]:
     """Validate user credentials against the database.
 
@@ -28,57 +33,119 @@ def _validate_user(email: str, password: str) -> tuple[bool, str, str]:
     Returns:
         tuple[bool, str, str]: A tuple containing a boolean indicating success, the user's role, and username.
     """
-    password_hash = _hash_password(password)
-    query = "SELECT role, username FROM app_users WHERE email = :email AND password = :password;"
-    df = conn.query(query, params={"email": email, "password": password_hash}, ttl=0)
-    if not df.empty:
-        return True, df["role"].iloc[0], df["username"].iloc[0]
-    return False, "", ""
+    df = run_query("auth_user_by_email", email=email)
+    if df.empty:
+        burn_equivalent_time(password)
+        return False, "", ""
+    stored = df["password"].iloc[0]
+    matches, needs_rehash = verify_password(password, stored)
+    if not matches:
+        return False, "", ""
+    if needs_rehash:
+        _rehash(email, password, stored)
+    return True, df["role"].iloc[0], df["username"].iloc[0]
 
-def logout(cookies):
-    """Logout: clear session and cookies.
+@query_helper
+def _rehash(email: str, password: str, old_hash: str):
+    """Replace a legacy or outdated hash after a successful login; failures only log."""
+    try:
+        with primary_connection().engine.begin() as connection:
+            execute(connection, "auth_rehash_password", new_password=hash_password(password),
+                    email=email, old_password=old_hash)
+    except Exception as e:
+        print(f"Could not upgrade password hash for {email}: {e}")
 
-    Args:
-        cookies (_type_): The cookie manager instance.
+_PENDING_COOKIE_KEY = "_pending_cookie"
+
+def _set_user(user):
+    """Copy a resolved session user into the session state the pages read."""
+    st.session_state.logged_in = user is not None
+    st.session_state.user_email = user["email"] if user else ""
+    st.session_state.user_role = user["role"] if user else ""
+    st.session_state.user_name = user["username"] if user else ""
+    st.session_state.session_id = user["session_id"] if user else None
+    sessions.remember(user)
+
+def _served_over_https():
+    """Whether the browser reached the app over HTTPS, also behind a TLS-terminating proxy."""
+    forwarded = st.context.headers.get("X-Forwarded-Proto") or ""
+    if forwarded.split(",")[0].strip().lower() == "https":
+        return True
+    return (st.context.url or "").startswith("https://")
+
+def _cookie_assignment(name, value, max_age):
+    """JavaScript that sets a cookie in the browser.
+
+    Streamlit gives no access to the response headers, so the session cookie is written
+    from a script and cannot be HttpOnly: script injected into the page could read the
+    token. The token alone is not enough to outlive a revocation or its expiry, both of
+    which are checked server-side on every run. ``Secure`` is added whenever the app is
+    served over HTTPS so the token never travels over plain HTTP.
+    """
+    attributes = f"Max-Age={max_age}; Path=/; SameSite=Lax"
+    if _served_over_https():
+        attributes += "; Secure"
+    return f"document.cookie = {json.dumps(f'{name}={value}; {attributes}')};"
+
+def _apply_pending_cookie():
+    """Write or delete the session cookie queued by a login or logout.
+
+    Only these runs send the browser a script setting ``document.cookie``; the cookie
+    is read back from the page request (``st.context.cookies``) on the next visit.
     """
-    st.session_state.logged_in = False
-    st.session_state.user_email = ""
-    st.session_state.user_role = ""
-    st.session_state.user_name = ""
-    if 'user_info' in cookies:
-        del cookies['user_info']
+    pending = st.session_state.pop(_PENDING_COOKIE_KEY, None)
+    if pending is None:
+        return
+    token, expires_at = pending
+    if token:
+        max_age = max(int((expires_at - datetime.now()).total_seconds()), 0)
+        script = _cookie_assignment(sessions.SESSION_COOKIE, token, max_age)
+    else:
+        script = "".join(_cookie_assignment(name, "", 0) for name in (sessions.SESSION_COOKIE, "user_info"))
+    st.html(f"<script>{script}</script>", unsafe_allow_javascript=True)
+
+def logout():
+    """Logout: revoke the server-side session and clear the cookie."""
+    session_id = st.session_state.get("session_id")
+    if session_id:
+        try:
+            sessions.revoke(session_id)
+        except Exception as e:
+            print(f"Could not revoke session: {e}")
+    _set_user(None)
+    st.session_state[_PENDING_COOKIE_KEY] = (None, None)
     st.rerun()
 
 def login_form():
     """
-    Login form, automatically logs in if cookie exists.
+    Login form, automatically logs in if the session cookie holds a live session.
     Manages login state and logout.
     """
-    cookies = st_cookies.CookieManager()
-    if not cookies.ready():
-        st.stop()
+    ensure_schema()
+    start_connection_lifecycle()
+    start_metrics_exporter()
 
     if "logged_in" not in st.session_state:
-        st.session_state.logged_in = False
-        st.session_state.user_email = ""
-        st.session_state.user_role = ""
-        st.session_state.user_name = ""
-    import json
-    if not st.session_state.logged_in:
-        user_info_from_cookie = cookies.get('user_info')
-        if user_info_from_cookie is not None:
-            try:
-                user_info = json.loads(user_info_from_cookie)
-                st.session_state.logged_in = True
-                st.session_state.user_email = user_info['email']
-                st.session_state.user_role = user_info['role']
-                st.session_state.user_name = user_info['name']
-            except Exception:
-                pass
+        # First run of this browser session: the cookie came with the page request.
+        token = st.context.cookies.get(sessions.SESSION_COOKIE)
+        _set_user(sessions.resolve(token) if token else None)
+        if "user_info" in st.context.cookies:
+            # Cookie of the old client-side login; never trusted, just removed.
+            st.session_state.setdefault(_PENDING_COOKIE_KEY, (None, None))
+    elif st.session_state.logged_in:
+        user = sessions.revalidate(st.session_state.session_id)
+        if user is None:
+            _set_user(None)
+            st.warning("Your session has ended. Please log in again.")
+        else:
+            st.session_state.user_role = user["role"]
+            st.session_state.user_name = user["username"]
+    _apply_pending_cookie()
+
     if st.session_state.logged_in:
         st.sidebar.success(f"Welcome > {st.session_state.user_role} < {st.session_state.user_name}!")
         if st.sidebar.button("Logout"):
-            logout(cookies)
+            logout()
         return True
     st.title("Login")
     with st.form("login_form"):
@@ -88,19 +155,10 @@ def login_form():
         if submitted:
             is_valid, role, username = _validate_user(email, password)
             if is_valid:
-                st.session_state.logged_in = True
-                st.session_state.user_email = email
-                st.session_state.user_role = role
-                st.session_state.user_name = username
-                import json
-                user_data_to_store = {
-                    'email': email,
-                    'role': role,
-                    'name': username
-                }
-                cookies._default_expiry = datetime.now() + timedelta(days=7)
-                cookies['user_info'] = json.dumps(user_data_to_store)
-                cookies.save()
+                token, expires_at = sessions.create_session(email)
+                _set_user({"session_id": sessions.session_id_of(token), "email": email,
+                           "role": role, "username": username})
+                st.session_state[_PENDING_COOKIE_KEY] = (token, expires_at)
                 st.rerun()
             else:
                 st.error("Invalid email or password.")
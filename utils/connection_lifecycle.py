@@ -0,0 +1,206 @@
+"""Neon cold-start handling: pool warm-up, business-hours keepalive and retry with backoff.
+
+The serverless endpoint suspends when idle and the first query after that waits for
+it to resume. ``start_connection_lifecycle()`` (called once per process from
+``login_form``) opens the pool's connections up front in a background thread, so the
+first visitor's page does not wait for it, and, when enabled, pings the endpoint during
+business hours so it never suspends while people are working.
+
+Keepalive is configured in ``.streamlit/secrets.toml``:
+
+    [keepalive]
+    enabled = true
+    interval_seconds = 240
+    business_hours = "08:00-19:00"
+    weekdays_only = true
+"""
+import threading
+import time
+from datetime import datetime
+
+import streamlit as st
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError, DisconnectionError, OperationalError
+
+from utils import metrics
+from utils.db import primary_connection, read_engine, replica_configured
+
+RETRY_DELAYS = (0.5, 1.0, 2.0, 4.0)
+
+_TRANSIENT_MARKERS = (
+    "could not connect",
+    "connection refused",
+    "connection timed out",
+    "timeout expired",
+    "server closed the connection",
+    "terminating connection",
+    "ssl syscall error",
+    "compute node",
+    "endpoint is disabled",
+)
+
+_start_lock = threading.Lock()
+_started = False
+_metrics_lock = threading.Lock()
+_metrics = {
+    "warmup_seconds": {},
+    "first_query_seconds": {},
+    "retries": 0,
+    "keepalives": 0,
+    "keepalive_failures": 0,
+    "last_keepalive_at": None,
+}
+
+
+def get_connection_metrics():
+    """Snapshot of cold-start and keepalive metrics for this process."""
+    with _metrics_lock:
+        return {k: (dict(v) if isinstance(v, dict) else v) for k, v in _metrics.items()}
+
+
+def is_transient(exc):
+    """Whether ``exc`` looks like a suspended or resuming endpoint rather than a real error."""
+    if isinstance(exc, DisconnectionError):
+        return True
+    if isinstance(exc, DBAPIError) and exc.connection_invalidated:
+        return True
+    if isinstance(exc, OperationalError):
+        message = str(exc).lower()
+        return any(marker in message for marker in _TRANSIENT_MARKERS)
+    return False
+
+
+def with_retry(fn, *args, **kwargs):
+    """Call ``fn``, retrying transient connection errors with exponential backoff.
+
+    Only wrap idempotent work (reads, pings): a failed write may have been applied.
+    """
+    for delay in RETRY_DELAYS:
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if not is_transient(e):
+                raise
+            with _metrics_lock:
+                _metrics["retries"] += 1
+            print(f"Transient database error, retrying in {delay}s: {e}")
+            time.sleep(delay)
+    return fn(*args, **kwargs)
+
+
+def _ping(engine):
+    with engine.connect() as connection:
+        connection.execute(text("SELECT 1"))
+
+
+def warm_up(engine, label):
+    """Open every pooled connection of ``engine`` and record time-to-first-query.
+
+    Args:
+        engine: SQLAlchemy engine to warm.
+        label (str): Name used in the metrics ('primary' or 'replica').
+    """
+    start = time.perf_counter()
+    with_retry(_ping, engine)
+    first_query = time.perf_counter() - start
+
+    size = engine.pool.size() if hasattr(engine.pool, "size") else 1
+    connections = []
+    try:
+        for _ in range(size):
+            connection = engine.connect()
+            connection.execute(text("SELECT 1"))
+            connections.append(connection)
+    finally:
+        for connection in connections:
+            connection.close()
+
+    with _metrics_lock:
+        _metrics["first_query_seconds"][label] = first_query
+        _metrics["warmup_seconds"][label] = time.perf_counter() - start
+    print(f"Warmed {label} pool ({size} connections), first query took {first_query:.2f}s")
+
+
+def _keepalive_config():
+    try:
+        config = dict(st.secrets.get("keepalive", {}))
+    except Exception:
+        config = {}
+    start, _, end = str(config.get("business_hours", "08:00-19:00")).partition("-")
+    return {
+        "enabled": bool(config.get("enabled", False)),
+        "interval": float(config.get("interval_seconds", 240)),
+        "start": datetime.strptime(start.strip(), "%H:%M").time(),
+        "end": datetime.strptime(end.strip(), "%H:%M").time(),
+        "weekdays_only": bool(config.get("weekdays_only", True)),
+    }
+
+
+def _in_business_hours(config, now):
+    if config["weekdays_only"] and now.weekday() >= 5:
+        return False
+    return config["start"] <= now.time() < config["end"]
+
+
+def _engines():
+    engines = {"primary": primary_connection().engine}
+    if replica_configured():
+        engines["replica"] = read_engine()
+    return engines
+
+
+def _keepalive_loop(config):
+    while True:
+        if _in_business_hours(config, datetime.now()):
+            try:
+                engines = list(_engines().values())
+            except Exception as e:
+                engines = []
+                print(f"Keepalive could not get the engines: {e}")
+            for engine in engines:
+                try:
+                    _ping(engine)
+                    with _metrics_lock:
+                        _metrics["keepalives"] += 1
+                        _metrics["last_keepalive_at"] = datetime.now()
+                except Exception as e:
+                    with _metrics_lock:
+                        _metrics["keepalive_failures"] += 1
+                    print(f"Keepalive failed: {e}")
+        time.sleep(config["interval"])
+
+
+def _lifecycle(config):
+    try:
+        engines = _engines()
+    except Exception as e:
+        engines = {}
+        print(f"Warm-up could not get the engines: {e}")
+    for label, engine in engines.items():
+        try:
+            warm_up(engine, label)
+        except Exception as e:
+            print(f"Warm-up of {label} pool failed: {e}")
+    if config["enabled"]:
+        _keepalive_loop(config)
+
+
+def start_connection_lifecycle():
+    """Start warming the pools and the optional keepalive, once per process.
+
+    Returns immediately; the work runs in a daemon thread.
+    """
+    global _started
+    with _start_lock:
+        if _started:
+            return True
+        _started = True
+
+    metrics.register_pool("primary", lambda: primary_connection().engine)
+    if replica_configured():
+        metrics.register_pool("replica", read_engine)
+
+    threading.Thread(
+        target=_lifecycle, args=(_keepalive_config(),), name="db-lifecycle", daemon=True
+    ).start()
+    return True
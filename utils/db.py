@@ -0,0 +1,149 @@
+"""Connection routing between the primary and an optional read replica.
+
+Writes always use the ``neon`` connection. Catalogued reads (``utils.queries.run_query``)
+use ``neon_replica`` when it is configured in ``.streamlit/secrets.toml``:
+
+    [connections.neon]
+    url = "postgresql://...primary..."
+
+    [connections.neon_replica]
+    url = "postgresql://...read-only endpoint..."
+
+Read-your-writes: after a session commits a write on the primary, its WAL position is kept in
+``st.session_state``. That session's reads stay on the primary until the replica has
+replayed past it. If the replica cannot report a replay position (e.g. it is not a
+streaming standby), reads are pinned to the primary for ``REPLICA_MAX_LAG_SECONDS``.
+Sessions that only read on the primary do not record anything.
+
+Two local instances are enough to try it out: point ``neon_replica`` at a second
+database and set ``TEST_REPLICA_URL`` to run ``tests/test_db.py``.
+"""
+import time
+
+import streamlit as st
+from sqlalchemy import event, text
+from sqlalchemy.orm import Session
+
+PRIMARY_CONNECTION = "neon"
+REPLICA_CONNECTION = "neon_replica"
+REPLICA_MAX_LAG_SECONDS = 5
+
+_WRITE_MARK_KEY = "_db_last_write"
+_CONNECTION_KEY = "_db_connection"
+_WROTE_KEY = "_db_wrote"
+
+
+def primary_connection():
+    """Return the Streamlit SQL connection for the primary."""
+    return st.connection(PRIMARY_CONNECTION, type="sql")
+
+
+def replica_configured():
+    """Whether a separate read endpoint is configured."""
+    try:
+        return REPLICA_CONNECTION in st.secrets.get("connections", {})
+    except Exception:
+        return False
+
+
+def _write_mark():
+    try:
+        return st.session_state.get(_WRITE_MARK_KEY)
+    except Exception:
+        # Outside a script run (background threads) there is no session to pin.
+        return None
+
+
+def remember_write():
+    """Record the primary's current WAL position for the calling user session.
+
+    Called automatically after an ORM session commits a transaction that wrote on the
+    primary; call it by hand after writes made through a plain engine connection. The
+    position is read after the commit so that it covers the commit record itself.
+    """
+    if not replica_configured():
+        return
+    try:
+        with primary_connection().engine.connect() as connection:
+            lsn = connection.execute(text("SELECT CAST(pg_current_wal_lsn() AS text)")).scalar()
+        st.session_state[_WRITE_MARK_KEY] = (lsn, time.monotonic())
+    except Exception as e:
+        print(f"Could not record write position: {e}")
+
+
+def _replica_caught_up(replica_engine, mark):
+    lsn, written_at = mark
+    try:
+        with replica_engine.connect() as connection:
+            caught_up = connection.execute(
+                text("SELECT pg_last_wal_replay_lsn() >= CAST(:lsn AS pg_lsn)"),
+                {"lsn": lsn}
+            ).scalar()
+    except Exception:
+        return False
+    if caught_up is None:
+        return time.monotonic() - written_at > REPLICA_MAX_LAG_SECONDS
+    return bool(caught_up)
+
+
+def read_engine():
+    """Engine to use for a read in the current session.
+
+    Returns:
+        sqlalchemy.engine.Engine: The replica, unless none is configured or this session
+        has a write the replica has not replayed yet.
+    """
+    primary = primary_connection().engine
+    if not replica_configured():
+        return primary
+    replica = st.connection(REPLICA_CONNECTION, type="sql").engine
+
+    mark = _write_mark()
+    if mark is None:
+        return replica
+    if _replica_caught_up(replica, mark):
+        try:
+            del st.session_state[_WRITE_MARK_KEY]
+        except Exception:
+            pass
+        return replica
+    return primary
+
+
+@event.listens_for(Session, "after_begin")
+def _after_begin(session, transaction, connection):
+    session.info[_CONNECTION_KEY] = connection
+
+
+@event.listens_for(Session, "before_commit")
+def _before_commit(session):
+    session.info.pop(_WROTE_KEY, None)
+    if not replica_configured():
+        return
+    # Flush first so pending ORM changes count as writes.
+    if session.new or session.dirty or session.deleted:
+        session.flush()
+    connection = session.info.get(_CONNECTION_KEY)
+    try:
+        primary = primary_connection().engine
+    except Exception:
+        return
+    if connection is None or connection.closed or connection.engine is not primary:
+        return
+    # A transaction gets an id only once it writes; ask on the connection it runs on.
+    session.info[_WROTE_KEY] = connection.execute(
+        text("SELECT pg_current_xact_id_if_assigned() IS NOT NULL")
+    ).scalar()
+
+
+@event.listens_for(Session, "after_commit")
+def _after_commit(session):
+    session.info.pop(_CONNECTION_KEY, None)
+    if session.info.pop(_WROTE_KEY, False):
+        remember_write()
+
+
+@event.listens_for(Session, "after_rollback")
+def _after_rollback(session):
+    session.info.pop(_CONNECTION_KEY, None)
+    session.info.pop(_WROTE_KEY, None)
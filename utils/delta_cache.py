@@ -0,0 +1,137 @@
+"""Incrementally refreshed in-process copies of ``fact_pcv_metrics`` and ``dim_project``.
+
+The first read loads the whole table. Later reads check the table's change counter
+(``table_versions``) and, if it moved, fetch only rows with ``updated_at`` past the
+watermark plus the keys of hard-deleted rows from ``row_tombstones`` (migration 0007),
+and merge them into the cached frame. Soft-deleted projects arrive as ordinary
+updates with ``is_deleted = TRUE``, so callers filter on that column.
+
+The delta re-reads ``OVERLAP_SECONDS`` before the watermark: ``updated_at`` is the
+writing transaction's start time, so a transaction that commits late (or a replica
+that replays late) is still picked up. Merging is by primary key, so re-reading is harmless.
+"""
+import threading
+import time
+from collections import namedtuple
+from datetime import timedelta
+
+import pandas as pd
+
+from utils.connection_lifecycle import with_retry
+from utils.db import read_engine
+from utils.queries import fetch_frame
+
+DeltaTable = namedtuple("DeltaTable", ["key", "full_query", "delta_query"])
+
+DELTA_TABLES = {
+    "fact_pcv_metrics": DeltaTable("pcv_id", "pcv_rows_all", "pcv_rows_changed"),
+    "dim_project": DeltaTable("project_key", "project_rows_all", "project_rows_changed"),
+}
+OVERLAP_SECONDS = 120
+# Tombstones are pruned after 7 days; a copy idle for longer is reloaded in full.
+FULL_RELOAD_AFTER = timedelta(days=6)
+
+_lock = threading.Lock()
+_table_locks = {table: threading.Lock() for table in DELTA_TABLES}
+# table -> {"frame", "watermark", "version"}
+_state = {}
+_stats = {table: {"full_loads": 0, "delta_loads": 0, "rows_merged": 0, "rows_deleted": 0} for table in DELTA_TABLES}
+
+
+def _indexed(df, key):
+    # Unnamed index so the key column stays unambiguous for merges and filters.
+    df = df.set_index(key, drop=False)
+    df.index.name = None
+    return df
+
+
+def _version(connection, table):
+    df = fetch_frame(connection, "table_versions", table_names=[table])
+    return int(df["version"].iloc[0]) if not df.empty else None
+
+
+def _full_load(connection, table):
+    spec = DELTA_TABLES[table]
+    watermark = fetch_frame(connection, "db_clock")["now"].iloc[0]
+    version = _version(connection, table)
+    frame = _indexed(fetch_frame(connection, spec.full_query), spec.key)
+    _stats[table]["full_loads"] += 1
+    return {"frame": frame, "watermark": watermark, "version": version}
+
+
+def _merge(frame, changed, removed_keys):
+    """Upsert ``changed`` rows into ``frame`` by index and drop ``removed_keys``.
+
+    Builds a new frame: other sessions may be reading the current one.
+    """
+    stale = frame.index.intersection(changed.index.union(removed_keys))
+    if changed.empty:
+        return frame.drop(stale) if len(stale) else frame
+    return pd.concat([frame.drop(stale), changed.astype(frame.dtypes.to_dict(), errors="ignore")])
+
+
+def _delta_load(connection, table, state):
+    spec = DELTA_TABLES[table]
+    version = _version(connection, table)
+    if version is not None and version == state["version"]:
+        return state
+
+    watermark = fetch_frame(connection, "db_clock")["now"].iloc[0]
+    since = state["watermark"] - timedelta(seconds=OVERLAP_SECONDS)
+    changed = _indexed(fetch_frame(connection, spec.delta_query, since=since), spec.key)
+    tombstones = fetch_frame(connection, "tombstones_since", table_name=table, since=since)["row_key"]
+
+    frame = state["frame"]
+    removed_keys = pd.Index(tombstones.astype(frame.index.dtype) if len(frame.index) else tombstones)
+    # A key deleted and re-inserted within the window is live again.
+    removed_keys = removed_keys.difference(changed.index)
+    _stats[table]["delta_loads"] += 1
+    _stats[table]["rows_merged"] += len(changed)
+    _stats[table]["rows_deleted"] += len(frame.index.intersection(removed_keys))
+    frame = _merge(frame, changed, removed_keys)
+    return {"frame": frame, "watermark": watermark, "version": version}
+
+
+def _refresh(table):
+    state = _state.get(table)
+    with read_engine().connect() as connection:
+        if state is None or pd.Timestamp.now() - pd.Timestamp(state["watermark"]) > FULL_RELOAD_AFTER:
+            state = _full_load(connection, table)
+        else:
+            state = _delta_load(connection, table, state)
+        connection.commit()
+    return state
+
+
+def get_frame(table):
+    """Current contents of ``table``, refreshed incrementally.
+
+    Args:
+        table (str): One of ``DELTA_TABLES``.
+
+    Returns:
+        pd.DataFrame: All rows, indexed by the primary key (which is also kept as a
+        column). The frame is shared; filter or copy it before modifying.
+    """
+    with _table_locks[table]:
+        start = time.perf_counter()
+        state = with_retry(_refresh, table)
+        with _lock:
+            _state[table] = state
+        _stats[table]["last_refresh_ms"] = (time.perf_counter() - start) * 1000
+        return state["frame"]
+
+
+def invalidate(table=None):
+    """Drop the cached copy of ``table`` (default: all) so the next read reloads it in full."""
+    with _lock:
+        if table is None:
+            _state.clear()
+        else:
+            _state.pop(table, None)
+
+
+def get_delta_stats():
+    """Load counters per table since the process started."""
+    with _lock:
+        return {table: dict(stats) for table, stats in _stats.items()}
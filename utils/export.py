@@ -0,0 +1,199 @@
+"""Streaming table exports to CSV or Parquet.
+
+Rows come from a server-side cursor in batches of ``BATCH_SIZE`` and are appended to a
+temporary file (CSV chunks or Parquet row groups), so memory stays flat however large
+the table is. Parquet needs ``pyarrow``.
+
+Browser downloads are different: Streamlit keeps every download in memory, so
+``export_for_download`` stops at ``MAX_DOWNLOAD_ROWS``. Export larger tables with the
+command line, which writes straight to disk.
+
+Usage:
+    python -m utils.export fact_deals --format parquet -o deals.parquet
+"""
+import argparse
+import csv
+import io
+import tempfile
+from collections import namedtuple
+from datetime import datetime
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = None
+    pq = None
+
+from utils.queries import stream_batches
+
+BATCH_SIZE = 20_000
+# Streamlit's media file manager holds a download's bytes in server memory.
+MAX_DOWNLOAD_ROWS = 500_000
+
+Export = namedtuple("Export", ["label", "query", "roles", "owner_scoped"])
+
+# PMs only get rows of projects they own; presales data is not project-scoped.
+EXPORTS = {
+    "fact_pcv_metrics": Export("PCV assessments", "export_pcv_metrics", ("admin", "manager", "pm"), True),
+    "sprint_info": Export("Sprint capacity", "export_sprint_info", ("admin", "manager", "pm"), True),
+    "dim_project": Export("Projects", "export_projects", ("admin", "manager", "pm"), True),
+    "fact_deals": Export("Presales deals", "export_deals", ("admin", "manager"), False),
+}
+
+FORMATS = {
+    "csv": ("text/csv", ".csv"),
+    "parquet": ("application/vnd.apache.parquet", ".parquet"),
+}
+
+
+def available_formats():
+    """Export formats usable in this environment."""
+    return [f for f in FORMATS if f != "parquet" or pq is not None]
+
+
+def exports_for_role(role):
+    """Return ``{table: Export}`` the role may download."""
+    return {table: spec for table, spec in EXPORTS.items() if role in spec.roles}
+
+
+def _query_params(spec, role, user_name):
+    if not spec.owner_scoped:
+        return {}
+    return {"owner": user_name if role == "pm" else None}
+
+
+# psycopg2 type OIDs -> Arrow types; anything else is exported as text.
+_ARROW_TYPES = {
+    16: "bool_",
+    20: "int64", 21: "int32", 23: "int32",
+    700: "float32", 701: "float64", 1700: "float64",
+    1082: "date32",
+    1114: "timestamp", 1184: "timestamp_tz",
+}
+
+
+def _arrow_schema(columns, description):
+    fields = []
+    for name, column in zip(columns, description):
+        kind = _ARROW_TYPES.get(column.type_code, "string")
+        if kind == "timestamp":
+            arrow_type = pa.timestamp("us")
+        elif kind == "timestamp_tz":
+            arrow_type = pa.timestamp("us", tz="UTC")
+        else:
+            arrow_type = getattr(pa, kind)()
+        fields.append(pa.field(name, arrow_type))
+    return pa.schema(fields)
+
+
+def _arrow_batch(schema, rows):
+    columns = list(zip(*rows)) if rows else [[] for _ in schema]
+    arrays = []
+    for field, values in zip(schema, columns):
+        if field.type == pa.float64() or field.type == pa.float32():
+            values = [None if v is None else float(v) for v in values]
+        elif field.type == pa.string():
+            values = [None if v is None else str(v) for v in values]
+        arrays.append(pa.array(values, type=field.type))
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+def write_export(connection, table, fmt, out, role="admin", user_name=None, batch_size=BATCH_SIZE,
+                 max_rows=None):
+    """Stream ``table`` into the binary file object ``out``.
+
+    Args:
+        connection: An open SQLAlchemy Connection.
+        table (str): One of ``EXPORTS``.
+        fmt (str): 'csv' or 'parquet'.
+        out: Writable binary file object.
+        role (str): Role of the requesting user (scopes the rows).
+        user_name (str | None): Requesting user's name, used for owner-scoped exports.
+        batch_size (int): Rows per server round trip / Parquet row group.
+        max_rows (int | None): Stop with a ValueError once more rows than this are read.
+
+    Returns:
+        int: Number of rows written.
+    """
+    spec = EXPORTS[table]
+    if role not in spec.roles:
+        raise PermissionError(f"Role {role!r} cannot export {table}")
+    if fmt == "parquet" and pq is None:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)")
+
+    params = _query_params(spec, role, user_name)
+    rows_written = 0
+    writer = None
+    text_out = io.TextIOWrapper(out, encoding="utf-8", newline="", write_through=True) if fmt == "csv" else None
+    try:
+        for columns, rows, description in stream_batches(connection, spec.query, batch_size=batch_size, **params):
+            if fmt == "csv":
+                if writer is None:
+                    writer = csv.writer(text_out)
+                    writer.writerow(columns)
+                writer.writerows(rows)
+            else:
+                if writer is None:
+                    schema = _arrow_schema(columns, description)
+                    writer = pq.ParquetWriter(out, schema, compression="snappy")
+                writer.write_table(_arrow_batch(schema, rows))
+            rows_written += len(rows)
+            if max_rows is not None and rows_written > max_rows:
+                raise ValueError(
+                    f"{table} has more than {max_rows} rows; export it with python -m utils.export"
+                )
+    finally:
+        if fmt == "parquet" and writer is not None:
+            writer.close()
+        if text_out is not None:
+            text_out.detach()
+    return rows_written
+
+
+def export_for_download(engine, table, fmt, role, user_name=None, max_rows=MAX_DOWNLOAD_ROWS):
+    """Export for ``st.download_button``, spooling through a temporary file.
+
+    Raises:
+        ValueError: The export has more than ``max_rows`` rows.
+
+    Returns:
+        bytes: The export.
+    """
+    out = tempfile.TemporaryFile()
+    try:
+        with engine.connect() as connection:
+            write_export(connection, table, fmt, out, role=role, user_name=user_name, max_rows=max_rows)
+            connection.commit()
+        out.seek(0)
+        return out.read()
+    finally:
+        out.close()
+
+
+def export_file_name(table, fmt):
+    """Download name such as ``fact_deals_20250101_1200.parquet``."""
+    return f"{table}_{datetime.now():%Y%m%d_%H%M}{FORMATS[fmt][1]}"
+
+
+def main(argv=None):
+    """Export a table from the command line (full access, see ``utils.migrations.get_engine``)."""
+    from utils.migrations import get_engine
+
+    parser = argparse.ArgumentParser(description="Stream a table to CSV or Parquet.")
+    parser.add_argument("table", choices=sorted(EXPORTS))
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("-o", "--output", help="Output path (default: generated name)")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    args = parser.parse_args(argv)
+
+    path = args.output or export_file_name(args.table, args.format)
+    engine = get_engine()
+    with engine.connect() as connection, open(path, "wb") as out:
+        count = write_export(connection, args.table, args.format, out, batch_size=args.batch_size)
+        connection.commit()
+    print(f"Wrote {count} rows to {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+"""Sprint capacity against budget, for every project at once.
+
+``dim_project.total_mm`` is the budget in man-months; each sprint in ``sprint_info``
+burns ``sprint_capacity / CAPACITY_PER_MM`` of it. Sprints are placed on the calendar
+by their ``dim_date`` keys and the whole portfolio is computed with numpy segment
+sums over one sorted array of sprints:
+
+- burn-down: budget left after each sprint (cumulative burn per project),
+- burned to date and remaining budget,
+- the date the budget runs out: the end of the first planned sprint that exceeds it,
+  otherwise projected from the project's average burn rate.
+
+The sprint arrays are kept in process. A refresh checks the change counters of the
+source tables; when they moved, a per-project signature query finds the projects whose
+sprints changed and only those projects' sprints are re-read. On a new day the kept
+arrays are recomputed without querying, since burned capacity depends on the date.
+
+Usage:
+    portfolio = get_portfolio_forecast()
+    burndown = get_burndown("ABC")
+"""
+import threading
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from utils.queries import run_query
+from utils.snapshot_cache import current_versions
+from utils.metrics import query_helper
+
+# sprint_capacity is in man-days.
+CAPACITY_PER_MM = 20
+DEFAULT_SPRINT_DAYS = 14
+DAYS_PER_MONTH = 30.44
+SOURCE_TABLES = ("dim_project", "dim_sprint", "sprint_info")
+
+_SPRINT_COLUMNS = ["project_key", "sprint_name", "sprint_capacity", "start_date_key", "end_date_key"]
+
+_lock = threading.Lock()
+# {"versions", "today", "projects", "sprints", "forecast", "burndown"}
+_state = {}
+_stats = {"refreshes": 0, "projects_reloaded": 0}
+
+
+def _key_dates(keys):
+    """yyyymmdd integer keys to datetime64[D] (NaT where missing)."""
+    return pd.to_datetime(pd.Series(keys, dtype="Int64").astype("string"), format="%Y%m%d", errors="coerce").values.astype("datetime64[D]")
+
+
+def _load_sprints(project_keys):
+    if not project_keys:
+        return pd.DataFrame(columns=_SPRINT_COLUMNS)
+    return run_query("forecast_sprints", project_keys=project_keys)
+
+
+def _forecast(projects, sprints, today):
+    """Vectorized burn-down and budget forecast.
+
+    Args:
+        projects (pd.DataFrame): ``project_key``, ``total_mm`` (one row per project).
+        sprints (pd.DataFrame): Rows of ``forecast_sprints`` for those projects.
+        today (np.datetime64): Day that separates burned from planned capacity.
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame]: The portfolio (one row per project) and the
+        burn-down (one row per sprint, in calendar order within each project).
+    """
+    keys = projects["project_key"].to_numpy()
+    budget = projects["total_mm"].to_numpy(dtype=float)
+    n_projects = len(keys)
+
+    codes = pd.Categorical(sprints["project_key"], categories=keys).codes
+    start = _key_dates(sprints["start_date_key"])
+    end = _key_dates(sprints["end_date_key"])
+    end = np.where(np.isnat(end) | (end < start), start + np.timedelta64(DEFAULT_SPRINT_DAYS, "D"), end)
+    burn = pd.to_numeric(sprints["sprint_capacity"]).fillna(0).to_numpy(dtype=float) / CAPACITY_PER_MM
+
+    order = np.lexsort((start, codes))
+    codes, start, end, burn = codes[order], start[order], end[order], burn[order]
+    names = sprints["sprint_name"].to_numpy()[order]
+
+    # Cumulative burn within each project: one cumsum, minus the total of the projects before.
+    cumulative = np.cumsum(burn)
+    planned = np.bincount(codes, weights=burn, minlength=n_projects)
+    before = np.concatenate(([0.0], np.cumsum(planned)[:-1]))
+    # Rounded so a project that burns exactly its budget is not flagged by float error.
+    cumulative = np.round(cumulative - before[codes], 6)
+    remaining_after = budget[codes] - cumulative
+
+    burned = np.bincount(codes, weights=np.where(start <= today, burn, 0.0), minlength=n_projects)
+    sprint_count = np.bincount(codes, minlength=n_projects)
+
+    # First sprint that takes the project over budget.
+    n_sprints = len(codes)
+    first_over = np.full(n_projects, n_sprints)
+    np.minimum.at(first_over, codes, np.where(remaining_after < 0, np.arange(n_sprints), n_sprints))
+    overruns = first_over < n_sprints
+    padded_end = np.append(end, np.datetime64("NaT"))
+    planned_exhaustion = padded_end[first_over]
+
+    # Otherwise extrapolate the average burn rate past the last planned sprint.
+    first_start = np.full(n_projects, np.datetime64("9999-12-31"), dtype="datetime64[D]")
+    last_end = np.full(n_projects, np.datetime64("0001-01-01"), dtype="datetime64[D]")
+    np.minimum.at(first_start, codes, start)
+    np.maximum.at(last_end, codes, end)
+    span_days = np.where(sprint_count > 0, (last_end - first_start).astype(float), np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rate = np.where(span_days > 0, planned / span_days, np.nan)
+        days_left = (budget - planned) / rate
+    projectable = ~overruns & np.isfinite(days_left)
+    projected = np.full(n_projects, np.datetime64("NaT"), dtype="datetime64[D]")
+    projected[projectable] = last_end[projectable] + np.ceil(days_left[projectable]).astype("timedelta64[D]")
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        used_pct = np.where(budget > 0, burned / budget * 100, np.nan)
+    portfolio = pd.DataFrame({
+        "project_key": keys,
+        "total_mm": budget,
+        "sprints": sprint_count,
+        "planned_mm": planned,
+        "burned_mm": burned,
+        "remaining_mm": budget - burned,
+        "budget_used_pct": used_pct,
+        "burn_mm_per_month": rate * DAYS_PER_MONTH,
+        "exhaustion_date": np.where(overruns, planned_exhaustion, projected),
+        "overrun_planned": overruns,
+    })
+    burndown = pd.DataFrame({
+        "project_key": keys[codes],
+        "sprint_name": names,
+        "start_date": start,
+        "end_date": end,
+        "burn_mm": burn,
+        "cumulative_mm": cumulative,
+        "remaining_mm": remaining_after,
+    })
+    return portfolio, burndown
+
+
+@query_helper
+def _refresh():
+    versions = current_versions(SOURCE_TABLES)
+    today = date.today()
+    with _lock:
+        state = dict(_state)
+    if state.get("versions") == versions:
+        if state.get("today") == today:
+            return state
+        # Same rows, new day: burned and remaining capacity move, nothing needs reloading.
+        signatures, sprints, changed = state["projects"], state["sprints"], []
+    elif state:
+        signatures = run_query("forecast_signatures")
+        cached = state["projects"].set_index("project_key")["signature"]
+        current = signatures.set_index("project_key")["signature"]
+        changed = current.index[current.ne(cached.reindex(current.index))].tolist()
+        keep = state["sprints"]["project_key"].isin(set(current.index) - set(changed))
+        sprints = pd.concat([state["sprints"][keep], _load_sprints(changed)], ignore_index=True)
+    else:
+        signatures = run_query("forecast_signatures")
+        changed = signatures["project_key"].tolist()
+        sprints = _load_sprints(changed)
+
+    forecast, burndown = _forecast(signatures, sprints, np.datetime64(today, "D"))
+    state = {"versions": versions, "today": today, "projects": signatures, "sprints": sprints,
+             "forecast": forecast, "burndown": burndown}
+    with _lock:
+        _state.update(state)
+        _stats["refreshes"] += 1
+        _stats["projects_reloaded"] += len(changed)
+    return state
+
+
+def get_portfolio_forecast(project_keys=None):
+    """Budget forecast for every active project (or only ``project_keys``).
+
+    Returns:
+        pd.DataFrame: One row per project: budget, sprint count, planned/burned/remaining
+        man-months, share of the budget used, monthly burn rate, the date the budget is
+        exhausted and whether a planned sprint already exceeds it.
+    """
+    forecast = _refresh()["forecast"]
+    if project_keys is not None:
+        forecast = forecast[forecast["project_key"].isin(project_keys)]
+    return forecast.reset_index(drop=True)
+
+
+def get_burndown(project_key):
+    """Budget left after each sprint of one project, in calendar order."""
+    burndown = _refresh()["burndown"]
+    return burndown[burndown["project_key"] == project_key].reset_index(drop=True)
+
+
+def get_forecast_stats():
+    """Refreshes and per-project sprint reloads since the process started."""
+    with _lock:
+        return dict(_stats)
@@ -1,30 +1,64 @@
 import streamlit as st
+from utils import delta_cache, mirror, snapshot_cache
+from utils.metrics import query_helper
+from utils.pcv_utils import get_active_projects
+from utils.progress import clear_progress_cache
+from utils.sprint_rollup import get_capacity_rollup
 
-@st.cache_data
-def get_data(col=str, table_name=str):
-    conn = st.connection("neon", type="sql")
-    return conn.query(f"SELECT {col} FROM {table_name}", ttl=1)
+PROJECT_COLUMNS = [
+    "project_key", "project_name", "total_mm", "project_type", "scope", "status", "owner",
+    "start_date", "end_date", "created_at", "updated_at",
+]
+
+@query_helper
+def get_data(query_name: str, **params):
+    """Run a catalogued read query, reusing the last result while its tables are unchanged.
+
+    Args:
+        query_name (str): Name of the statement in ``utils.queries``.
+        **params: Parameters of the statement.
+
+    Returns:
+        pd.DataFrame: The query result.
+    """
+    return snapshot_cache.get_snapshot(query_name, **params)
 
-@st.cache_data
 def get_user_data():
     """
-    Fetch user data from the database.
+    Fetch user names from the local dimension mirror.
 
     Returns:
         list: A list of user names.
     """    
     try:
-        conn = st.connection("neon", type="sql")
-        query_result = conn.query("SELECT user_name FROM dim_user WHERE user_name IS NOT NULL", ttl=1)
-        if query_result.empty:
+        user_names = mirror.get_user_names()
+        if not user_names:
             return ["No users available"]
-        return query_result['user_name'].tolist()
+        return user_names
         
     except Exception as e:
         print(f"Error loading users: {str(e)}")
         return ["Admin", "User1", "User2"]
 
 
+@query_helper
+def get_projects(owner=None):
+    """Fetch owned, non-deleted projects from the incrementally refreshed project copy.
+
+    Args:
+        owner (str | None): Only return this owner's projects; all owned projects if None.
+
+    Returns:
+        pd.DataFrame: Project rows with ``PROJECT_COLUMNS``.
+    """
+    projects = delta_cache.get_frame("dim_project")
+    mask = projects["owner"].notna() & ~projects["is_deleted"].astype(bool)
+    if owner is not None:
+        mask &= projects["owner"] == owner
+    return projects.loc[mask, PROJECT_COLUMNS].reset_index(drop=True)
+
+
+@query_helper
 def get_prj_data():
     """Fetch project keys that either don't have an owner or are deleted.
 
@@ -32,19 +66,9 @@ def get_prj_data():
         list[str]: List of project keys with no owner or marked as deleted.
     """
     try:
-        conn = st.connection("neon", type="sql")
-
-        query = """
-            SELECT project_key
-            FROM dim_project
-            WHERE owner IS NULL OR is_deleted = TRUE
-        """
-
-        result = conn.query(query, ttl=1)
-
-        if result.empty:
-            return []
-        return result['project_key'].tolist()
+        projects = delta_cache.get_frame("dim_project")
+        unassigned = projects["owner"].isna() | projects["is_deleted"].astype(bool)
+        return projects.loc[unassigned, "project_key"].tolist()
 
     except Exception as e:
         st.error(f"Error fetching project data: {e}")
@@ -59,17 +83,8 @@ def clear_form():
 
 
 def clear_project_cache():
-    """Clear cached data for project management and global caches."""
-    try:
-        get_data.clear()
-    except Exception:
-        pass
-    try:
-        get_user_data.clear()
-    except Exception:
-        pass
-    try:
-        st.cache_data.clear()
-        st.cache_resource.clear()
-    except Exception:
-        pass
\ No newline at end of file
+    """Clear the cached reads that depend on projects."""
+    snapshot_cache.clear()
+    get_active_projects.clear()
+    get_capacity_rollup.clear()
+    clear_progress_cache()
\ No newline at end of file
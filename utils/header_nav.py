@@ -2,13 +2,13 @@ import streamlit as st
 
 def render_header_navigation(current_page=""):
     """
-    Render header navigation with 5 main pages.
+    Render header navigation with 7 main pages.
     
     Args:
         current_page (str): Current page identifier to disable the button
-                        Options: "project", "sprint", "presales", "pcv", "workflow"
+                        Options: "project", "sprint", "presales", "pcv", "workflow", "analytics", "export"
     """
-    col1, col2, col3, col4, col5 = st.columns(5)
+    col1, col2, col3, col4, col5, col6, col7 = st.columns(7)
     
     with col1:
         if st.button(
@@ -50,6 +50,22 @@ def render_header_navigation(current_page=""):
         ):
             st.switch_page("pages/6_Workflow_Management.py")
 
+    with col6:
+        if st.button(
+            "Presales Analytics",
+            use_container_width=True,
+            disabled=(current_page == "analytics")
+        ):
+            st.switch_page("pages/7_Presales_Analytics.py")
+
+    with col7:
+        if st.button(
+            "Data Export",
+            use_container_width=True,
+            disabled=(current_page == "export")
+        ):
+            st.switch_page("pages/8_Data_Export.py")
+
 def header_nav(current_page=""):
     """Render header navigation with divider line."""
     render_header_navigation(current_page)
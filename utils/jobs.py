@@ -0,0 +1,283 @@
+"""Background import jobs.
+
+``submit_presales_import`` records a job in ``import_jobs`` and hands the files (.xlsx
+or .csv) to a worker process, which parses the sheets in its own process pool, so
+parsing and loading neither block the submitting session nor hold the GIL of the
+Streamlit server. Workers report progress by updating their job
+row; pages poll ``get_recent_jobs``. A browser refresh does not affect a running job.
+
+While a job is queued or running, the server process that submitted it bumps the
+job's ``heartbeat_at`` every ``HEARTBEAT_SECONDS``. A job whose heartbeat is older than
+``STALE_AFTER_SECONDS`` lost its server (restart, crash) and is marked failed; jobs of
+other live replicas keep a fresh heartbeat and are left alone.
+
+Set the pool size in ``.streamlit/secrets.toml``:
+
+    [jobs]
+    max_workers = 2
+"""
+import multiprocessing
+import os
+import tempfile
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+import streamlit as st
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
+
+from utils import metrics
+from utils.db import primary_connection
+from utils.queries import execute, fetch_frame
+
+DEFAULT_MAX_WORKERS = 2
+HEARTBEAT_SECONDS = 15
+# Several missed heartbeats, so a slow database round trip does not fail a live job.
+STALE_AFTER_SECONDS = 120
+
+_executor = None
+_executor_lock = threading.Lock()
+_heartbeat_lock = threading.Lock()
+_heartbeat_thread = None
+# Jobs submitted by this process that have not finished yet.
+_active_jobs = set()
+
+
+def _max_workers():
+    try:
+        return int(st.secrets.get("jobs", {}).get("max_workers", DEFAULT_MAX_WORKERS))
+    except Exception:
+        return DEFAULT_MAX_WORKERS
+
+
+@metrics.query_helper
+def _get_executor(engine):
+    """Worker pool, created on first use (and again if a worker died)."""
+    global _executor
+    with _executor_lock:
+        if _executor is None or getattr(_executor, "_broken", False):
+            # Jobs left queued/running by a server process that stopped will never finish.
+            with engine.begin() as connection:
+                execute(connection, "import_jobs_orphaned", stale_seconds=STALE_AFTER_SECONDS)
+            _executor = ProcessPoolExecutor(
+                max_workers=_max_workers(), mp_context=multiprocessing.get_context("spawn")
+            )
+        return _executor
+
+
+@metrics.query_helper
+def _heartbeat_loop():
+    """Keep this process's unfinished jobs alive and fail the ones whose server stopped.
+
+    Runs only while this process has unfinished jobs.
+    """
+    global _heartbeat_thread
+    while True:
+        with _heartbeat_lock:
+            job_ids = sorted(_active_jobs)
+            if not job_ids:
+                _heartbeat_thread = None
+                return
+        try:
+            with primary_connection().engine.begin() as connection:
+                execute(connection, "import_jobs_heartbeat", job_ids=job_ids)
+                execute(connection, "import_jobs_orphaned", stale_seconds=STALE_AFTER_SECONDS)
+        except Exception as e:
+            print(f"Import job heartbeat failed: {e}")
+        time.sleep(HEARTBEAT_SECONDS)
+
+
+def _track(job_id):
+    global _heartbeat_thread
+    with _heartbeat_lock:
+        _active_jobs.add(job_id)
+        if _heartbeat_thread is None:
+            _heartbeat_thread = threading.Thread(target=_heartbeat_loop, name="import-job-heartbeat", daemon=True)
+            _heartbeat_thread.start()
+
+
+def _untrack(job_id):
+    with _heartbeat_lock:
+        _active_jobs.discard(job_id)
+
+
+@metrics.query_helper
+def _report(engine, job_id, status, progress, message):
+    with engine.begin() as connection:
+        execute(connection, "import_job_progress", status=status, progress=progress, message=message, job_id=job_id)
+
+
+@metrics.query_helper
+def _finish(engine, job_id, status, message, rows_loaded=None, rows_rejected=None):
+    with engine.begin() as connection:
+        execute(connection, "import_job_finish", status=status, message=message,
+                rows_loaded=rows_loaded, rows_rejected=rows_rejected, job_id=job_id)
+
+
+def _parse_in_parallel(engine, job_id, files):
+    """Parse every sheet of every workbook in a process pool, reporting progress.
+
+    Returns:
+        tuple[list[pd.DataFrame], pd.DataFrame]: Accepted deals per sheet in upload
+        order, and all rejected rows tagged with their file and sheet.
+    """
+    from utils.presales_etl import list_deal_sheets, parse_deal_sheet
+
+    tasks = [(name, path, sheet) for name, path in files for sheet in list_deal_sheets(path)]
+    results = {}
+    workers = max(1, min(len(tasks), os.cpu_count() or 1))
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {pool.submit(parse_deal_sheet, path, sheet): i for i, (_, path, sheet) in enumerate(tasks)}
+        for done, future in enumerate(as_completed(futures), start=1):
+            results[futures[future]] = future.result()
+            _report(engine, job_id, "running", 0.05 + 0.65 * done / len(tasks),
+                    f"Parsed {done}/{len(tasks)} sheets")
+    # Keep upload order so later files win when de-duplicating.
+    accepted = [results[i][0] for i in range(len(tasks))]
+    rejected = [
+        results[i][1].assign(file_name=name, sheet=sheet)
+        for i, (name, _, sheet) in enumerate(tasks) if not results[i][1].empty
+    ]
+    return accepted, (pd.concat(rejected, ignore_index=True) if rejected else pd.DataFrame())
+
+
+@metrics.query_helper
+def _save_rejects(connection, job_id, rejected):
+    """Store rejected rows (all columns as JSON) so they can be downloaded later."""
+    if rejected.empty:
+        return
+    row_data = rejected.drop(columns=['file_name', 'sheet', 'row_number', 'reject_reasons'])
+    execute(
+        connection, "import_rejects_insert", job_id=job_id,
+        file_names=rejected['file_name'].tolist(), sheets=rejected['sheet'].tolist(),
+        row_numbers=rejected['row_number'].tolist(), reject_reasons=rejected['reject_reasons'].tolist(),
+        row_data=row_data.to_json(orient='records', lines=True, date_format='iso').splitlines(),
+    )
+
+
+def _run_presales_import(db_url, job_id, files):
+    """Worker-process entry point: parse all workbooks, merge, and load once.
+
+    Rows that fail validation are stored in ``import_rejects``; the valid ones load
+    in the same transaction.
+    """
+    from utils.presales_etl import load_deals, merge_deal_frames
+
+    start = time.perf_counter()
+    engine = create_engine(db_url, poolclass=NullPool)
+    try:
+        _report(engine, job_id, "running", 0.05, f"Reading {len(files)} file(s)")
+        accepted, rejected = _parse_in_parallel(engine, job_id, files)
+        df = merge_deal_frames(accepted)
+        _report(engine, job_id, "running", 0.75, f"Loading {len(df)} deals")
+        with engine.begin() as connection:
+            count = load_deals(connection, df)
+            _save_rejects(connection, job_id, rejected)
+        message = "fact_deals and presales cube updated"
+        if len(rejected):
+            message += f"; {len(rejected)} rows rejected (download below)"
+        _finish(engine, job_id, "succeeded", message, count, len(rejected))
+        return count, time.perf_counter() - start
+    except Exception as e:
+        traceback.print_exc()
+        _finish(engine, job_id, "failed", str(e))
+        raise
+    finally:
+        engine.dispose()
+        for _, path in files:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+@metrics.query_helper
+def submit_presales_import(files, submitted_by):
+    """Queue an import of one or more presales workbooks.
+
+    Args:
+        files (list[tuple[str, bytes]]): ``(file name, contents)`` per uploaded file, in
+            upload order.
+        submitted_by (str): User who started the import.
+
+    Returns:
+        int: The new job id.
+    """
+    engine = primary_connection().engine
+    with engine.begin() as connection:
+        job_id = int(execute(
+            connection, "import_job_insert", kind="presales",
+            file_name=", ".join(name for name, _ in files), submitted_by=submitted_by
+        ).scalar())
+
+    saved = []
+    for name, data in files:
+        with tempfile.NamedTemporaryFile(suffix=os.path.splitext(name)[1], delete=False) as payload:
+            payload.write(data)
+        saved.append((name, payload.name))
+
+    db_url = engine.url.render_as_string(hide_password=False)
+    future = _get_executor(engine).submit(_run_presales_import, db_url, job_id, saved)
+    _track(job_id)
+
+    def _on_done(f):
+        _untrack(job_id)
+        # Throughput is counted here: the worker's own counters die with its process.
+        # The worker records its own failures; the second branch catches one that died outright.
+        error = f.exception()
+        if error is None:
+            metrics.observe_import(*f.result())
+        elif isinstance(error, BrokenProcessPool):
+            try:
+                _finish(engine, job_id, "failed", f"Worker error: {error}")
+            except Exception as e:
+                print(f"Could not record failure of job {job_id}: {e}")
+
+    future.add_done_callback(_on_done)
+    return job_id
+
+
+@metrics.query_helper
+def get_recent_jobs(limit=20):
+    """Most recent import jobs, newest first. Read from the primary so progress is current.
+
+    Returns:
+        pd.DataFrame: Rows of ``import_jobs``.
+    """
+    try:
+        with primary_connection().engine.connect() as connection:
+            df = fetch_frame(connection, "import_jobs_recent", limit=limit)
+            connection.commit()
+        return df
+    except Exception as e:
+        st.error(f"Error loading import jobs: {e}")
+        return pd.DataFrame()
+
+
+@metrics.query_helper
+def get_job_rejects(job_id):
+    """Rows a job rejected, one column per source column plus where and why.
+
+    Returns:
+        pd.DataFrame: ``file_name``, ``sheet``, ``row_number``, ``reject_reasons`` and
+        the cells as read, in workbook column order.
+    """
+    with primary_connection().engine.connect() as connection:
+        df = fetch_frame(connection, "import_rejects_for_job", job_id=job_id)
+        connection.commit()
+    if df.empty:
+        return df
+    from utils.presales_etl import COLUMN_MAP
+
+    cells = pd.DataFrame(df.pop('row_data').tolist(), index=df.index)
+    cells = cells[[c for c in COLUMN_MAP.values() if c in cells] + [c for c in cells if c not in COLUMN_MAP.values()]]
+    return pd.concat([df, cells], axis=1)
+
+
+def job_rejects_csv(job_id):
+    """CSV bytes of ``get_job_rejects`` for a download button."""
+    return get_job_rejects(job_id).to_csv(index=False).encode("utf-8")
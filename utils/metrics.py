@@ -0,0 +1,330 @@
+"""Process metrics in OpenMetrics text format.
+
+Counts catalogued queries by page, calling helper and statement, records query and
+page rerun latency histograms and presales import throughput, and reports pool
+utilization plus the counters of the caches, the audit writer and the connection
+lifecycle at scrape time. Cache hit ratios are ``hits / (hits + misses)`` of the
+``prj_cache_*_total`` counters; delta-cached tables have no hits, only full loads
+(misses) and incremental loads (``prj_cache_delta_loads_total``).
+
+``start_metrics_exporter()`` (called once per process from ``login_form``) serves
+``/metrics`` from a daemon thread when enabled in ``.streamlit/secrets.toml``:
+
+    [metrics]
+    enabled = true
+    port = 9464
+    host = "0.0.0.0"
+
+Every Streamlit process needs its own port.
+"""
+import bisect
+import contextvars
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import streamlit as st
+
+DEFAULT_PORT = 9464
+QUERY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RERUN_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+CONTENT_TYPE = "application/openmetrics-text; version=1.0.0; charset=utf-8"
+
+_PAGE_KEY = "_metrics_page"
+
+# Set by @query_helper; statements run outside any helper are labelled "page".
+_helper = contextvars.ContextVar("prj_query_helper", default="page")
+_lock = threading.Lock()
+_query_counts = {}
+_histograms = {}
+_imports = {"jobs": 0, "rows": 0, "seconds": 0.0, "last_rows_per_second": None}
+_pools = {}
+_start_lock = threading.Lock()
+_started = False
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+
+
+def _observe(name, labels, value, buckets):
+    with _lock:
+        key = (name, labels)
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = _Histogram(buckets)
+        histogram.observe(value)
+
+
+def _current_page():
+    try:
+        return st.session_state.get(_PAGE_KEY, "none")
+    except Exception:
+        # Background threads and worker processes have no session.
+        return "background"
+
+
+def query_helper(fn):
+    """Label the catalogued statements ``fn`` runs with its name in ``prj_queries_total``.
+
+    The innermost decorated helper wins, so cache layers need no label of their own.
+    """
+    label = f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__name__}"
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = _helper.set(label)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _helper.reset(token)
+    return wrapper
+
+
+def observe_query(name, seconds):
+    """Record one execution of catalogued statement ``name`` (called by ``utils.queries``)."""
+    key = (_current_page(), _helper.get(), name)
+    with _lock:
+        _query_counts[key] = _query_counts.get(key, 0) + 1
+    _observe("prj_query_duration_seconds", (("query", name),), seconds, QUERY_BUCKETS)
+
+
+@contextmanager
+def track_rerun(page):
+    """Time a page's script run and label the queries it makes with ``page``.
+
+    Also counts runs ended by ``st.rerun``/``st.stop``, which unwind through here.
+    """
+    try:
+        st.session_state[_PAGE_KEY] = page
+    except Exception:
+        pass
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _observe("prj_rerun_duration_seconds", (("page", page),), time.perf_counter() - start, RERUN_BUCKETS)
+
+
+def observe_import(rows, seconds):
+    """Record a finished import of ``rows`` deals that took ``seconds`` in the worker."""
+    with _lock:
+        _imports["jobs"] += 1
+        _imports["rows"] += rows
+        _imports["seconds"] += seconds
+        if seconds > 0:
+            _imports["last_rows_per_second"] = rows / seconds
+
+
+def register_pool(label, get_engine):
+    """Report the pool of the engine returned by ``get_engine()`` as ``pool=label``."""
+    with _lock:
+        _pools[label] = get_engine
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _labels(pairs):
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class _Writer:
+    def __init__(self):
+        self.lines = []
+
+    def family(self, name, kind, help_text, samples):
+        """Add one metric family; ``samples`` are ``(suffix, labels, value)``."""
+        self.lines.append(f"# TYPE {name} {kind}")
+        self.lines.append(f"# HELP {name} {help_text}")
+        for suffix, labels, value in samples:
+            if value is not None:
+                self.lines.append(f"{name}{suffix}{_labels(labels)} {_number(value)}")
+
+    def text(self):
+        return "\n".join(self.lines + ["# EOF"]) + "\n"
+
+
+def _histogram_samples(histograms):
+    samples = []
+    for labels, histogram in histograms:
+        cumulative = 0
+        for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else str(float(bound))
+            samples.append(("_bucket", labels + (("le", le),), cumulative))
+        samples.append(("_count", labels, cumulative))
+        samples.append(("_sum", labels, histogram.sum))
+    return samples
+
+
+def _pool_samples(pools):
+    samples = []
+    for label, get_engine in pools.items():
+        try:
+            pool = get_engine().pool
+        except Exception as e:
+            print(f"Could not read {label} pool metrics: {e}")
+            continue
+        for state, method in (("size", "size"), ("checked_out", "checkedout"), ("overflow", "overflow")):
+            if hasattr(pool, method):
+                samples.append(("", (("pool", label), ("state", state)), getattr(pool, method)()))
+    return samples
+
+
+def _stat_sources():
+    # Imported here: these modules import ``utils.queries``, which imports this one.
+    from utils import audit, delta_cache, shared_cache, snapshot_cache
+    from utils.connection_lifecycle import get_connection_metrics
+
+    return {
+        "snapshot": snapshot_cache.get_snapshot_stats(),
+        "shared": shared_cache.get_shared_cache_stats(),
+        "delta": delta_cache.get_delta_stats(),
+        "audit": audit.get_audit_stats(),
+        "connection": get_connection_metrics(),
+    }
+
+
+def render():
+    """All metrics as an OpenMetrics text exposition."""
+    with _lock:
+        query_counts = dict(_query_counts)
+        grouped = {}
+        for (name, labels), histogram in _histograms.items():
+            copy = _Histogram(histogram.buckets)
+            copy.counts, copy.sum = list(histogram.counts), histogram.sum
+            grouped.setdefault(name, []).append((labels, copy))
+        imports = dict(_imports)
+        pools = dict(_pools)
+    sources = _stat_sources()
+
+    out = _Writer()
+    out.family("prj_queries", "counter", "Catalogued statements executed, by page and calling helper.", [
+        ("_total", (("page", page), ("helper", helper), ("query", query)), count)
+        for (page, helper, query), count in sorted(query_counts.items())
+    ])
+    out.family("prj_query_duration_seconds", "histogram", "Catalogued statement latency.",
+               _histogram_samples(grouped.get("prj_query_duration_seconds", [])))
+    out.family("prj_rerun_duration_seconds", "histogram", "Page script run duration.",
+               _histogram_samples(grouped.get("prj_rerun_duration_seconds", [])))
+    out.family("prj_pool_connections", "gauge", "Database pool connections by state.", _pool_samples(pools))
+
+    snapshot, shared = sources["snapshot"], sources["shared"]
+    delta_loads = [(table, stats) for table, stats in sorted(sources["delta"].items())]
+    out.family("prj_cache_hits", "counter", "Cache lookups served from the cache.", [
+        ("_total", (("cache", "snapshot"),), snapshot.get("hits")),
+        ("_total", (("cache", "shared"),), shared.get("hits")),
+    ])
+    out.family("prj_cache_misses", "counter", "Cache lookups that went to the database in full.", [
+        ("_total", (("cache", "snapshot"),), snapshot.get("misses")),
+        ("_total", (("cache", "shared"),), shared.get("misses")),
+    ] + [("_total", (("cache", f"delta:{t}"),), s.get("full_loads")) for t, s in delta_loads])
+    out.family("prj_cache_delta_loads", "counter", "Incremental reloads of a delta-cached table.", [
+        ("_total", (("table", t),), s.get("delta_loads")) for t, s in delta_loads
+    ])
+    out.family("prj_cache_entries", "gauge", "Entries held by a cache.", [
+        ("", (("cache", "snapshot"),), snapshot.get("size")),
+        ("", (("cache", "shared"),), shared.get("entries")),
+    ])
+    out.family("prj_shared_cache_errors", "counter", "Shared cache operations that failed.",
+               [("_total", (), shared.get("errors"))])
+
+    audit = sources["audit"]
+    out.family("prj_audit_rows", "counter", "Audit rows by outcome.", [
+        ("_total", (("outcome", key),), audit.get(key)) for key in ("queued", "written", "sync_writes", "failed")
+    ])
+    out.family("prj_audit_pending", "gauge", "Audit rows waiting to be written.", [("", (), audit.get("pending"))])
+
+    connection = sources["connection"]
+    out.family("prj_db_retries", "counter", "Transient database errors retried.",
+               [("_total", (), connection.get("retries"))])
+    out.family("prj_db_keepalives", "counter", "Keepalive pings by outcome.", [
+        ("_total", (("outcome", "ok"),), connection.get("keepalives")),
+        ("_total", (("outcome", "failed"),), connection.get("keepalive_failures")),
+    ])
+    out.family("prj_db_warmup_seconds", "gauge", "Pool warm-up time at process start.", [
+        ("", (("pool", label),), seconds) for label, seconds in connection.get("warmup_seconds", {}).items()
+    ])
+    out.family("prj_db_first_query_seconds", "gauge", "Time to the first query at process start.", [
+        ("", (("pool", label),), seconds) for label, seconds in connection.get("first_query_seconds", {}).items()
+    ])
+
+    out.family("prj_import_jobs", "counter", "Presales imports finished.", [("_total", (), imports["jobs"])])
+    out.family("prj_import_rows", "counter", "Deals loaded by presales imports.", [("_total", (), imports["rows"])])
+    out.family("prj_import_seconds", "counter", "Worker time spent on presales imports.",
+               [("_total", (), imports["seconds"])])
+    out.family("prj_import_rows_per_second", "gauge", "Throughput of the last presales import.",
+               [("", (), imports["last_rows_per_second"])])
+    return out.text()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        try:
+            body = render().encode()
+        except Exception as e:
+            print(f"Rendering metrics failed: {e}")
+            self.send_error(500)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _metrics_config():
+    try:
+        config = dict(st.secrets.get("metrics", {}))
+    except Exception:
+        config = {}
+    return {
+        "enabled": bool(config.get("enabled", False)),
+        "host": str(config.get("host", "0.0.0.0")),
+        "port": int(config.get("port", DEFAULT_PORT)),
+    }
+
+
+def start_metrics_exporter():
+    """Serve ``/metrics`` on the configured port, once per process."""
+    global _started
+    with _start_lock:
+        if _started:
+            return True
+        _started = True
+
+    config = _metrics_config()
+    if not config["enabled"]:
+        return False
+    try:
+        server = ThreadingHTTPServer((config["host"], config["port"]), _Handler)
+    except OSError as e:
+        print(f"Metrics exporter could not bind {config['host']}:{config['port']}: {e}")
+        return False
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-exporter", daemon=True).start()
+    print(f"Serving metrics on {config['host']}:{config['port']}/metrics")
+    return True
@@ -0,0 +1,238 @@
+"""Versioned schema migrations.
+
+Migrations are the numbered ``.sql`` files in the top-level ``migrations/`` directory.
+Each file is applied once, in order, inside its own transaction and recorded in
+``schema_migrations``. Only the command line applies them (the container runs it before
+starting Streamlit); the app merely refuses to run against an out-of-date schema.
+
+The command line uses the ``neon`` connection from ``.streamlit/secrets.toml``, like
+the app, and falls back to the ``PG_*`` environment variables when it is not configured.
+
+Usage:
+    python -m utils.migrations                # apply pending migrations
+    python -m utils.migrations --check-plans  # fail if a hot query seq-scans
+"""
+import argparse
+import os
+import sys
+from pathlib import Path
+
+import streamlit as st
+from sqlalchemy import create_engine, text
+
+from utils.db import PRIMARY_CONNECTION
+from utils.queries import explain
+
+MIGRATIONS_DIR = Path(__file__).resolve().parent.parent / "migrations"
+
+# Arbitrary constant so concurrent app workers don't apply migrations twice.
+_ADVISORY_LOCK_ID = 7_340_291
+
+# Catalogued queries the pages run on every load; each must be served by an index.
+# Values are (parameters matching the synthetic data, tables that must not be sequentially scanned).
+HOT_QUERIES = {
+    "pcv_recent": ({"project_key": "SYN-00042", "limit": 5}, {"fact_pcv_metrics"}),
+    "projects_brief_by_owner": ({"owner": "syn-owner-42"}, {"dim_project"}),
+    "sprints_by_projects": ({"project_keys": ["SYN-00042"]}, {"sprint_info"}),
+    "auth_user_by_email": ({"email": "syn-42@example.com"}, {"app_users"}),
+}
+
+
+def _neon_configured():
+    try:
+        return PRIMARY_CONNECTION in st.secrets.get("connections", {})
+    except Exception:
+        return False
+
+
+def get_engine():
+    """Engine for the app's ``neon`` connection, or from the PG_* environment variables (as used by the importer)."""
+    if _neon_configured():
+        return st.connection(PRIMARY_CONNECTION, type="sql").engine
+    from dotenv import load_dotenv
+    load_dotenv()
+    user = os.getenv("PG_USER")
+    password = os.getenv("PG_PASSWORD")
+    host = os.getenv("PG_HOST")
+    db = os.getenv("PG_DB")
+    port = os.getenv("PG_PORT", 5432)
+    return create_engine(f"postgresql://{user}:{password}@{host}:{port}/{db}")
+
+
+def list_migrations():
+    """Return ``(version, name, path)`` for every migration file, sorted by version."""
+    migrations = []
+    for path in sorted(MIGRATIONS_DIR.glob("*.sql")):
+        version, _, name = path.stem.partition("_")
+        migrations.append((version, name, path))
+    return migrations
+
+
+def pending_migrations(engine):
+    """File names of the migrations not yet recorded in ``schema_migrations``, without applying any."""
+    with engine.connect() as connection:
+        if connection.execute(text("SELECT to_regclass('schema_migrations')")).scalar() is None:
+            done = set()
+        else:
+            done = {row[0] for row in connection.execute(text("SELECT version FROM schema_migrations"))}
+    return [path.name for version, _, path in list_migrations() if version not in done]
+
+
+def run_migrations(engine):
+    """Apply all pending migrations.
+
+    Args:
+        engine: SQLAlchemy engine for the target database.
+
+    Returns:
+        list[str]: File names of the migrations applied by this call.
+    """
+    with engine.begin() as connection:
+        connection.execute(text("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                applied_at TIMESTAMP NOT NULL DEFAULT NOW()
+            )
+        """))
+
+    applied = []
+    with engine.connect() as connection:
+        connection.execute(text("SELECT pg_advisory_lock(:lock_id)"), {"lock_id": _ADVISORY_LOCK_ID})
+        connection.commit()
+        try:
+            done = {row[0] for row in connection.execute(text("SELECT version FROM schema_migrations"))}
+            connection.commit()
+            for version, name, path in list_migrations():
+                if version in done:
+                    continue
+                with connection.begin():
+                    # Straight through the DBAPI cursor: no parameter parsing of the file, and
+                    # its RAISE NOTICE output (e.g. rows a migration moved aside) is kept.
+                    cursor = connection.connection.dbapi_connection.cursor()
+                    del cursor.connection.notices[:]
+                    cursor.execute(path.read_text())
+                    notices = list(cursor.connection.notices)
+                    connection.execute(
+                        text("INSERT INTO schema_migrations (version, name) VALUES (:version, :name)"),
+                        {"version": version, "name": name}
+                    )
+                applied.append(path.name)
+                print(f"Applied migration {path.name}")
+                for notice in notices:
+                    # Skip the "does not exist, skipping" chatter of IF [NOT] EXISTS.
+                    if not notice.rstrip().endswith("skipping"):
+                        print(f"  {notice.strip()}")
+        finally:
+            connection.execute(text("SELECT pg_advisory_unlock(:lock_id)"), {"lock_id": _ADVISORY_LOCK_ID})
+            connection.commit()
+    return applied
+
+
+@st.cache_resource(show_spinner=False)
+def _check_schema():
+    """Raise if the ``neon`` database has pending migrations; only a passing check is cached."""
+    conn = st.connection(PRIMARY_CONNECTION, type="sql")
+    pending = pending_migrations(conn.engine)
+    if pending:
+        raise RuntimeError(f"{len(pending)} pending migration(s): {', '.join(pending)}")
+
+
+def ensure_schema():
+    """Stop the page if the database schema is behind ``migrations/``.
+
+    Migrations are never applied from a web request; run ``python -m utils.migrations``.
+    """
+    try:
+        _check_schema()
+    except RuntimeError as e:
+        st.error(f"❌ The database schema is out of date ({e}). Run `python -m utils.migrations`.")
+        st.stop()
+
+
+def _seq_scanned_tables(plan):
+    """Collect relation names of all Seq Scan nodes in an EXPLAIN (FORMAT JSON) plan."""
+    tables = set()
+    if plan.get("Node Type") == "Seq Scan":
+        tables.add(plan.get("Relation Name"))
+    for child in plan.get("Plans", []):
+        tables |= _seq_scanned_tables(child)
+    return tables
+
+
+def check_query_plans(engine, rows=200_000):
+    """EXPLAIN every hot query against large synthetic data and report seq scans.
+
+    Synthetic rows are inserted and analyzed inside a transaction that is always
+    rolled back, so the check is safe to run against a real database.
+
+    Args:
+        engine: SQLAlchemy engine for a migrated database.
+        rows (int): Number of synthetic PCV assessments to generate.
+
+    Returns:
+        dict[str, set[str]]: Query name to the tables it sequentially scans; empty if all good.
+    """
+    projects = max(rows // 20, 1000)
+    failures = {}
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        try:
+            connection.execute(text("""
+                INSERT INTO dim_project (project_key, project_name, owner, status, is_deleted)
+                SELECT 'SYN-' || LPAD(g::text, 5, '0'), 'Synthetic ' || g,
+                       'syn-owner-' || (g % 500), 'Active', g % 10 = 0
+                FROM generate_series(1, :projects) g
+            """), {"projects": projects})
+            connection.execute(text("""
+                INSERT INTO fact_pcv_metrics (project_key, division, pcv_score, assessment_date)
+                SELECT 'SYN-' || LPAD(((g % :projects) + 1)::text, 5, '0'),
+                       'Division ' || (1 + g % 2), 50 + g % 50,
+                       DATE '2020-01-01' + (g / :projects)
+                FROM generate_series(1, :rows) g
+            """), {"projects": projects, "rows": rows})
+            connection.execute(text("""
+                INSERT INTO sprint_info (sprint_name, project_key, sprint_capacity)
+                SELECT 'Sprint ' || (g / :projects), 'SYN-' || LPAD(((g % :projects) + 1)::text, 5, '0'), g % 40
+                FROM generate_series(1, :rows) g
+            """), {"projects": projects, "rows": rows})
+            connection.execute(text("""
+                INSERT INTO app_users (email, username, password, role)
+                SELECT 'syn-' || g || '@example.com', 'syn-' || g, 'x', 'pm'
+                FROM generate_series(1, :users) g
+            """), {"users": projects})
+            for table in ("dim_project", "fact_pcv_metrics", "sprint_info", "app_users"):
+                connection.execute(text(f"ANALYZE {table}"))
+
+            for name, (params, guarded_tables) in HOT_QUERIES.items():
+                scanned = _seq_scanned_tables(explain(connection, name, **params)) & guarded_tables
+                if scanned:
+                    failures[name] = scanned
+        finally:
+            transaction.rollback()
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply schema migrations.")
+    parser.add_argument("--check-plans", action="store_true",
+                        help="after migrating, fail if a hot query falls back to a sequential scan")
+    parser.add_argument("--rows", type=int, default=200_000, help="synthetic rows for --check-plans")
+    args = parser.parse_args(argv)
+
+    engine = get_engine()
+    applied = run_migrations(engine)
+    print(f"✅ {len(applied)} migration(s) applied")
+
+    if args.check_plans:
+        failures = check_query_plans(engine, rows=args.rows)
+        for name, tables in failures.items():
+            print(f"❌ {name}: sequential scan on {', '.join(sorted(tables))}")
+        if failures:
+            return 1
+        print(f"✅ {len(HOT_QUERIES)} hot queries use indexes")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
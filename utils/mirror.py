@@ -0,0 +1,200 @@
+"""Local SQLite mirror of the small dimension tables.
+
+``dim_user``, ``dim_status``, ``workflow``, ``workflow_status`` and the non-secret
+columns of ``app_users`` are copied into an embedded SQLite file and refreshed by a
+background thread. Lookups read the local copy, so pages keep rendering while the
+Neon endpoint is slow or waking up. Each refresh first compares the ``table_versions``
+counters with the ones recorded at the last copy and only re-copies tables that changed.
+
+- A lookup older than ``MAX_STALENESS_SECONDS`` resyncs synchronously first; if that
+  fails, the stale copy is served.
+- Write paths call ``resync(table, ...)`` after committing so the writer sees its change.
+"""
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from decimal import Decimal
+
+import pandas as pd
+
+from utils.db import primary_connection, read_engine
+from utils.queries import fetch_frame
+from utils.metrics import query_helper
+
+MIRROR_PATH = os.getenv("DIM_MIRROR_PATH", os.path.join(tempfile.gettempdir(), "prj_manage_dim_mirror.sqlite3"))
+REFRESH_SECONDS = 30
+MAX_STALENESS_SECONDS = 120
+
+# Mirror table -> catalogued query that produces its full contents.
+MIRRORED_TABLES = {
+    "dim_user": "user_names",
+    "dim_status": "status_names",
+    "workflow": "workflows_all",
+    "workflow_status": "workflow_statuses_all",
+    "app_users": "app_users_list",
+}
+
+_sync_lock = threading.Lock()
+_local = threading.local()
+_start_lock = threading.Lock()
+_refresher = None
+
+
+def _db():
+    """Per-thread SQLite connection to the mirror file."""
+    db = getattr(_local, "db", None)
+    if db is None:
+        db = sqlite3.connect(MIRROR_PATH, timeout=10, isolation_level=None)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(
+            "CREATE TABLE IF NOT EXISTS _mirror_meta "
+            "(table_name TEXT PRIMARY KEY, synced_at REAL NOT NULL, version INTEGER)"
+        )
+        if "version" not in {row[1] for row in db.execute("PRAGMA table_info(_mirror_meta)")}:
+            db.execute("ALTER TABLE _mirror_meta ADD COLUMN version INTEGER")
+        _local.db = db
+    return db
+
+
+def _sqlite_value(value):
+    if value is None or (not isinstance(value, (str, bytes)) and pd.isna(value)):
+        return None
+    if hasattr(value, "item"):
+        value = value.item()
+    if isinstance(value, Decimal):
+        return float(value)
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return value
+
+
+def _replace_table(db, table, df, version):
+    """Swap in a new copy of ``table`` atomically so readers never see a partial table."""
+    columns = ", ".join(f'"{c}"' for c in df.columns)
+    placeholders = ", ".join("?" for _ in df.columns)
+    rows = [tuple(_sqlite_value(v) for v in row) for row in df.itertuples(index=False, name=None)]
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        db.execute(f'DROP TABLE IF EXISTS "{table}"')
+        db.execute(f'CREATE TABLE "{table}" ({columns})')
+        db.executemany(f'INSERT INTO "{table}" VALUES ({placeholders})', rows)
+        db.execute(
+            "INSERT OR REPLACE INTO _mirror_meta (table_name, synced_at, version) VALUES (?, ?, ?)",
+            (table, time.time(), version)
+        )
+        db.execute("COMMIT")
+    except Exception:
+        db.execute("ROLLBACK")
+        raise
+
+
+def _mirrored_versions(db):
+    return dict(db.execute("SELECT table_name, version FROM _mirror_meta").fetchall())
+
+
+@query_helper
+def sync_tables(engine, tables=None):
+    """Copy ``tables`` (default: all mirrored tables) from ``engine`` into the mirror.
+
+    Tables whose ``table_versions`` counter matches the mirrored copy are only re-stamped.
+    """
+    tables = list(tables or MIRRORED_TABLES)
+    with _sync_lock:
+        db = _db()
+        mirrored = _mirrored_versions(db)
+        with engine.connect() as connection:
+            versions = fetch_frame(connection, "table_versions", table_names=tables)
+            versions = dict(zip(versions["table_name"], versions["version"].astype(int)))
+            changed = [t for t in tables if versions.get(t) is None or versions[t] != mirrored.get(t)]
+            frames = {table: fetch_frame(connection, MIRRORED_TABLES[table]) for table in changed}
+            connection.commit()
+        for table, df in frames.items():
+            _replace_table(db, table, df, versions.get(table))
+        unchanged = [(time.time(), t) for t in tables if t not in frames]
+        if unchanged:
+            db.executemany("UPDATE _mirror_meta SET synced_at = ? WHERE table_name = ?", unchanged)
+
+
+def _refresh_loop():
+    while True:
+        try:
+            # Looked up every round, so a rebuilt or newly configured connection is picked up.
+            sync_tables(read_engine())
+        except Exception as e:
+            print(f"Dimension mirror refresh failed: {e}")
+        time.sleep(REFRESH_SECONDS)
+
+
+def start_mirror():
+    """Start the background refresh thread once per process."""
+    global _refresher
+    with _start_lock:
+        if _refresher is None or not _refresher.is_alive():
+            _refresher = threading.Thread(target=_refresh_loop, name="dim-mirror", daemon=True)
+            _refresher.start()
+    return _refresher
+
+
+def _synced_at(db, table):
+    row = db.execute("SELECT synced_at FROM _mirror_meta WHERE table_name = ?", (table,)).fetchone()
+    return row[0] if row else None
+
+
+def read_table(table, sql=None):
+    """Read a mirrored table, resyncing first if it is missing or too stale.
+
+    Args:
+        table (str): One of ``MIRRORED_TABLES``.
+        sql (str | None): SQLite query over the table; defaults to ``SELECT *``.
+
+    Returns:
+        pd.DataFrame: The mirrored rows.
+    """
+    start_mirror()
+    synced_at = _synced_at(_db(), table)
+    if synced_at is None or time.time() - synced_at > MAX_STALENESS_SECONDS:
+        try:
+            sync_tables(read_engine(), [table])
+        except Exception as e:
+            if synced_at is None:
+                raise
+            print(f"Serving stale {table} mirror: {e}")
+    return pd.read_sql_query(sql or f'SELECT * FROM "{table}"', _db())
+
+
+def resync(*tables):
+    """Force-refresh mirrored tables from the primary. Call after committing a write to them."""
+    try:
+        sync_tables(primary_connection().engine, tables or None)
+    except Exception as e:
+        print(f"Dimension mirror resync failed: {e}")
+
+
+def get_user_names():
+    """User names from ``dim_user``."""
+    return read_table("dim_user", 'SELECT user_name FROM "dim_user"')["user_name"].tolist()
+
+
+def get_status_names():
+    """Status names from ``dim_status``, sorted."""
+    return read_table("dim_status", 'SELECT status_name FROM "dim_status" ORDER BY status_name')["status_name"].tolist()
+
+
+def get_workflow_names():
+    """Workflow names, sorted."""
+    return read_table("workflow", 'SELECT workflow_name FROM "workflow" ORDER BY workflow_name')["workflow_name"].tolist()
+
+
+def get_workflow_tables():
+    """Return ``(workflows_df, statuses_df)``."""
+    return (
+        read_table("workflow", 'SELECT * FROM "workflow" ORDER BY workflow_name'),
+        read_table("workflow_status"),
+    )
+
+
+def get_app_users():
+    """Email, username and role of every app user (no password hashes)."""
+    return read_table("app_users")
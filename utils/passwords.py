@@ -0,0 +1,194 @@
+"""Salted scrypt password hashes, computed on a bounded worker pool.
+
+Hashes are stored in ``app_users.password`` as
+
+    scrypt$<n>$<r>$<p>$<salt, base64>$<key, base64>
+
+with a random salt per hash. Accounts created before this have an unsalted SHA-256
+hex digest; ``verify_password`` still accepts those and reports that they need a
+rehash, which ``utils.auth`` does on the next successful login.
+
+scrypt is deliberately slow and memory-hard (``128 * n * r`` bytes, 16 MB with the
+defaults), so it never runs on the Streamlit script thread directly: every hash is
+submitted to a thread pool of ``max_workers`` (``hashlib.scrypt`` releases the GIL).
+A burst of logins queues there instead of taking every core and all the memory.
+Tune it in ``.streamlit/secrets.toml``; changing n/r/p rehashes users as they log in:
+
+    [passwords]
+    n = 16384
+    r = 8
+    p = 1
+    max_workers = 2
+
+Benchmark login throughput (no database needed):
+
+    python -m utils.passwords bench --logins 64 --concurrency 16
+"""
+import argparse
+import base64
+import hashlib
+import hmac
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import streamlit as st
+
+SCHEME = "scrypt"
+DEFAULT_PARAMS = {"n": 2 ** 14, "r": 8, "p": 1}
+DEFAULT_MAX_WORKERS = 2
+SALT_BYTES = 16
+KEY_BYTES = 32
+HASH_TIMEOUT_SECONDS = 30
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _config():
+    try:
+        config = dict(st.secrets.get("passwords", {}))
+    except Exception:
+        config = {}
+    params = {k: int(config.get(k, default)) for k, default in DEFAULT_PARAMS.items()}
+    return params, int(config.get("max_workers", DEFAULT_MAX_WORKERS))
+
+
+def _get_executor():
+    """Hashing pool, created on first use."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=_config()[1], thread_name_prefix="password-kdf")
+        return _executor
+
+
+def _scrypt(password, salt, n, r, p):
+    return hashlib.scrypt(
+        password.encode(), salt=salt, n=n, r=r, p=p, dklen=KEY_BYTES, maxmem=256 * n * r * p
+    )
+
+
+def _derive(password, salt, n, r, p):
+    """Run scrypt on the pool and wait for it."""
+    return _get_executor().submit(_scrypt, password, salt, n, r, p).result(timeout=HASH_TIMEOUT_SECONDS)
+
+
+def _b64(raw):
+    return base64.b64encode(raw).decode().rstrip("=")
+
+
+def _unb64(text):
+    return base64.b64decode(text + "=" * (-len(text) % 4))
+
+
+def legacy_hash(password):
+    """Unsalted SHA-256 hex digest used before scrypt (kept to verify old accounts)."""
+    return hashlib.sha256(password.encode()).hexdigest()
+
+
+def hash_password(password, params=None):
+    """Hash a password with a fresh salt.
+
+    Args:
+        password (str): The password to hash.
+        params (dict, optional): scrypt ``n``, ``r``, ``p``; defaults to the configured ones.
+
+    Returns:
+        str: The encoded hash, ready to store in ``app_users.password``.
+    """
+    params = params or _config()[0]
+    salt = os.urandom(SALT_BYTES)
+    key = _derive(password, salt, params["n"], params["r"], params["p"])
+    return f"{SCHEME}${params['n']}${params['r']}${params['p']}${_b64(salt)}${_b64(key)}"
+
+
+def verify_password(password, stored):
+    """Check a password against a stored hash.
+
+    Args:
+        password (str): The password entered.
+        stored (str | None): The value of ``app_users.password``.
+
+    Returns:
+        tuple[bool, bool]: Whether it matches, and whether the stored hash should be
+        replaced (legacy SHA-256 or scrypt parameters other than the configured ones).
+        An account without a stored hash never matches.
+    """
+    if not isinstance(stored, str) or not stored:
+        # Same cost as a real check, like an unknown email.
+        burn_equivalent_time(password)
+        return False, False
+    if not stored.startswith(f"{SCHEME}$"):
+        return hmac.compare_digest(legacy_hash(password), stored), True
+    try:
+        _, n, r, p, salt, key = stored.split("$")
+        n, r, p = int(n), int(r), int(p)
+        salt, key = _unb64(salt), _unb64(key)
+    except ValueError:
+        return False, False
+    matches = hmac.compare_digest(_derive(password, salt, n, r, p), key)
+    return matches, matches and {"n": n, "r": r, "p": p} != _config()[0]
+
+
+def burn_equivalent_time(password):
+    """Spend one hash on an unknown account so response time does not reveal which emails exist."""
+    params = _config()[0]
+    _derive(password, b"\0" * SALT_BYTES, params["n"], params["r"], params["p"])
+
+
+def _bench(logins, concurrency, workers, params):
+    """Time ``logins`` concurrent verifications through a pool of ``workers`` hashers."""
+    global _executor
+    with _executor_lock:
+        _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="password-kdf")
+    stored = hash_password("Bench-password-1", params)
+
+    latencies = []
+
+    def login(_):
+        start = time.perf_counter()
+        verify_password("Bench-password-1", stored)
+        latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as sessions:
+        list(sessions.map(login, range(logins)))
+    elapsed = time.perf_counter() - start
+    latencies.sort()
+    return {
+        "logins_per_s": logins / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(0.95 * (len(latencies) - 1))] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Password hashing tools.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    bench = commands.add_parser("bench", help="Measure login throughput for several pool sizes.")
+    bench.add_argument("--logins", type=int, default=64, help="Logins to simulate per run.")
+    bench.add_argument("--concurrency", type=int, default=16, help="Simultaneous sessions logging in.")
+    bench.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="Hashing pool sizes to try.")
+    bench.add_argument("--n", type=int, default=DEFAULT_PARAMS["n"])
+    bench.add_argument("--r", type=int, default=DEFAULT_PARAMS["r"])
+    bench.add_argument("--p", type=int, default=DEFAULT_PARAMS["p"])
+    args = parser.parse_args()
+
+    params = {"n": args.n, "r": args.r, "p": args.p}
+    start = time.perf_counter()
+    for _ in range(args.logins):
+        hmac.compare_digest(legacy_hash("Bench-password-1"), legacy_hash("Bench-password-1"))
+    legacy_ms = (time.perf_counter() - start) * 1000 / args.logins
+    print(f"legacy sha256: {legacy_ms:.3f} ms per login")
+    print(f"scrypt n={args.n} r={args.r} p={args.p}, {args.logins} logins from {args.concurrency} sessions (cpus: {os.cpu_count()})")
+    for workers in args.workers:
+        result = _bench(args.logins, args.concurrency, workers, params)
+        print(f"  workers={workers:<3} {result['logins_per_s']:7.1f} logins/s  "
+              f"p50 {result['p50_ms']:7.1f} ms  p95 {result['p95_ms']:7.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
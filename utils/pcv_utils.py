@@ -1,185 +1,77 @@
 import streamlit as st
 import pandas as pd
-from sqlalchemy import text
+from utils import audit, delta_cache, shared_cache, snapshot_cache
+from utils.queries import execute
+from utils.metrics import query_helper
 
-@st.cache_data(ttl=30, show_spinner=False)  # Cache for 30 seconds only
+PCV_LIST_COLUMNS = ["pcv_id", "project_key", "project_name", "division", "pcv_score", "assessment_date", "updated_at"]
+MAX_TREND_POINTS = 200
+
+@query_helper
 def get_pcv_data(project_filter="All", division_filter="All", limit=50):
-    """Get PCV assessment data with filters."""
+    """Get PCV assessment data with filters.
+
+    Reads the incrementally refreshed copies of fact_pcv_metrics and dim_project, so only
+    rows changed since the last call are fetched from the database.
+    """
     try:
-        conn = st.connection("neon", type="sql")
-        
-        # Check if division column exists first
-        check_column_query = """
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name = 'fact_pcv_metrics' 
-            AND column_name = 'division'
-        """
-        
-        column_check = conn.query(check_column_query)
-        has_division = not column_check.empty
-        
-        if has_division:
-            query = """
-                SELECT 
-                    fm.pcv_id,
-                    fm.project_key,
-                    pi.project_name,
-                    COALESCE(fm.division, 'Division 1') as division,
-                    fm.pcv_score,
-                    fm.assessment_date,
-                    fm.updated_at
-                FROM fact_pcv_metrics fm
-                JOIN dim_project pi ON fm.project_key = pi.project_key
-                WHERE 1=1
-            """
-        else:
-            query = """
-                SELECT 
-                    fm.pcv_id,
-                    fm.project_key,
-                    pi.project_name,
-                    'Division 1' as division,
-                    fm.pcv_score,
-                    fm.assessment_date,
-                    fm.updated_at
-                FROM fact_pcv_metrics fm
-                JOIN dim_project pi ON fm.project_key = pi.project_key
-                WHERE 1=1
-            """
-        
-        params = {"limit": limit}
-        
+        pcv = delta_cache.get_frame("fact_pcv_metrics")
+        projects = delta_cache.get_frame("dim_project")[["project_key", "project_name"]]
+
         if project_filter != "All":
-            query += " AND fm.project_key = :project_filter"
-            params["project_filter"] = project_filter
-            
-        if division_filter != "All" and has_division:
-            query += " AND COALESCE(fm.division, 'Division 1') = :division_filter"
-            params["division_filter"] = division_filter
-        
-        query += " ORDER BY fm.assessment_date DESC, fm.updated_at DESC LIMIT :limit"
-        
-        return conn.query(query, params=params)
+            pcv = pcv[pcv["project_key"] == project_filter]
+        if division_filter != "All":
+            pcv = pcv[pcv["division"] == division_filter]
+
+        df = pcv.merge(projects, on="project_key")
+        df = df.sort_values(["assessment_date", "updated_at"], ascending=False).head(limit)
+        return df[PCV_LIST_COLUMNS].reset_index(drop=True)
     
     except Exception as e:
         st.error(f"Error loading PCV data: {e}")
         return pd.DataFrame()
 
 @st.cache_data(ttl=60, show_spinner=False)  # Cache for 1 minute only
+@query_helper
 def get_active_projects():
     """Get active projects with their current sprints."""
     try:
-        conn = st.connection("neon", type="sql")
-        query = """
-            SELECT DISTINCT 
-                project_key,
-                project_name
-            FROM dim_project
-            WHERE status = 'Active'
-            ORDER BY project_key
-        """
-        return conn.query(query)
+        return shared_cache.fetch("projects_active")
     except Exception as e:
         st.error(f"Error loading projects: {e}")
         return pd.DataFrame()
 
 def clear_pcv_cache():
     """Clear all PCV-related cached data."""
-    get_pcv_data.clear()
     get_active_projects.clear()
     get_recent_assessments.clear()
     get_pcv_stats_by_division.clear()
-    # Clear all Streamlit cache
-    st.cache_data.clear()
-    st.cache_resource.clear()
 
+@query_helper
 def create_pcv_assessment(project_key, division, pcv_score, assessment_date):
     """Create new PCV assessment - project-based only."""
     try:
         conn = st.connection("neon", type="sql")
         
-        # Check if division column exists
-        check_column_query = """
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name = 'fact_pcv_metrics' 
-            AND column_name = 'division'
-        """
-        
-        column_check = conn.query(check_column_query)
-        has_division = not column_check.empty
-        
         with conn.session as session:
-            if has_division:
-                # Check for existing assessment
-                existing_query = """
-                    SELECT pcv_id FROM fact_pcv_metrics 
-                    WHERE project_key = :project_key 
-                    AND COALESCE(division, 'Division 1') = :division
-                    AND assessment_date = :assessment_date
-                """
-                
-                existing = session.execute(
-                    text(existing_query),
-                    {
-                        "project_key": project_key,
-                        "division": division,
-                        "assessment_date": assessment_date
-                    }
-                ).fetchone()
-                
-                if existing:
-                    return False, f"Assessment already exists for {project_key} - {division} on {assessment_date}"
-                
-                # Insert with division
-                result = session.execute(
-                    text("""
-                        INSERT INTO fact_pcv_metrics 
-                        (project_key, division, pcv_score, assessment_date)
-                        VALUES (:project_key, :division, :pcv_score, :assessment_date)
-                        RETURNING pcv_id
-                    """),
-                    {
-                        "project_key": project_key,
-                        "division": division,
-                        "pcv_score": pcv_score,
-                        "assessment_date": assessment_date
-                    }
-                )
-            else:
-                # Fallback without division column
-                existing = session.execute(
-                    text("""
-                        SELECT pcv_id FROM fact_pcv_metrics 
-                        WHERE project_key = :project_key 
-                        AND assessment_date = :assessment_date
-                    """),
-                    {
-                        "project_key": project_key,
-                        "assessment_date": assessment_date
-                    }
-                ).fetchone()
-                
-                if existing:
-                    return False, f"Assessment already exists for {project_key} on {assessment_date}"
-                
-                result = session.execute(
-                    text("""
-                        INSERT INTO fact_pcv_metrics 
-                        (project_key, pcv_score, assessment_date)
-                        VALUES (:project_key, :pcv_score, :assessment_date)
-                        RETURNING pcv_id
-                    """),
-                    {
-                        "project_key": project_key,
-                        "pcv_score": pcv_score,
-                        "assessment_date": assessment_date
-                    }
-                )
+            # The unique index on (project_key, division, assessment_date) rejects duplicates
+            result = execute(
+                session, "pcv_insert",
+                project_key=project_key,
+                division=division,
+                pcv_score=pcv_score,
+                assessment_date=assessment_date
+            ).fetchone()
             
-            new_id = result.fetchone()[0]
+            if result is None:
+                return False, f"Assessment already exists for {project_key} - {division} on {assessment_date}"
+            
+            new_id = result[0]
             session.commit()
+            audit.record("fact_pcv_metrics", new_id, "insert", after={
+                "project_key": project_key, "division": division,
+                "pcv_score": pcv_score, "assessment_date": assessment_date
+            })
             
             # Clear cache after successful insert
             clear_pcv_cache()
@@ -189,61 +81,123 @@ def create_pcv_assessment(project_key, division, pcv_score, assessment_date):
     except Exception as e:
         return False, f"Database error: {str(e)}"
 
+def read_pcv_assessment_file(uploaded_file):
+    """Read a CSV or Excel file of PCV assessments into a normalized DataFrame.
+
+    The file needs the columns ``project_key``, ``pcv_score`` and ``assessment_date``;
+    ``division`` is optional and defaults to 'Division 1'.
+
+    Args:
+        uploaded_file: A file-like object (e.g. from ``st.file_uploader``) with a ``name``.
+
+    Returns:
+        pd.DataFrame: Columns project_key, division, pcv_score, assessment_date.
+    """
+    if uploaded_file.name.lower().endswith(".csv"):
+        df = pd.read_csv(uploaded_file)
+    else:
+        df = pd.read_excel(uploaded_file)
+
+    df.columns = df.columns.str.strip().str.lower().str.replace(" ", "_")
+    missing = {"project_key", "pcv_score", "assessment_date"} - set(df.columns)
+    if missing:
+        raise ValueError(f"Missing required columns: {', '.join(sorted(missing))}")
+    if "division" not in df.columns:
+        df["division"] = "Division 1"
+
+    df = df[["project_key", "division", "pcv_score", "assessment_date"]].copy()
+    df["project_key"] = df["project_key"].astype(str).str.strip()
+    df["division"] = df["division"].fillna("Division 1").astype(str).str.strip()
+    df["pcv_score"] = pd.to_numeric(df["pcv_score"], errors="coerce")
+    df["assessment_date"] = pd.to_datetime(df["assessment_date"], errors="coerce").dt.date
+    return df.dropna(subset=["project_key", "pcv_score", "assessment_date"])
+
+@query_helper
+def bulk_create_pcv_assessments(df):
+    """Insert many PCV assessments with a single set-based statement.
+
+    Rows that collide with an existing assessment (or with an earlier row of the same
+    file) on ``(project_key, division, assessment_date)`` are skipped by
+    ``ON CONFLICT DO NOTHING`` and reported back as duplicates.
+
+    Args:
+        df (pd.DataFrame): Output of ``read_pcv_assessment_file``.
+
+    Returns:
+        tuple[bool, pd.DataFrame | str]: On success, the input rows with an added
+        ``result`` column ('inserted' or 'duplicate') and ``pcv_id`` for inserted rows.
+        On failure, an error message.
+    """
+    if df.empty:
+        return False, "No valid assessments found in file"
+
+    keys = ["project_key", "division", "assessment_date"]
+    try:
+        conn = st.connection("neon", type="sql")
+        with conn.session as session:
+            inserted = execute(
+                session, "pcv_bulk_insert",
+                project_keys=df["project_key"].tolist(),
+                divisions=df["division"].tolist(),
+                pcv_scores=df["pcv_score"].tolist(),
+                assessment_dates=df["assessment_date"].tolist(),
+            ).fetchall()
+            session.commit()
+    except Exception as e:
+        return False, f"Database error: {str(e)}"
+
+    inserted_df = pd.DataFrame(inserted, columns=["pcv_id"] + keys)
+    # Only the first occurrence of a key within the file can have been inserted.
+    report = df.copy()
+    report["_first"] = ~report.duplicated(subset=keys)
+    report = report.merge(inserted_df, on=keys, how="left")
+    report.loc[~report["_first"], "pcv_id"] = None
+    report["result"] = report["pcv_id"].notna().map({True: "inserted", False: "duplicate"})
+    report = report.drop(columns="_first")
+
+    if not inserted_df.empty:
+        for row in report[report["result"] == "inserted"].itertuples(index=False):
+            audit.record("fact_pcv_metrics", int(row.pcv_id), "insert", after={
+                "project_key": row.project_key, "division": row.division,
+                "pcv_score": row.pcv_score, "assessment_date": row.assessment_date
+            })
+        clear_pcv_cache()
+
+    return True, report
+
+@query_helper
 def update_pcv_assessment(pcv_id, pcv_score, assessment_date, division=None):
     """Update existing PCV assessment including division."""
     try:
         conn = st.connection("neon", type="sql")
         
-        # Check if division column exists
-        check_column_query = """
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name = 'fact_pcv_metrics' 
-            AND column_name = 'division'
-        """
-        
-        column_check = conn.query(check_column_query)
-        has_division = not column_check.empty
-        
         with conn.session as session:
-            if has_division and division is not None:
-                # Update with division column
-                session.execute(
-                    text("""
-                        UPDATE fact_pcv_metrics 
-                        SET pcv_score = :pcv_score,
-                            assessment_date = :assessment_date,
-                            division = :division,
-                            updated_at = CURRENT_TIMESTAMP
-                        WHERE pcv_id = :pcv_id
-                    """),
-                    {
-                        "pcv_id": pcv_id,
-                        "pcv_score": pcv_score,
-                        "assessment_date": assessment_date,
-                        "division": division
-                    }
+            if division is not None:
+                result = execute(
+                    session, "pcv_update_with_division",
+                    pcv_id=pcv_id,
+                    pcv_score=pcv_score,
+                    assessment_date=assessment_date,
+                    division=division
                 )
                 success_msg = f"Assessment updated successfully! Division: {division}"
             else:
-                # Update without division column (fallback)
-                session.execute(
-                    text("""
-                        UPDATE fact_pcv_metrics 
-                        SET pcv_score = :pcv_score,
-                            assessment_date = :assessment_date,
-                            updated_at = CURRENT_TIMESTAMP
-                        WHERE pcv_id = :pcv_id
-                    """),
-                    {
-                        "pcv_id": pcv_id,
-                        "pcv_score": pcv_score,
-                        "assessment_date": assessment_date
-                    }
+                result = execute(
+                    session, "pcv_update",
+                    pcv_id=pcv_id,
+                    pcv_score=pcv_score,
+                    assessment_date=assessment_date
                 )
-                success_msg = "Assessment updated successfully! (Note: Division not updated - column doesn't exist)"
-            
+                success_msg = "Assessment updated successfully!"
+            before = result.mappings().first()
+            if before is None:
+                return False, "Assessment not found"
+
             session.commit()
+            after = {"pcv_score": pcv_score, "assessment_date": assessment_date}
+            if division is not None:
+                after["division"] = division
+            audit.record("fact_pcv_metrics", pcv_id, "update", before=dict(before), after=after)
             
             # Clear cache after successful update
             clear_pcv_cache()
@@ -253,21 +207,20 @@ def update_pcv_assessment(pcv_id, pcv_score, assessment_date, division=None):
     except Exception as e:
         return False, f"Update failed: {str(e)}"
 
+@query_helper
 def delete_pcv_assessment(pcv_id):
     """Delete PCV assessment."""
     try:
         conn = st.connection("neon", type="sql")
         
         with conn.session as session:
-            result = session.execute(
-                text("DELETE FROM fact_pcv_metrics WHERE pcv_id = :pcv_id"),
-                {"pcv_id": pcv_id}
-            )
-            
-            if result.rowcount == 0:
+            before = execute(session, "pcv_delete", pcv_id=pcv_id).mappings().first()
+
+            if before is None:
                 return False, "Assessment not found"
-            
+
             session.commit()
+            audit.record("fact_pcv_metrics", pcv_id, "delete", before=dict(before))
             
             # Clear cache after successful deletion
             clear_pcv_cache()
@@ -278,85 +231,39 @@ def delete_pcv_assessment(pcv_id):
         return False, str(e)
 
 @st.cache_data(ttl=30, show_spinner=False)
+@query_helper
 def get_recent_assessments(project_key, limit=5):
     """Get recent assessments for a project."""
     try:
-        conn = st.connection("neon", type="sql")
-        
-        # Check if division column exists
-        check_column_query = """
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name = 'fact_pcv_metrics' 
-            AND column_name = 'division'
-        """
-        
-        column_check = conn.query(check_column_query)
-        has_division = not column_check.empty
-        
-        if has_division:
-            query = """
-                SELECT pcv_id, COALESCE(division, 'Division 1') as division, pcv_score, assessment_date
-                FROM fact_pcv_metrics 
-                WHERE project_key = :project_key 
-                ORDER BY assessment_date DESC, pcv_id DESC 
-                LIMIT :limit
-            """
-        else:
-            query = """
-                SELECT pcv_id, 'Division 1' as division, pcv_score, assessment_date
-                FROM fact_pcv_metrics 
-                WHERE project_key = :project_key 
-                ORDER BY assessment_date DESC, pcv_id DESC 
-                LIMIT :limit
-            """
-        
-        return conn.query(query, params={"project_key": project_key, "limit": limit})
+        return shared_cache.fetch("pcv_recent", project_key=project_key, limit=limit)
     except Exception as e:
         st.error(f"Error loading recent assessments: {e}")
         return pd.DataFrame()
 
 @st.cache_data(ttl=60, show_spinner=False)
+@query_helper
 def get_pcv_stats_by_division():
     """Get PCV statistics grouped by division."""
     try:
-        conn = st.connection("neon", type="sql")
-        
-        # Check if division column exists
-        check_column_query = """
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name = 'fact_pcv_metrics' 
-            AND column_name = 'division'
-        """
-        
-        column_check = conn.query(check_column_query)
-        has_division = not column_check.empty
-        
-        if has_division:
-            query = """
-                SELECT 
-                    COALESCE(division, 'Division 1') as division,
-                    COUNT(*) as total_assessments,
-                    ROUND(AVG(pcv_score), 2) as avg_score,
-                    COUNT(DISTINCT project_key) as unique_projects,
-                    MAX(assessment_date) as latest_assessment
-                FROM fact_pcv_metrics
-                GROUP BY COALESCE(division, 'Division 1')
-                ORDER BY division
-            """
-        else:
-            query = """
-                SELECT 
-                    'Division 1' as division,
-                    COUNT(*) as total_assessments,
-                    ROUND(AVG(pcv_score), 2) as avg_score,
-                    COUNT(DISTINCT project_key) as unique_projects,
-                    MAX(assessment_date) as latest_assessment
-                FROM fact_pcv_metrics
-            """
-        
-        return conn.query(query)
+        return shared_cache.fetch("pcv_stats_by_division")
     except Exception as e:
         st.error(f"Error loading division stats: {e}")
         return pd.DataFrame()
+
+
+@query_helper
+def get_pcv_trend(project_key, max_points=MAX_TREND_POINTS):
+    """Score history of a project with rolling averages and change since the previous assessment.
+
+    Computed in SQL over the full history and cached per project until fact_pcv_metrics
+    changes. Histories longer than ``max_points`` per division are downsampled in the query.
+
+    Returns:
+        pd.DataFrame: One row per (division, kept assessment), oldest first; ``assessments``
+        is the division's total before downsampling.
+    """
+    try:
+        return snapshot_cache.get_snapshot("pcv_trend", project_key=project_key, max_points=max_points)
+    except Exception as e:
+        st.error(f"Error loading PCV trend: {e}")
+        return pd.DataFrame()
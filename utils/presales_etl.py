@@ -0,0 +1,396 @@
+"""Presales deal import: read the workbooks, validate, derive status and period date, load.
+
+The steps are plain functions so they can run in the Streamlit script or in worker
+processes started by ``utils.jobs``. An import may span several workbooks and sheets:
+each sheet is parsed and transformed on its own (in parallel), the frames are merged
+and de-duplicated on ``deal_name``, and the result is loaded with one bulk merge.
+
+CSV exports of the tracker are read with pyarrow's CSV reader instead of openpyxl,
+which is much faster; both paths feed the same transform and load. Compare them with:
+
+    python -m utils.presales_etl "data_processing/[Pre_Sales] Q3.csv"
+"""
+import argparse
+import csv
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+except ImportError:  # CSV import is optional
+    pa = None
+    pa_csv = None
+
+from utils.presales_utils import refresh_deals_cube
+from utils.queries import execute
+from utils.metrics import query_helper
+
+SHEET_NAME = "Official Deal"
+
+COLUMN_MAP = {
+    'Deal Name': 'deal_name', 'Project Type': 'project_type', 'Deal Amount': 'deal_amount',
+    'Deal Received(MM/DD/YY)': 'deal_received_date', 'Proposal Sent': 'proposal_sent_date',
+    'Pending': 'pending_date', 'Lost/Canceled': 'lost_date', 'Won': 'won_date',
+    'Division': 'division', 'Division 1 - %': 'division_1_pct', 'Division 2 - %': 'division_2_pct',
+    'Reasons': 'reasons',
+}
+
+# Headers that differ between the CSV export and the workbook.
+CSV_HEADER_ALIASES = {'Reasons (Pending/Lost)': 'Reasons'}
+
+DATE_COLUMNS = ['deal_received_date', 'proposal_sent_date', 'pending_date', 'won_date', 'lost_date']
+
+# Latest pipeline stage a deal reached: the first of these dates that is set.
+STATUS_DATE_COLUMNS = {
+    'won_date': 'Won',
+    'lost_date': 'Lost',
+    'pending_date': 'Pending',
+    'proposal_sent_date': 'Proposal Sent',
+}
+
+# Candidates for a deal's period date, in order of preference on ties.
+PERIOD_DATE_COLUMNS = ['won_date', 'pending_date', 'deal_received_date', 'lost_date']
+
+# Allowed gap between 100% and the sum of the two division percentages.
+PCT_TOLERANCE = 0.01
+
+
+def is_csv(source):
+    """True for a path to a .csv file."""
+    return isinstance(source, (str, os.PathLike)) and os.fspath(source).lower().endswith('.csv')
+
+
+def list_deal_sheets(source):
+    """Names of the sheets in a workbook; non-deal sheets are skipped when parsed.
+
+    A CSV file has a single unnamed sheet, returned as ``None``.
+    """
+    if is_csv(source):
+        return [None]
+    return pd.ExcelFile(source).sheet_names
+
+
+def read_deals_workbook(source, sheet_name=SHEET_NAME):
+    """Read one deal sheet and rename its columns.
+
+    Args:
+        source: Path or file-like object of the .xlsx workbook.
+        sheet_name (str): Sheet to read; the header is on its second row.
+
+    Returns:
+        pd.DataFrame: One row per sheet row with the ``COLUMN_MAP`` columns as read
+        (unvalidated), indexed by spreadsheet row number, or an empty frame if the
+        sheet is not a deal sheet.
+    """
+    empty = pd.DataFrame(columns=list(COLUMN_MAP.values()))
+    try:
+        df = pd.read_excel(source, sheet_name=sheet_name, header=1)
+    except ValueError:  # fewer than two rows: notes, pivots, etc.
+        return empty
+    df.columns = df.columns.astype(str).str.strip()
+    if not set(COLUMN_MAP) <= set(df.columns):
+        return empty
+    df.index = df.index + 3  # spreadsheet row number: title row, header, then data
+    return df[list(COLUMN_MAP)].rename(columns=COLUMN_MAP)
+
+
+def _read_arrow_csv(source, names, on_invalid):
+    """One pyarrow pass over ``source`` with the given column names, all read as text.
+
+    Single-threaded so invalid rows are reported with their record number.
+    """
+    wanted = [name for name in names if name in COLUMN_MAP]
+    return pa_csv.read_csv(
+        source,
+        read_options=pa_csv.ReadOptions(skip_rows=1, column_names=names, use_threads=False),
+        parse_options=pa_csv.ParseOptions(
+            invalid_row_handler=on_invalid, newlines_in_values=True, ignore_empty_lines=False
+        ),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=wanted, column_types={name: pa.string() for name in wanted},
+            strings_can_be_null=True,
+        ),
+    )
+
+
+def _read_ragged_csv(source, names):
+    """Read a CSV whose rows may have more or fewer cells than the header.
+
+    Tracker exports carry stray trailing cells on most rows, which pyarrow rejects.
+    The first pass records the widest row; if it is wider than the header the file is
+    read again with padding columns. Rows narrower than that are rare (blank spacer
+    rows) and are parsed with the ``csv`` module, then put back in file order so the
+    last copy of a repeated deal still wins.
+    """
+    widest = len(names)
+    short_rows = {}
+
+    def note_row(row):
+        nonlocal widest
+        if row.actual_columns > row.expected_columns:
+            widest = max(widest, row.actual_columns)
+        else:
+            short_rows[row.number] = row.text
+        return 'skip'
+
+    table = _read_arrow_csv(source, names, note_row)
+    if widest > len(names):
+        names = names + [f"_extra_{i}" for i in range(len(names), widest)]
+        short_rows.clear()
+        table = _read_arrow_csv(source, names, note_row)
+    if not short_rows:
+        return table
+
+    # Record numbers count the header as 1; parsed rows fill the numbers not skipped.
+    total = table.num_rows + len(short_rows)
+    order = [n for n in range(2, total + 2) if n not in short_rows]
+    wanted = {name: i for i, name in enumerate(names) if name in COLUMN_MAP}
+    cells = [row + [''] * (len(names) - len(row)) for row in csv.reader(short_rows.values())]
+    extra = pa.table({
+        name: pa.array([cell[i] or None for cell in cells], pa.string()) for name, i in wanted.items()
+    })
+    table = pa.concat_tables([
+        table.append_column('_row', pa.array(order, pa.int64())),
+        extra.select(table.column_names).append_column('_row', pa.array(list(short_rows), pa.int64())),
+    ])
+    return table.sort_by('_row').drop(['_row'])
+
+
+def read_deals_csv(source):
+    """Read a CSV export of the deal tracker and rename its columns.
+
+    The header is on the first row. Names are stripped (``'Project Type '``) and
+    aliased so they match ``COLUMN_MAP``. Every value is read as text; amounts like
+    ``"$59,379.00"`` and percentages like ``"80%"`` are parsed by ``validate_deals``,
+    as for workbooks.
+
+    Args:
+        source: Path of the .csv file.
+
+    Returns:
+        pd.DataFrame: One row per record with the ``COLUMN_MAP`` columns, indexed by
+        record number (header = 1), or an empty frame if the file does not have the
+        deal columns.
+    """
+    if pa_csv is None:
+        raise RuntimeError("CSV import needs pyarrow (pip install pyarrow)")
+
+    with open(source, newline='', encoding='utf-8-sig') as f:
+        header = next(csv.reader(f), [])
+    names = [CSV_HEADER_ALIASES.get(h.strip(), h.strip()) for h in header]
+    if not set(COLUMN_MAP) <= set(names):
+        return pd.DataFrame(columns=list(COLUMN_MAP.values()))
+    # Unused columns may repeat a name (several blank headers); only mapped ones must be unique.
+    names = [name if name in COLUMN_MAP else f"_col_{i}" for i, name in enumerate(names)]
+
+    df = _read_ragged_csv(source, names).to_pandas()
+    df.index = df.index + 2
+    return df[list(COLUMN_MAP)].rename(columns=COLUMN_MAP)
+
+
+def _blank(values):
+    """Missing or whitespace-only cells."""
+    return values.isna() | values.astype(str).str.strip().eq('')
+
+
+def _to_number(values):
+    """Amount/percentage cells to float; '$1,200.50' -> 1200.5, '80%' -> 0.8, 0.8 -> 0.8.
+
+    Returns:
+        tuple[pd.Series, pd.Series]: Parsed values (NaN when blank or malformed) and
+        the mask of non-blank cells that could not be parsed.
+    """
+    blank = _blank(values)
+    text = values.astype(str).str.replace(r'[\$,\s]', '', regex=True)
+    percent = text.str.endswith('%')
+    number = pd.to_numeric(text.str.rstrip('%').where(~blank), errors='coerce')
+    number = number.where(~percent, number / 100)
+    return number, ~blank & number.isna()
+
+
+def _to_datetime(values):
+    """Date cells to Timestamps with a vectorized parse; only leftovers are parsed one by one.
+
+    Returns:
+        tuple[pd.Series, pd.Series]: Parsed values and the mask of unparseable cells.
+    """
+    blank = _blank(values)
+    cells = values.where(~blank)
+    parsed = pd.to_datetime(cells, errors='coerce')
+    retry = parsed.isna() & ~blank
+    if retry.any():  # a sheet mixing date styles (e.g. '3/14/2025' and '2025-03-14')
+        parsed[retry] = pd.to_datetime(cells[retry], errors='coerce', format='mixed')
+    return parsed, ~blank & parsed.isna()
+
+
+def validate_deals(df):
+    """Check a raw deal frame column by column and split it into accepted and rejected rows.
+
+    Rows with no mapped value at all (spacer rows) are dropped. A row is rejected when:
+
+    - the deal name is missing;
+    - the amount is not a number, or is negative;
+    - a date cell is not a date;
+    - a division percentage is not a number, or the two do not add up to 100%.
+
+    Args:
+        df (pd.DataFrame): Output of ``read_deals_workbook`` / ``read_deals_csv``.
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame]: ``accepted`` with typed columns (floats,
+        Timestamps, stripped names) ready for ``transform_deals``, and ``rejected``
+        with the cells as read plus ``row_number`` and ``reject_reasons`` ('; '-joined).
+    """
+    df = df[~df.apply(_blank).all(axis=1)]
+    typed = df.copy()
+    checks = {'missing deal name': _blank(df['deal_name'])}
+    typed['deal_name'] = df['deal_name'].astype(str).str.strip()
+
+    typed['deal_amount'], checks['bad deal amount'] = _to_number(df['deal_amount'])
+    checks['negative deal amount'] = typed['deal_amount'] < 0
+
+    for col in DATE_COLUMNS:
+        typed[col], checks[f'bad {col}'] = _to_datetime(df[col])
+
+    pct_1, checks['bad division_1_pct'] = _to_number(df['division_1_pct'])
+    pct_2, checks['bad division_2_pct'] = _to_number(df['division_2_pct'])
+    split_given = pct_1.notna() | pct_2.notna()
+    checks['division % not 100'] = split_given & ((pct_1.fillna(0) + pct_2.fillna(0)) - 1).abs().gt(PCT_TOLERANCE)
+    typed['division_1_pct'], typed['division_2_pct'] = pct_1, pct_2
+
+    reasons = pd.Series('', index=df.index)
+    for label, failed in checks.items():
+        reasons = reasons.where(~failed, reasons + label + '; ')
+    bad = reasons.ne('')
+
+    rejected = df[bad].astype(object).where(df[bad].notna(), None)
+    rejected = rejected.assign(reject_reasons=reasons[bad].str.rstrip('; ')).rename_axis('row_number').reset_index()
+    return typed[~bad].reset_index(drop=True), rejected
+
+
+def parse_deal_sheet(source, sheet_name):
+    """Read, validate and transform one sheet. Module-level so it can run in a process pool.
+
+    Returns:
+        tuple[pd.DataFrame, pd.DataFrame]: Transformed accepted deals and the rejected
+        rows (see ``validate_deals``).
+    """
+    df = read_deals_csv(source) if is_csv(source) else read_deals_workbook(source, sheet_name)
+    accepted, rejected = validate_deals(df)
+    return (transform_deals(accepted) if not accepted.empty else accepted), rejected
+
+
+def merge_deal_frames(frames):
+    """Concatenate parsed sheets and keep one row per deal.
+
+    Deal names are compared after trimming whitespace; when a deal appears more than
+    once, the copy from the later file/sheet wins (later quarters supersede earlier ones).
+    """
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame(columns=list(COLUMN_MAP.values()))
+    df = pd.concat(frames, ignore_index=True)
+    df['deal_name'] = df['deal_name'].astype(str).str.strip()
+    return df.drop_duplicates(subset=['deal_name'], keep='last').reset_index(drop=True)
+
+
+def transform_deals(df):
+    """Add status and the period date key to validated deals.
+
+    The period is the deal date closest to today; it is stored as a ``dim_date``
+    key (yyyymmdd) and the cube takes year/quarter/month and ISO year/week from ``dim_date``.
+    """
+    df = df.copy()
+    df['status'] = np.select(
+        [df[column].notna() for column in STATUS_DATE_COLUMNS],
+        list(STATUS_DATE_COLUMNS.values()),
+        default='Preparing Proposal',
+    )
+
+    # Distance of each candidate date to now; missing dates never win.
+    dates = df[PERIOD_DATE_COLUMNS]
+    seconds = dates.sub(pd.Timestamp.now()).abs().apply(lambda col: col.dt.total_seconds())
+    seconds = seconds.fillna(float('inf')).to_numpy()
+    closest = pd.Series(dates.to_numpy()[np.arange(len(df)), seconds.argmin(axis=1)], index=df.index)
+    closest = pd.to_datetime(closest.where(np.isfinite(seconds.min(axis=1))))
+    df['period_date_key'] = (closest.dt.year * 10000 + closest.dt.month * 100 + closest.dt.day).astype('Int64')
+    return df
+
+
+@query_helper
+def load_deals(connection, df):
+    """Merge deals into fact_deals and rebuild the presales cube in the caller's transaction.
+
+    One ``INSERT ... ON CONFLICT (deal_name) DO UPDATE`` over unnested column arrays,
+    so ``df`` must hold each deal once (see ``merge_deal_frames``). Concurrent imports
+    are serialized on an advisory lock so two cube rebuilds never interleave.
+
+    Returns:
+        int: Number of deals merged.
+    """
+    execute(connection, "deals_load_lock")
+    column = lambda name: df[name].tolist()
+    text_column = lambda name: [None if pd.isna(v) else str(v) for v in df[name]]
+    execute(
+        connection, "deals_bulk_merge",
+        deal_names=column('deal_name'), project_types=text_column('project_type'),
+        deal_amounts=column('deal_amount'), deal_received_dates=column('deal_received_date'),
+        proposal_sent_dates=column('proposal_sent_date'), pending_dates=column('pending_date'),
+        lost_dates=column('lost_date'), won_dates=column('won_date'), divisions=text_column('division'),
+        division_1_pcts=text_column('division_1_pct'), division_2_pcts=text_column('division_2_pct'),
+        reasons=text_column('reasons'), statuses=column('status'), period_date_keys=column('period_date_key'),
+    )
+    refresh_deals_cube(connection)
+    return len(df)
+
+
+def _time(label, fn, *args, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    df = result[0] if isinstance(result, tuple) else result
+    print(f"{label:<32} {best * 1000:9.1f} ms  {len(df)} rows")
+    return result
+
+
+def main(argv=None):
+    """Time the CSV and workbook paths on the same data (nothing is loaded)."""
+    parser = argparse.ArgumentParser(description="Compare CSV and xlsx presales parsing.")
+    parser.add_argument("csv_path", help="CSV export of the deal tracker")
+    parser.add_argument("--copies", type=int, default=1, help="Repeat the rows to get a larger file")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args(argv)
+
+    with open(args.csv_path, newline='', encoding='utf-8-sig') as f:
+        header, *rows = list(csv.reader(f))
+    rows = rows * args.copies
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path = os.path.join(tmp, "deals.csv")
+        xlsx_path = os.path.join(tmp, "deals.xlsx")
+        with open(csv_path, "w", newline='', encoding='utf-8') as f:
+            csv.writer(f).writerows([header, *rows])  # keeps the ragged rows as exported
+        # Same layout as the tracker workbook: a title row above the header.
+        sheet = pd.DataFrame([(row + [''] * len(header))[:len(header)] for row in rows], columns=header)
+        sheet = sheet.replace('', None)
+        sheet.columns = [CSV_HEADER_ALIASES.get(c.strip(), c) for c in sheet.columns]
+        sheet.to_excel(xlsx_path, sheet_name=SHEET_NAME, startrow=1, index=False)
+
+        _time("read_deals_csv", read_deals_csv, csv_path, repeat=args.repeat)
+        _time("read_deals_workbook", read_deals_workbook, xlsx_path, repeat=args.repeat)
+        csv_df, csv_rejects = _time("csv + validate + transform", parse_deal_sheet, csv_path, None,
+                                    repeat=args.repeat)
+        xlsx_df, _ = _time("xlsx + validate + transform", parse_deal_sheet, xlsx_path, SHEET_NAME,
+                           repeat=args.repeat)
+        print(f"Rejected rows: {len(csv_rejects)}")
+        print(f"Same deal names: {csv_df['deal_name'].tolist() == xlsx_df['deal_name'].tolist()}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import streamlit as st
+import pandas as pd
+from utils.queries import run_query, execute
+from utils.metrics import query_helper
+
+# Pipeline stages in funnel order; a deal that reached a later stage also passed the earlier ones.
+FUNNEL_STAGES = {
+    "Received": ["Preparing Proposal", "Proposal Sent", "Pending", "Won", "Lost"],
+    "Proposal Sent": ["Proposal Sent", "Pending", "Won"],
+    "Pending": ["Pending", "Won"],
+    "Won": ["Won"],
+}
+
+
+@query_helper
+def refresh_deals_cube(connection):
+    """Rebuild the presales rollup cube from fact_deals.
+
+    Run this in the same transaction as the fact_deals load so readers never
+    see a cube that disagrees with the facts.
+
+    Args:
+        connection: An open SQLAlchemy connection or session; the caller commits.
+    """
+    execute(connection, "deals_cube_clear")
+    execute(connection, "deals_cube_fill")
+
+
+@st.cache_data(ttl=300, show_spinner=False)
+@query_helper
+def get_deals_cube():
+    """Read the presales rollup cube.
+
+    Returns:
+        pd.DataFrame: One row per period, division, status and project type.
+    """
+    try:
+        return run_query("deals_cube_read")
+    except Exception as e:
+        st.error(f"Error loading presales cube: {e}")
+        return pd.DataFrame()
+
+
+def funnel_from_cube(cube_df):
+    """Collapse cube rows into pipeline funnel stages.
+
+    Args:
+        cube_df (pd.DataFrame): Rows of ``agg_deals_cube``.
+
+    Returns:
+        pd.DataFrame: Columns stage, deal_count, total_amount in funnel order.
+    """
+    rows = []
+    for stage, statuses in FUNNEL_STAGES.items():
+        reached = cube_df[cube_df["status"].isin(statuses)]
+        rows.append({
+            "stage": stage,
+            "deal_count": int(reached["deal_count"].sum()),
+            "total_amount": float(reached["total_amount"].sum()),
+        })
+    return pd.DataFrame(rows)
@@ -0,0 +1,134 @@
+"""Workflow-weighted progress per project and sprint.
+
+Each project follows the workflow named by ``dim_project.scope``. A sprint counts as
+done by the ``done_ratio`` its ``dim_sprint.status`` has in that workflow (0 when the
+status is not part of it), and a project's progress is the capacity-weighted average
+of its sprints. The aggregation runs in SQL and the results are stored in
+``agg_sprint_progress`` and ``agg_project_progress``, so pages only read them.
+
+Rows are refreshed per project, in the same transaction as the write that affects
+them: saving a workflow's statuses recomputes only the projects that follow that
+workflow. Loads of ``dim_sprint`` are picked up by triggers (migration 0017). To
+recompute everything, e.g. after disabling the triggers for a load:
+
+    python -m utils.progress rebuild
+"""
+import argparse
+
+import streamlit as st
+import pandas as pd
+
+from utils.queries import execute, fetch_frame, run_query
+from utils.metrics import query_helper
+
+
+@query_helper
+def refresh_progress(session, project_keys):
+    """Recompute the stored progress of some projects.
+
+    Call this in the same transaction as any write to a project's workflow, sprints
+    or capacities so the stored progress never drifts from the rows it summarizes.
+
+    Args:
+        session: An open SQLAlchemy session; the caller commits.
+        project_keys (list[str]): The projects to recompute (an empty list does nothing).
+    """
+    project_keys = list(project_keys)
+    if not project_keys:
+        return
+    _refresh(session, project_keys)
+
+
+@query_helper
+def rebuild_progress(session):
+    """Recompute the stored progress of every project.
+
+    Args:
+        session: An open SQLAlchemy session; the caller commits.
+    """
+    _refresh(session, None)
+
+
+def _refresh(session, project_keys):
+    execute(session, "progress_refresh", project_keys=project_keys)
+
+
+@query_helper
+def workflow_projects(session, workflow_name):
+    """Keys of the active projects that follow a workflow.
+
+    Args:
+        session: An open SQLAlchemy session.
+        workflow_name (str): The workflow, as stored in ``dim_project.scope``.
+
+    Returns:
+        list[str]: Project keys.
+    """
+    return fetch_frame(session, "progress_workflow_projects", workflow_name=workflow_name)["project_key"].tolist()
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+@query_helper
+def get_project_progress(project_keys=None):
+    """Read weighted progress per project.
+
+    Args:
+        project_keys (tuple[str] | None): Restrict to these projects; None means all.
+
+    Returns:
+        pd.DataFrame: One row per project: workflow, sprint counts, total and done
+        capacity, and ``done_ratio`` (0 to 1).
+    """
+    try:
+        return run_query(
+            "progress_projects_read",
+            project_keys=list(project_keys) if project_keys is not None else None
+        )
+    except Exception as e:
+        st.error(f"Error loading progress: {e}")
+        return pd.DataFrame()
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+@query_helper
+def get_sprint_progress(project_key):
+    """Read the done ratio of each sprint of one project.
+
+    Returns:
+        pd.DataFrame: One row per sprint: status, ``done_ratio`` (NULL when the status
+        is not in the project's workflow), capacity and done capacity.
+    """
+    try:
+        return run_query("progress_sprints_read", project_key=project_key)
+    except Exception as e:
+        st.error(f"Error loading sprint progress: {e}")
+        return pd.DataFrame()
+
+
+def clear_progress_cache():
+    """Clear the cached progress reads after a write that changes them."""
+    get_project_progress.clear()
+    get_sprint_progress.clear()
+
+
+def main():
+    from sqlalchemy.orm import Session
+    from utils.migrations import get_engine
+
+    parser = argparse.ArgumentParser(description="Workflow-weighted progress tools.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    rebuild = commands.add_parser("rebuild", help="Recompute stored progress.")
+    rebuild.add_argument("--project", nargs="+", help="Only these project keys.")
+    args = parser.parse_args()
+
+    with Session(get_engine()) as session:
+        if args.project:
+            refresh_progress(session, args.project)
+        else:
+            rebuild_progress(session)
+        session.commit()
+    print(f"Progress rebuilt for {', '.join(args.project) if args.project else 'all projects'}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,748 @@
+"""Named query catalog.
+
+Every SQL statement the app runs is declared here once, with typed parameters.
+Statements are executed as server-side prepared statements: the first use on a
+pooled connection issues ``PREPARE`` and later uses only send ``EXECUTE`` with the
+parameter values, so PostgreSQL parses and plans each statement once per connection.
+
+Usage:
+    df = run_query("pcv_recent", project_key="ABC", limit=5)
+
+    with conn.session as session:
+        execute(session, "sprint_delete", sprint_name=name, project_key=key)
+        session.commit()
+"""
+import json
+import re
+import threading
+import time
+from collections import namedtuple
+from datetime import date, datetime
+
+import streamlit as st
+import pandas as pd
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from utils import metrics
+from utils.connection_lifecycle import with_retry
+from utils.db import read_engine
+
+Query = namedtuple("Query", ["name", "sql", "params", "tables"])
+
+_PARAM_PATTERN = re.compile(r"(?<![:\w]):(\w+)")
+
+# Python-side coercion for declared PostgreSQL types (DataFrame cells are often numpy scalars).
+_COERCE = {
+    "text": str,
+    "integer": int,
+    "bigint": int,
+    "numeric": float,
+    "boolean": bool,
+    "date": lambda v: v.date() if isinstance(v, datetime) else v,
+    "timestamp": lambda v: v,
+}
+
+QUERIES = {}
+
+
+def _declare(name, sql, /, tables=(), **params):
+    """Register a statement under ``name``; ``params`` maps parameter names to PostgreSQL types.
+
+    ``tables`` lists the tables a read depends on. Reads served by ``utils.snapshot_cache``
+    or ``utils.shared_cache`` must declare them: their results are revalidated against
+    those tables' change counters.
+    """
+    if name in QUERIES:
+        raise ValueError(f"Query {name!r} declared twice")
+    used = set(_PARAM_PATTERN.findall(sql))
+    if used != set(params):
+        raise ValueError(f"Query {name!r} declares {sorted(params)} but uses {sorted(used)}")
+    missing = [t for t in tables if not re.search(rf"\b{t}\b", sql)]
+    if missing:
+        raise ValueError(f"Query {name!r} declares tables it does not mention: {', '.join(missing)}")
+    QUERIES[name] = Query(name, sql.strip(), tuple(params.items()), frozenset(tables))
+
+
+# ============================ Auth ============================
+_declare("auth_user_by_email", """
+    SELECT role, username, password FROM app_users WHERE email = :email
+""", email="text")
+# Only replaces the hash that was verified, so a concurrent password change wins.
+_declare("auth_rehash_password", """
+    UPDATE app_users SET password = :new_password WHERE email = :email AND password = :old_password
+""", new_password="text", email="text", old_password="text")
+_declare("app_session_insert", """
+    INSERT INTO app_sessions (session_id, email, expires_at) VALUES (:session_id, :email, :expires_at)
+""", session_id="text", email="text", expires_at="timestamp")
+_declare("app_session_lookup", """
+    SELECT u.email, u.username, u.role, s.expires_at
+    FROM app_sessions s
+    JOIN app_users u ON u.email = s.email
+    WHERE s.session_id = :session_id AND s.revoked_at IS NULL AND s.expires_at > NOW()
+""", session_id="text")
+_declare("app_session_revoke", """
+    UPDATE app_sessions SET revoked_at = NOW() WHERE session_id = :session_id AND revoked_at IS NULL
+""", session_id="text")
+_declare("app_sessions_revoke_user", """
+    UPDATE app_sessions SET revoked_at = NOW() WHERE email = :email AND revoked_at IS NULL
+""", email="text")
+_declare("app_sessions_purge", """
+    DELETE FROM app_sessions WHERE expires_at < :before OR revoked_at < :before
+""", before="timestamp")
+
+# ============================ Users ============================
+_declare("user_names", """
+    SELECT user_name FROM dim_user WHERE user_name IS NOT NULL
+""")
+_declare("app_users_list", """
+    SELECT email, username, role FROM app_users ORDER BY email
+""")
+_declare("app_user_exists", """
+    SELECT 1 FROM app_users WHERE email = :email
+""", email="text")
+_declare("app_user_insert", """
+    INSERT INTO app_users (email, username, password, role)
+    VALUES (:email, :username, :password, :role)
+""", email="text", username="text", password="text", role="text")
+# Updates and deletes return the account as it was (never the hash) for the audit log.
+_APP_USER_BEFORE = """
+    WITH before AS (
+        SELECT email, username, role FROM app_users WHERE email = :email FOR UPDATE
+    )
+"""
+_declare("app_user_update", _APP_USER_BEFORE + """
+    UPDATE app_users u SET username = :username, role = :role
+    FROM before WHERE u.email = before.email
+    RETURNING before.email, before.username, before.role
+""", username="text", role="text", email="text")
+_declare("app_user_update_with_password", _APP_USER_BEFORE + """
+    UPDATE app_users u SET username = :username, role = :role, password = :password
+    FROM before WHERE u.email = before.email
+    RETURNING before.email, before.username, before.role
+""", username="text", role="text", password="text", email="text")
+_declare("app_user_delete", """
+    DELETE FROM app_users WHERE email = :email
+    RETURNING email, username, role
+""", email="text")
+
+# ============================ Projects ============================
+_PROJECT_COLUMNS = """
+    project_key, project_name, total_mm, project_type, scope, status, owner,
+    start_date, end_date, created_at, updated_at
+"""
+_declare("project_rows_all", f"""
+    SELECT {_PROJECT_COLUMNS}, division, is_deleted FROM dim_project
+""")
+_declare("project_rows_changed", f"""
+    SELECT {_PROJECT_COLUMNS}, division, is_deleted FROM dim_project WHERE updated_at > :since
+""", since="timestamp")
+_declare("project_keys_by_owner", """
+    SELECT project_key FROM dim_project WHERE owner = :owner
+""", owner="text")
+_declare("projects_active", """
+    SELECT DISTINCT project_key, project_name FROM dim_project WHERE status = 'Active' ORDER BY project_key
+""", tables=("dim_project",))
+_declare("projects_brief_all", """
+    SELECT project_key, project_name, owner, is_deleted FROM dim_project
+""", tables=("dim_project",))
+_declare("projects_brief_by_owner", """
+    SELECT project_key, project_name, owner, is_deleted
+    FROM dim_project
+    WHERE owner = :owner AND is_deleted = FALSE
+""", tables=("dim_project",), owner="text")
+_declare("project_upsert", """
+    INSERT INTO dim_project (
+        project_key, project_name, total_mm, project_type, scope,
+        owner, start_date, end_date, status, is_deleted
+    )
+    VALUES (
+        :project_key, :project_name, :total_mm, :project_type, :scope,
+        :owner, :start_date, :end_date, :status, FALSE
+    )
+    ON CONFLICT (project_key) DO UPDATE
+    SET project_name = EXCLUDED.project_name,
+        total_mm = EXCLUDED.total_mm,
+        project_type = EXCLUDED.project_type,
+        scope = EXCLUDED.scope,
+        owner = EXCLUDED.owner,
+        start_date = EXCLUDED.start_date,
+        end_date = EXCLUDED.end_date,
+        status = EXCLUDED.status,
+        is_deleted = FALSE
+""", project_key="text", project_name="text", total_mm="numeric", project_type="text", scope="text",
+    owner="text", start_date="date", end_date="date", status="text")
+_declare("project_update", """
+    UPDATE dim_project
+    SET project_name = :project_name, total_mm = :total_mm,
+        project_type = :project_type, scope = :scope, owner = :owner,
+        start_date = :start_date, end_date = :end_date, status = :status
+    WHERE project_key = :project_key AND is_deleted = FALSE
+""", project_name="text", total_mm="numeric", project_type="text", scope="text", owner="text",
+    start_date="date", end_date="date", status="text", project_key="text")
+_declare("project_soft_delete", """
+    UPDATE dim_project SET is_deleted = TRUE WHERE project_key = :project_key
+""", project_key="text")
+
+# ============================ Sprints ============================
+_declare("sprints_active", """
+    SELECT s.*
+    FROM sprint_info s
+    JOIN dim_project p ON s.project_key = p.project_key
+    WHERE p.is_deleted = FALSE
+""", tables=("sprint_info", "dim_project"))
+_declare("sprints_by_projects", """
+    SELECT * FROM sprint_info WHERE project_key = ANY(:project_keys)
+""", tables=("sprint_info",), project_keys="text[]")
+_declare("dim_sprints_active", """
+    SELECT d.sprint_name, d.status, d.project_key
+    FROM dim_sprint d
+    JOIN dim_project p ON d.project_key = p.project_key
+    WHERE p.is_deleted = FALSE
+""", tables=("dim_sprint", "dim_project"))
+_declare("dim_sprints_by_projects", """
+    SELECT sprint_name, status, project_key FROM dim_sprint WHERE project_key = ANY(:project_keys)
+""", tables=("dim_sprint",), project_keys="text[]")
+_declare("sprint_upsert", """
+    INSERT INTO sprint_info (sprint_name, project_key, sprint_capacity, updated_at)
+    VALUES (:sprint_name, :project_key, :sprint_capacity, NOW())
+    ON CONFLICT (sprint_name, project_key) DO UPDATE
+    SET sprint_capacity = EXCLUDED.sprint_capacity,
+        updated_at = NOW()
+""", sprint_name="text", project_key="text", sprint_capacity="integer")
+_declare("sprint_update", """
+    UPDATE sprint_info
+    SET sprint_capacity = :sprint_capacity, updated_at = NOW()
+    WHERE sprint_name = :sprint_name AND project_key = :project_key
+""", sprint_capacity="integer", sprint_name="text", project_key="text")
+_declare("sprint_delete", """
+    DELETE FROM sprint_info WHERE sprint_name = :sprint_name AND project_key = :project_key
+""", sprint_name="text", project_key="text")
+
+# Sprint capacity rollup: refresh_capacity_rollup() (migration 0016) holds the SQL so the
+# dim_sprint / dim_project triggers and these writers share it. NULL means every project.
+_declare("capacity_rollup_refresh", """
+    SELECT refresh_capacity_rollup(CAST(:project_keys AS text[]))
+""", project_keys="text[]")
+_declare("capacity_rollup_read", """
+    SELECT project_key, division, period_year, period_num, sprint_count, total_capacity
+    FROM agg_sprint_capacity
+    WHERE period_type = :period_type
+      AND (CAST(:project_keys AS text[]) IS NULL OR project_key = ANY(CAST(:project_keys AS text[])))
+    ORDER BY period_year, period_num, project_key
+""", period_type="text", project_keys="text[]")
+
+# Budget forecast (utils.forecast). The signature changes whenever a project's sprints,
+# capacities or sprint dates change, so only those projects' sprints are re-read.
+_declare("forecast_signatures", """
+    SELECT p.project_key, p.total_mm, COUNT(s.sprint_name) AS sprints,
+        MD5(COALESCE(STRING_AGG(
+            s.sprint_name || ':' || s.sprint_capacity || ':' ||
+            COALESCE(ds.start_date_key, 0) || ':' || COALESCE(ds.end_date_key, 0),
+            ',' ORDER BY s.sprint_name
+        ), '')) AS signature
+    FROM dim_project p
+    LEFT JOIN sprint_info s ON s.project_key = p.project_key
+    LEFT JOIN dim_sprint ds ON ds.sprint_name = s.sprint_name AND ds.project_key = s.project_key
+    WHERE p.is_deleted = FALSE
+    GROUP BY p.project_key, p.total_mm
+""")
+# Sprints placed on the calendar by their date keys; sprints without a start date are skipped.
+# No join to dim_date, which would also drop sprints outside the calendar it covers.
+_declare("forecast_sprints", """
+    SELECT s.project_key, s.sprint_name, s.sprint_capacity, ds.start_date_key, ds.end_date_key
+    FROM sprint_info s
+    JOIN dim_sprint ds ON ds.sprint_name = s.sprint_name AND ds.project_key = s.project_key
+    WHERE s.project_key = ANY(:project_keys) AND ds.start_date_key IS NOT NULL
+""", project_keys="text[]")
+
+# Workflow-weighted progress (utils.progress). refresh_workflow_progress() (migration 0017)
+# holds the SQL so the dim_sprint triggers and these writers share it.
+# A NULL :project_keys refreshes every project.
+_PROGRESS_KEYS = "(CAST(:project_keys AS text[]) IS NULL OR {column} = ANY(CAST(:project_keys AS text[])))"
+_declare("progress_refresh", """
+    SELECT refresh_workflow_progress(CAST(:project_keys AS text[]))
+""", project_keys="text[]")
+_declare("progress_workflow_projects", """
+    SELECT project_key FROM dim_project WHERE scope = :workflow_name AND is_deleted = FALSE
+""", workflow_name="text")
+_declare("progress_projects_read", f"""
+    SELECT pp.project_key, p.project_name, p.scope AS workflow, pp.sprints, pp.unmapped_sprints,
+           pp.total_capacity, pp.done_capacity, pp.done_ratio, pp.updated_at
+    FROM agg_project_progress pp
+    JOIN dim_project p ON p.project_key = pp.project_key
+    WHERE {_PROGRESS_KEYS.format(column="pp.project_key")}
+    ORDER BY pp.project_key
+""", project_keys="text[]")
+_declare("progress_sprints_read", """
+    SELECT sprint_name, status, done_ratio, capacity, capacity * COALESCE(done_ratio, 0) AS done_capacity
+    FROM agg_sprint_progress
+    WHERE project_key = :project_key
+    ORDER BY sprint_name
+""", project_key="text")
+
+# ============================ PCV ============================
+_declare("pcv_rows_all", """
+    SELECT pcv_id, project_key, division, pcv_score, assessment_date, updated_at FROM fact_pcv_metrics
+""")
+_declare("pcv_rows_changed", """
+    SELECT pcv_id, project_key, division, pcv_score, assessment_date, updated_at
+    FROM fact_pcv_metrics
+    WHERE updated_at > :since
+""", since="timestamp")
+_declare("pcv_insert", """
+    INSERT INTO fact_pcv_metrics (project_key, division, pcv_score, assessment_date)
+    VALUES (:project_key, :division, :pcv_score, :assessment_date)
+    ON CONFLICT (project_key, division, assessment_date) DO NOTHING
+    RETURNING pcv_id
+""", project_key="text", division="text", pcv_score="numeric", assessment_date="date")
+_declare("pcv_bulk_insert", """
+    INSERT INTO fact_pcv_metrics (project_key, division, pcv_score, assessment_date)
+    SELECT * FROM unnest(
+        CAST(:project_keys AS text[]),
+        CAST(:divisions AS text[]),
+        CAST(:pcv_scores AS numeric[]),
+        CAST(:assessment_dates AS date[])
+    )
+    ON CONFLICT (project_key, division, assessment_date) DO NOTHING
+    RETURNING pcv_id, project_key, division, assessment_date
+""", project_keys="text[]", divisions="text[]", pcv_scores="numeric[]", assessment_dates="date[]")
+# Updates and deletes return the row as it was, read in the same transaction, for the audit log.
+_PCV_BEFORE = """
+    WITH before AS (
+        SELECT pcv_id, project_key, division, pcv_score, assessment_date
+        FROM fact_pcv_metrics WHERE pcv_id = :pcv_id FOR UPDATE
+    )
+"""
+_declare("pcv_update", _PCV_BEFORE + """
+    UPDATE fact_pcv_metrics f
+    SET pcv_score = :pcv_score,
+        assessment_date = :assessment_date,
+        updated_at = CURRENT_TIMESTAMP
+    FROM before
+    WHERE f.pcv_id = before.pcv_id
+    RETURNING before.project_key, before.division, before.pcv_score, before.assessment_date
+""", pcv_score="numeric", assessment_date="date", pcv_id="integer")
+_declare("pcv_update_with_division", _PCV_BEFORE + """
+    UPDATE fact_pcv_metrics f
+    SET pcv_score = :pcv_score,
+        assessment_date = :assessment_date,
+        division = :division,
+        updated_at = CURRENT_TIMESTAMP
+    FROM before
+    WHERE f.pcv_id = before.pcv_id
+    RETURNING before.project_key, before.division, before.pcv_score, before.assessment_date
+""", pcv_score="numeric", assessment_date="date", division="text", pcv_id="integer")
+_declare("pcv_delete", """
+    DELETE FROM fact_pcv_metrics WHERE pcv_id = :pcv_id
+    RETURNING project_key, division, pcv_score, assessment_date
+""", pcv_id="integer")
+_declare("pcv_recent", """
+    SELECT pcv_id, division, pcv_score, assessment_date
+    FROM fact_pcv_metrics
+    WHERE project_key = :project_key
+    ORDER BY assessment_date DESC, pcv_id DESC
+    LIMIT :limit
+""", tables=("fact_pcv_metrics",), project_key="text", limit="integer")
+# Rolling and lagged scores per division, computed over the project's full history and
+# then thinned to at most :max_points rows per division. Each kept row is the last of its
+# bucket (its window values stay exact); bucket_min/bucket_max keep the range it hides.
+_declare("pcv_trend", """
+    WITH windowed AS (
+        SELECT division, assessment_date, pcv_score,
+            ROUND(AVG(pcv_score) OVER (
+                PARTITION BY division ORDER BY assessment_date ROWS BETWEEN 2 PRECEDING AND CURRENT ROW
+            ), 2) AS rolling_avg_3,
+            ROUND(AVG(pcv_score) OVER (
+                PARTITION BY division ORDER BY assessment_date
+                RANGE BETWEEN INTERVAL '90 days' PRECEDING AND CURRENT ROW
+            ), 2) AS rolling_avg_90d,
+            LAG(pcv_score) OVER (PARTITION BY division ORDER BY assessment_date) AS previous_score,
+            pcv_score - LAG(pcv_score) OVER (PARTITION BY division ORDER BY assessment_date) AS score_change,
+            ROW_NUMBER() OVER (PARTITION BY division ORDER BY assessment_date) AS seq,
+            COUNT(*) OVER (PARTITION BY division) AS assessments
+        FROM fact_pcv_metrics
+        WHERE project_key = :project_key
+    ),
+    bucketed AS (
+        SELECT w.*, (seq - 1) * :max_points / assessments AS bucket FROM windowed w
+    ),
+    ranked AS (
+        SELECT b.*,
+            MIN(pcv_score) OVER (PARTITION BY division, bucket) AS bucket_min,
+            MAX(pcv_score) OVER (PARTITION BY division, bucket) AS bucket_max,
+            ROW_NUMBER() OVER (PARTITION BY division, bucket ORDER BY seq DESC) AS bucket_rank
+        FROM bucketed b
+    )
+    SELECT division, assessment_date, pcv_score, rolling_avg_3, rolling_avg_90d,
+           previous_score, score_change, assessments, bucket_min, bucket_max
+    FROM ranked
+    WHERE bucket_rank = 1
+    ORDER BY division, assessment_date
+""", tables=("fact_pcv_metrics",), project_key="text", max_points="integer")
+_declare("pcv_stats_by_division", """
+    SELECT
+        division,
+        COUNT(*) AS total_assessments,
+        ROUND(AVG(pcv_score), 2) AS avg_score,
+        COUNT(DISTINCT project_key) AS unique_projects,
+        MAX(assessment_date) AS latest_assessment
+    FROM fact_pcv_metrics
+    GROUP BY division
+    ORDER BY division
+""", tables=("fact_pcv_metrics",))
+
+# ============================ Workflows ============================
+_declare("workflows_all", """
+    SELECT * FROM workflow ORDER BY workflow_name
+""")
+_declare("workflow_statuses_all", """
+    SELECT * FROM workflow_status
+""")
+_declare("status_names", """
+    SELECT status_name FROM dim_status ORDER BY status_name
+""")
+_declare("workflow_insert", """
+    INSERT INTO workflow (workflow_name) VALUES (:workflow_name) ON CONFLICT (workflow_name) DO NOTHING
+""", workflow_name="text")
+_declare("workflow_delete", """
+    DELETE FROM workflow WHERE workflow_id = :workflow_id
+""", workflow_id="integer")
+_declare("workflow_status_delete_many", """
+    DELETE FROM workflow_status WHERE status_id = ANY(:status_ids)
+""", status_ids="integer[]")
+_declare("workflow_status_insert", """
+    INSERT INTO workflow_status (workflow_id, status_name, done_ratio)
+    VALUES (:workflow_id, :status_name, :done_ratio)
+    ON CONFLICT (workflow_id, status_name) DO NOTHING
+""", workflow_id="integer", status_name="text", done_ratio="numeric")
+_declare("workflow_status_update", """
+    UPDATE workflow_status SET status_name = :status_name, done_ratio = :done_ratio WHERE status_id = :status_id
+""", status_name="text", done_ratio="numeric", status_id="integer")
+
+# ============================ Presales ============================
+# Held for the rest of the transaction; serializes fact_deals loads and cube rebuilds.
+_declare("deals_load_lock", """
+    SELECT pg_advisory_xact_lock(7340292)
+""")
+_declare("deals_bulk_merge", """
+    INSERT INTO fact_deals (
+        deal_name, project_type, deal_amount, deal_received_date, proposal_sent_date,
+        pending_date, lost_date, won_date, division, division_1_pct, division_2_pct,
+        reasons, status, period_date_key
+    )
+    SELECT * FROM unnest(
+        CAST(:deal_names AS text[]),
+        CAST(:project_types AS text[]),
+        CAST(:deal_amounts AS numeric[]),
+        CAST(:deal_received_dates AS timestamp[]),
+        CAST(:proposal_sent_dates AS timestamp[]),
+        CAST(:pending_dates AS timestamp[]),
+        CAST(:lost_dates AS timestamp[]),
+        CAST(:won_dates AS timestamp[]),
+        CAST(:divisions AS text[]),
+        CAST(:division_1_pcts AS text[]),
+        CAST(:division_2_pcts AS text[]),
+        CAST(:reasons AS text[]),
+        CAST(:statuses AS text[]),
+        CAST(:period_date_keys AS integer[])
+    )
+    ON CONFLICT (deal_name) DO UPDATE
+    SET project_type = EXCLUDED.project_type,
+        deal_amount = EXCLUDED.deal_amount,
+        deal_received_date = EXCLUDED.deal_received_date,
+        proposal_sent_date = EXCLUDED.proposal_sent_date,
+        pending_date = EXCLUDED.pending_date,
+        lost_date = EXCLUDED.lost_date,
+        won_date = EXCLUDED.won_date,
+        division = EXCLUDED.division,
+        division_1_pct = EXCLUDED.division_1_pct,
+        division_2_pct = EXCLUDED.division_2_pct,
+        reasons = EXCLUDED.reasons,
+        status = EXCLUDED.status,
+        period_date_key = EXCLUDED.period_date_key
+""", deal_names="text[]", project_types="text[]", deal_amounts="numeric[]",
+    deal_received_dates="timestamp[]", proposal_sent_dates="timestamp[]", pending_dates="timestamp[]",
+    lost_dates="timestamp[]", won_dates="timestamp[]", divisions="text[]", division_1_pcts="text[]",
+    division_2_pcts="text[]", reasons="text[]", statuses="text[]", period_date_keys="integer[]")
+_declare("deals_cube_clear", """
+    DELETE FROM agg_deals_cube
+""")
+_declare("deals_cube_fill", """
+    INSERT INTO agg_deals_cube
+        (year, quarter, month, iso_year, week, division, status, project_type, deal_count, total_amount)
+    SELECT
+        dd.year, dd.quarter, dd.month, dd.iso_year, dd.week,
+        COALESCE(f.division, 'Unassigned'),
+        f.status,
+        COALESCE(f.project_type, 'Other'),
+        COUNT(*),
+        COALESCE(SUM(f.deal_amount), 0)
+    FROM fact_deals f
+    LEFT JOIN dim_date dd ON dd.date_key = f.period_date_key
+    GROUP BY dd.year, dd.quarter, dd.month, dd.iso_year, dd.week,
+             COALESCE(f.division, 'Unassigned'), f.status, COALESCE(f.project_type, 'Other')
+""")
+_declare("deals_cube_read", """
+    SELECT year, quarter, month, iso_year, week, division, status, project_type, deal_count, total_amount
+    FROM agg_deals_cube
+""")
+
+
+# ============================ Jobs ============================
+_declare("import_job_insert", """
+    INSERT INTO import_jobs (kind, file_name, submitted_by)
+    VALUES (:kind, :file_name, :submitted_by)
+    RETURNING job_id
+""", kind="text", file_name="text", submitted_by="text")
+_declare("import_job_progress", """
+    UPDATE import_jobs
+    SET status = :status, progress = :progress, message = :message,
+        started_at = COALESCE(started_at, CASE WHEN :status = 'running' THEN NOW() END),
+        finished_at = CASE WHEN :status IN ('succeeded', 'failed') THEN NOW() END
+    WHERE job_id = :job_id
+""", status="text", progress="numeric", message="text", job_id="bigint")
+_declare("import_job_finish", """
+    UPDATE import_jobs
+    SET status = :status, progress = 1, message = :message, rows_loaded = :rows_loaded,
+        rows_rejected = :rows_rejected, finished_at = NOW()
+    WHERE job_id = :job_id
+""", status="text", message="text", rows_loaded="integer", rows_rejected="integer", job_id="bigint")
+_declare("import_jobs_recent", """
+    SELECT job_id, kind, file_name, submitted_by, status, progress, message, rows_loaded,
+           rows_rejected, created_at, started_at, finished_at
+    FROM import_jobs
+    ORDER BY job_id DESC
+    LIMIT :limit
+""", limit="integer")
+_declare("import_jobs_heartbeat", """
+    UPDATE import_jobs SET heartbeat_at = NOW()
+    WHERE job_id = ANY(:job_ids) AND status IN ('queued', 'running')
+""", job_ids="bigint[]")
+# Jobs whose server process stopped bumping their heartbeat (it restarted or died).
+_declare("import_jobs_orphaned", """
+    UPDATE import_jobs
+    SET status = 'failed', message = 'Interrupted: the server running it stopped', finished_at = NOW()
+    WHERE status IN ('queued', 'running')
+      AND COALESCE(heartbeat_at, created_at) < NOW() - make_interval(secs => :stale_seconds)
+""", stale_seconds="integer")
+_declare("import_rejects_insert", """
+    INSERT INTO import_rejects (job_id, file_name, sheet, row_number, reject_reasons, row_data)
+    SELECT :job_id, file_name, sheet, row_number, reject_reasons, CAST(row_data AS jsonb)
+    FROM unnest(
+        CAST(:file_names AS text[]), CAST(:sheets AS text[]), CAST(:row_numbers AS integer[]),
+        CAST(:reject_reasons AS text[]), CAST(:row_data AS text[])
+    ) AS r (file_name, sheet, row_number, reject_reasons, row_data)
+""", job_id="bigint", file_names="text[]", sheets="text[]", row_numbers="integer[]",
+    reject_reasons="text[]", row_data="text[]")
+_declare("import_rejects_for_job", """
+    SELECT file_name, sheet, row_number, reject_reasons, row_data
+    FROM import_rejects
+    WHERE job_id = :job_id
+    ORDER BY file_name, sheet, row_number
+""", job_id="bigint")
+
+# ============================ Exports ============================
+# :owner NULL exports every row; otherwise only rows of projects the owner manages.
+_OWNED_PROJECTS = "(CAST(:owner AS text) IS NULL OR project_key IN (SELECT project_key FROM dim_project WHERE owner = :owner))"
+_declare("export_pcv_metrics", f"""
+    SELECT pcv_id, project_key, division, pcv_score, assessment_date, updated_at
+    FROM fact_pcv_metrics
+    WHERE {_OWNED_PROJECTS}
+    ORDER BY pcv_id
+""", owner="text")
+_declare("export_sprint_info", f"""
+    SELECT sprint_name, project_key, sprint_capacity, updated_at
+    FROM sprint_info
+    WHERE {_OWNED_PROJECTS}
+    ORDER BY project_key, sprint_name
+""", owner="text")
+_declare("export_projects", f"""
+    SELECT {_PROJECT_COLUMNS}, division, is_deleted
+    FROM dim_project
+    WHERE {_OWNED_PROJECTS}
+    ORDER BY project_key
+""", owner="text")
+_declare("export_deals", """
+    SELECT deal_name, project_type, deal_amount, deal_received_date, proposal_sent_date,
+           pending_date, lost_date, won_date, division, division_1_pct, division_2_pct,
+           reasons, status
+    FROM fact_deals
+""")
+
+# ============================ Change tracking ============================
+_declare("table_versions", """
+    SELECT table_name, version FROM table_versions WHERE table_name = ANY(:table_names)
+""", table_names="text[]")
+
+_declare("db_clock", """
+    SELECT CAST(clock_timestamp() AS timestamp) AS now
+""")
+_declare("tombstones_since", """
+    SELECT row_key FROM row_tombstones WHERE table_name = :table_name AND deleted_at > :since
+""", table_name="text", since="timestamp")
+
+# ============================ Execution ============================
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def _prepared_sql(query):
+    """Rewrite ``:name`` placeholders to ``$n`` positions for ``PREPARE``."""
+    positions = {name: i + 1 for i, (name, _) in enumerate(query.params)}
+    return _PARAM_PATTERN.sub(lambda m: f"${positions[m.group(1)]}", query.sql)
+
+
+def _coerce(value, pg_type):
+    if pg_type.endswith("[]"):
+        return None if value is None else [_coerce(v, pg_type[:-2]) for v in value]
+    # NaT subclasses datetime, so it needs its own check.
+    if value is None or value is pd.NaT or (not isinstance(value, (str, date)) and pd.isna(value)):
+        return None
+    if isinstance(value, pd.Timestamp):
+        value = value.to_pydatetime()
+    return _COERCE.get(pg_type, lambda v: v)(value)
+
+
+def _prepare_enabled():
+    """Prepared statements can be switched off (e.g. behind a transaction-mode pooler)."""
+    try:
+        return bool(st.secrets.get("queries", {}).get("prepare", True))
+    except Exception:
+        return True
+
+
+def _record(name, elapsed):
+    with _stats_lock:
+        calls, total, worst = _stats.get(name, (0, 0.0, 0.0))
+        _stats[name] = (calls + 1, total + elapsed, max(worst, elapsed))
+    metrics.observe_query(name, elapsed)
+
+
+def execute(connection, name, /, **params):
+    """Execute a catalogued statement.
+
+    Args:
+        connection: An open SQLAlchemy Connection or Session (the caller owns the transaction).
+        name (str): Catalog name of the statement.
+        **params: Values for the statement's declared parameters.
+
+    Returns:
+        sqlalchemy.engine.CursorResult: The statement result.
+    """
+    query = QUERIES[name]
+    missing = [p for p, _ in query.params if p not in params]
+    if missing:
+        raise TypeError(f"Query {name!r} missing parameters: {', '.join(missing)}")
+    values = {p: _coerce(params[p], pg_type) for p, pg_type in query.params}
+
+    if isinstance(connection, Session):
+        connection = connection.connection()
+
+    start = time.perf_counter()
+    if _prepare_enabled():
+        prepared = connection.info.setdefault("prepared_queries", set())
+        if name not in prepared:
+            types = ", ".join(pg_type for _, pg_type in query.params)
+            signature = f"{name} ({types})" if types else name
+            connection.exec_driver_sql(f"PREPARE {signature} AS {_prepared_sql(query)}")
+            prepared.add(name)
+        args = ", ".join(f":{p}" for p, _ in query.params)
+        result = connection.execute(text(f"EXECUTE {name} ({args})" if args else f"EXECUTE {name}"), values)
+    else:
+        result = connection.execute(text(query.sql), values)
+    _record(name, time.perf_counter() - start)
+    return result
+
+
+def fetch_frame(connection, name, /, **params):
+    """Execute a catalogued read on ``connection`` and return the rows as a DataFrame."""
+    result = execute(connection, name, **params)
+    return pd.DataFrame.from_records(result.fetchall(), columns=list(result.keys()), coerce_float=True)
+
+
+def explain(connection, name, /, **params):
+    """Plan of a catalogued statement for these parameter values.
+
+    Returns:
+        dict: The top node of ``EXPLAIN (FORMAT JSON)``.
+    """
+    query = QUERIES[name]
+    values = {p: _coerce(params[p], pg_type) for p, pg_type in query.params}
+    plan = connection.execute(text(f"EXPLAIN (FORMAT JSON) {query.sql}"), values).scalar()
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]["Plan"]
+
+
+def stream_batches(connection, name, /, batch_size=10_000, **params):
+    """Execute a catalogued read through a server-side cursor, yielding rows in batches.
+
+    Runs unprepared: PostgreSQL cursors cannot be declared over ``EXECUTE``.
+
+    Args:
+        connection: An open SQLAlchemy Connection (the caller owns the transaction).
+        name (str): Catalog name of the statement.
+        batch_size (int): Rows fetched from the server per round trip.
+        **params: Values for the statement's declared parameters.
+
+    Yields:
+        tuple[list[str], list[tuple], list]: Column names, a batch of rows, and the DBAPI
+        cursor description (for column types). An empty result yields one empty batch.
+    """
+    query = QUERIES[name]
+    values = {p: _coerce(params[p], pg_type) for p, pg_type in query.params}
+    start = time.perf_counter()
+    result = connection.execution_options(stream_results=True, yield_per=batch_size).execute(
+        text(query.sql), values
+    )
+    columns = list(result.keys())
+    description = result.cursor.description
+    empty = True
+    for partition in result.partitions():
+        empty = False
+        yield columns, [tuple(row) for row in partition], description
+    if empty:
+        yield columns, [], description
+    _record(name, time.perf_counter() - start)
+
+
+def run_query(name, /, **params):
+    """Run a catalogued read on a pooled connection and return a DataFrame.
+
+    Reads are routed by ``utils.db.read_engine``: to the read replica when one is
+    configured, or to the primary while this session's last write is not yet replicated.
+    Transient connection errors (e.g. the endpoint resuming from suspend) are retried.
+
+    Args:
+        name (str): Catalog name of the statement.
+        **params: Values for the statement's declared parameters.
+
+    Returns:
+        pd.DataFrame: The result rows.
+    """
+    return with_retry(_run_read, name, params)
+
+
+def _run_read(name, params):
+    with read_engine().connect() as connection:
+        df = fetch_frame(connection, name, **params)
+        connection.commit()
+    return df
+
+
+def get_query_stats():
+    """Per-statement latency statistics collected in this process.
+
+    Returns:
+        pd.DataFrame: Columns query, calls, total_ms, avg_ms, max_ms; slowest total first.
+    """
+    with _stats_lock:
+        rows = [
+            {"query": name, "calls": calls, "total_ms": total * 1000,
+             "avg_ms": total * 1000 / calls, "max_ms": worst * 1000}
+            for name, (calls, total, worst) in _stats.items()
+        ]
+    if not rows:
+        return pd.DataFrame(columns=["query", "calls", "total_ms", "avg_ms", "max_ms"])
+    return pd.DataFrame(rows).sort_values("total_ms", ascending=False, ignore_index=True)
@@ -0,0 +1,126 @@
+"""Server-side login sessions.
+
+A login creates a row in ``app_sessions`` and gives the browser an opaque token,
+``<session id>.<HMAC of the id>``, in the ``session_token`` cookie. Nothing about the
+user is stored client-side: role and name are read from ``app_users`` when a token is
+resolved, and a session can be revoked (logout, password change) or expire.
+
+The token is read from ``st.context.cookies``, which Streamlit fills from the page
+request, so opening a page needs no cookie component round trip. The first run of a
+browser session resolves the token with one query; after that the user is kept in
+``st.session_state`` and rechecked only every ``REVALIDATE_SECONDS``.
+
+Configure the signing key in ``.streamlit/secrets.toml`` (the same on every replica);
+without it no token can be issued or resolved:
+
+    [sessions]
+    secret = "long random string"
+    lifetime_days = 7
+"""
+import hashlib
+import hmac
+import secrets
+import time
+from datetime import datetime, timedelta
+
+import streamlit as st
+
+from utils.db import primary_connection
+from utils.queries import execute, run_query
+from utils.metrics import query_helper
+
+SESSION_COOKIE = "session_token"
+DEFAULT_LIFETIME_DAYS = 7
+REVALIDATE_SECONDS = 300
+PURGE_AFTER = timedelta(days=1)
+
+def _config():
+    try:
+        config = dict(st.secrets.get("sessions", {}))
+    except Exception:
+        config = {}
+    secret = config.get("secret")
+    if not secret:
+        raise RuntimeError("No [sessions] secret configured in .streamlit/secrets.toml")
+    return secret.encode(), int(config.get("lifetime_days", DEFAULT_LIFETIME_DAYS))
+
+
+def _sign(session_id):
+    return hmac.new(_config()[0], session_id.encode(), hashlib.sha256).hexdigest()
+
+
+def session_id_of(token):
+    """The session id of a correctly signed token, else None."""
+    if not isinstance(token, str):
+        return None
+    session_id, _, signature = token.partition(".")
+    if not session_id or not hmac.compare_digest(_sign(session_id), signature):
+        return None
+    return session_id
+
+
+@query_helper
+def create_session(email):
+    """Start a session for a user who just logged in.
+
+    Returns:
+        tuple[str, datetime]: The token for the cookie and when it expires.
+    """
+    session_id = secrets.token_urlsafe(32)
+    expires_at = datetime.now() + timedelta(days=_config()[1])
+    with primary_connection().engine.begin() as connection:
+        execute(connection, "app_session_insert", session_id=session_id, email=email, expires_at=expires_at)
+        execute(connection, "app_sessions_purge", before=datetime.now() - PURGE_AFTER)
+    return f"{session_id}.{_sign(session_id)}", expires_at
+
+
+def resolve(token):
+    """The user behind a token, if it is signed, unexpired and not revoked.
+
+    Returns:
+        dict | None: ``session_id``, ``email``, ``username`` and ``role``.
+    """
+    session_id = session_id_of(token)
+    return None if session_id is None else _lookup(session_id)
+
+
+@query_helper
+def _lookup(session_id):
+    df = run_query("app_session_lookup", session_id=session_id)
+    if df.empty:
+        return None
+    row = df.iloc[0]
+    return {"session_id": session_id, "email": row["email"], "username": row["username"], "role": row["role"]}
+
+
+def revalidate(session_id):
+    """Re-read a live session's user, at most once every ``REVALIDATE_SECONDS`` per browser session.
+
+    Returns:
+        dict | None: As ``resolve``; None once the session was revoked or expired.
+    """
+    checked = st.session_state.get("_session_checked_at", 0)
+    if time.monotonic() - checked < REVALIDATE_SECONDS:
+        return st.session_state.get("_session_user")
+    user = _lookup(session_id)
+    remember(user)
+    return user
+
+
+def remember(user):
+    """Keep a resolved user in ``st.session_state`` until the next revalidation."""
+    st.session_state["_session_user"] = user
+    st.session_state["_session_checked_at"] = time.monotonic()
+
+
+@query_helper
+def revoke(session_id):
+    """End one session (logout)."""
+    with primary_connection().engine.begin() as connection:
+        execute(connection, "app_session_revoke", session_id=session_id)
+
+
+@query_helper
+def revoke_user(connection, email):
+    """End every session of a user, in the caller's transaction (password change)."""
+    execute(connection, "app_sessions_revoke_user", email=email)
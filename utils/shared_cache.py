@@ -0,0 +1,228 @@
+"""Optional disk-backed result cache shared by all app processes.
+
+``st.cache_data`` and the snapshot cache live in process memory, so every replica
+and every restart starts cold. When a path is configured, cached readers fall back
+to this SQLite file after their in-memory layer and before the database:
+
+    in-memory miss -> shared cache hit? -> else run the query and store it here
+
+Entries are tagged with the tables they read and the ``table_versions`` counters at
+the time they were stored (see ``utils.snapshot_cache``), so a hit is only served
+while none of those tables changed, in any process. Storing a newer result drops the
+entries tagged with an older version of its tables, and ``invalidate(*tables)`` drops
+them explicitly. Frames are pickled, which keeps every dtype exactly; the file must
+therefore sit on a volume only the app writes to.
+
+Configure it in ``.streamlit/secrets.toml`` (all workers on one host pointing at the
+same file; SQLite locking is not reliable on network filesystems):
+
+    [shared_cache]
+    path = "/var/cache/prj_manage/results.sqlite"
+    max_mb = 256
+"""
+import hashlib
+import pickle
+import sqlite3
+import threading
+import time
+
+import streamlit as st
+
+DEFAULT_MAX_MB = 256
+BUSY_TIMEOUT_SECONDS = 5
+
+_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS entries (
+        key TEXT PRIMARY KEY,
+        query_name TEXT NOT NULL,
+        payload BLOB NOT NULL,
+        stored_at REAL NOT NULL,
+        last_used REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS entry_tables (
+        key TEXT NOT NULL REFERENCES entries (key) ON DELETE CASCADE,
+        table_name TEXT NOT NULL,
+        version INTEGER NOT NULL,
+        PRIMARY KEY (key, table_name)
+    );
+    CREATE INDEX IF NOT EXISTS ix_entry_tables_table ON entry_tables (table_name, version);
+"""
+
+_local = threading.local()
+_stats_lock = threading.Lock()
+_stats = {"hits": 0, "misses": 0, "stores": 0, "errors": 0}
+
+
+def _config():
+    try:
+        config = dict(st.secrets.get("shared_cache", {}))
+    except Exception:
+        config = {}
+    return config.get("path"), float(config.get("max_mb", DEFAULT_MAX_MB))
+
+
+def enabled():
+    """True when a cache file is configured."""
+    return bool(_config()[0])
+
+
+def _connection():
+    """SQLite connection for this thread, created (with the schema) on first use."""
+    path = _config()[0]
+    connection = getattr(_local, "connection", None)
+    if connection is None or getattr(_local, "path", None) != path:
+        connection = sqlite3.connect(path, timeout=BUSY_TIMEOUT_SECONDS, isolation_level=None)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA foreign_keys=ON")
+        connection.executescript(_SCHEMA)
+        _local.connection, _local.path = connection, path
+    return connection
+
+
+def _count(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+
+def _entry_key(query_name, params):
+    items = sorted((k, list(v) if isinstance(v, (list, tuple, set)) else v) for k, v in params.items())
+    return hashlib.sha256(repr((query_name, items)).encode()).hexdigest()
+
+
+def get(query_name, params, versions):
+    """Cached frame for a query if it was stored at exactly ``versions``, else None.
+
+    Args:
+        query_name (str): Name of the statement in ``utils.queries``.
+        params (dict): Its parameters.
+        versions (dict[str, int]): Current counters of the tables the query reads.
+    """
+    if not enabled():
+        return None
+    key = _entry_key(query_name, params)
+    try:
+        connection = _connection()
+        stored = dict(connection.execute(
+            "SELECT table_name, version FROM entry_tables WHERE key = ?", (key,)
+        ).fetchall())
+        row = connection.execute("SELECT payload FROM entries WHERE key = ?", (key,)).fetchone()
+        if row is None or stored != versions:
+            _count("misses")
+            return None
+        connection.execute("UPDATE entries SET last_used = ? WHERE key = ?", (time.time(), key))
+        _count("hits")
+        return pickle.loads(row[0])
+    except Exception as e:
+        _count("errors")
+        print(f"Shared cache read failed: {e}")
+        return None
+
+
+def put(query_name, params, versions, df):
+    """Store a result tagged with its tables' counters.
+
+    Entries tagged with an older version of any of these tables are dropped, since
+    they can never be served again.
+    """
+    if not enabled():
+        return
+    key = _entry_key(query_name, params)
+    payload = pickle.dumps(df, protocol=pickle.HIGHEST_PROTOCOL)
+    now = time.time()
+    try:
+        connection = _connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            for table, version in versions.items():
+                connection.execute(
+                    "DELETE FROM entries WHERE key IN "
+                    "(SELECT key FROM entry_tables WHERE table_name = ? AND version < ?)",
+                    (table, version)
+                )
+            connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+            connection.execute(
+                "INSERT INTO entries (key, query_name, payload, stored_at, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, query_name, payload, now, now)
+            )
+            connection.executemany(
+                "INSERT INTO entry_tables (key, table_name, version) VALUES (?, ?, ?)",
+                [(key, table, int(version)) for table, version in versions.items()]
+            )
+        _count("stores")
+        _prune(connection)
+    except Exception as e:
+        _count("errors")
+        print(f"Shared cache write failed: {e}")
+
+
+def _prune(connection):
+    """Drop least recently used entries while the payloads exceed ``max_mb``."""
+    limit = _config()[1] * 1024 * 1024
+    total = connection.execute("SELECT COALESCE(SUM(LENGTH(payload)), 0) FROM entries").fetchone()[0]
+    if total <= limit:
+        return
+    with connection:
+        connection.execute("BEGIN IMMEDIATE")
+        for key, size in connection.execute(
+            "SELECT key, LENGTH(payload) FROM entries ORDER BY last_used"
+        ).fetchall():
+            if total <= limit:
+                break
+            connection.execute("DELETE FROM entries WHERE key = ?", (key,))
+            total -= size
+
+
+def fetch(query_name, /, **params):
+    """Run a catalogued read through the shared cache.
+
+    For readers that already have their own in-memory layer (``st.cache_data``).
+    Without a configured path this is just ``run_query``.
+
+    Returns:
+        pd.DataFrame: The query result.
+    """
+    from utils.queries import run_query
+    from utils.snapshot_cache import current_versions, source_tables
+
+    if not enabled():
+        return run_query(query_name, **params)
+    versions = current_versions(source_tables(query_name))
+    df = get(query_name, params, versions)
+    if df is None:
+        df = run_query(query_name, **params)
+        put(query_name, params, versions, df)
+    return df
+
+
+def invalidate(*tables):
+    """Drop every entry that read any of ``tables`` (all entries if none are given)."""
+    if not enabled():
+        return
+    try:
+        connection = _connection()
+        with connection:
+            if tables:
+                connection.execute(
+                    f"DELETE FROM entries WHERE key IN (SELECT key FROM entry_tables "
+                    f"WHERE table_name IN ({', '.join('?' * len(tables))}))",
+                    tables
+                )
+            else:
+                connection.execute("DELETE FROM entries")
+    except Exception as e:
+        _count("errors")
+        print(f"Shared cache invalidation failed: {e}")
+
+
+def get_shared_cache_stats():
+    """Hit/miss/store/error counts of this process, plus the entry count of the file."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["entries"] = None
+    if enabled():
+        try:
+            stats["entries"] = _connection().execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+        except Exception:
+            pass
+    return stats
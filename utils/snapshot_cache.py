@@ -0,0 +1,102 @@
+"""Version-stamped snapshots of catalogued reads.
+
+Each table in ``VERSIONED_TABLES`` has a change counter in ``table_versions`` that a
+statement-level trigger bumps on every write (migration 0006). A snapshot stores the
+result of a catalogued query together with the counters of the tables it declares; a
+lookup revalidates with one primary-key query on ``table_versions`` and re-runs the
+full query only when a counter moved. A miss here is tried against the optional
+on-disk ``utils.shared_cache`` before the database.
+
+Usage:
+    df = get_snapshot("projects_brief_all")
+"""
+import threading
+from collections import OrderedDict
+
+from utils import shared_cache
+from utils.queries import QUERIES, run_query
+
+# Tables with a change counter trigger (see migrations 0006 and 0007).
+VERSIONED_TABLES = frozenset({
+    "app_users", "dim_user", "dim_status", "workflow", "workflow_status",
+    "dim_project", "dim_sprint", "sprint_info", "fact_pcv_metrics",
+})
+MAX_SNAPSHOTS = 256
+
+_lock = threading.Lock()
+_snapshots = OrderedDict()
+_stats = {"hits": 0, "misses": 0}
+
+
+def source_tables(query_name):
+    """Tables read by a catalogued query, as declared in ``utils.queries``.
+
+    Raises:
+        ValueError: If the query declares no tables, or one without a change counter.
+    """
+    tables = QUERIES[query_name].tables
+    if not tables:
+        raise ValueError(f"Query {query_name!r} declares no source tables")
+    untracked = tables - VERSIONED_TABLES
+    if untracked:
+        raise ValueError(f"Query {query_name!r} reads unversioned tables: {', '.join(sorted(untracked))}")
+    return tables
+
+
+def current_versions(tables):
+    """Return ``{table: version}`` for ``tables`` in one round trip."""
+    df = run_query("table_versions", table_names=sorted(tables))
+    return dict(zip(df["table_name"], df["version"].astype(int)))
+
+
+def _key(query_name, params):
+    return query_name, tuple(sorted(
+        (k, tuple(v) if isinstance(v, (list, tuple, set)) else v) for k, v in params.items()
+    ))
+
+
+def get_snapshot(query_name, /, **params):
+    """Run a catalogued read, reusing the last result while its tables are unchanged.
+
+    Args:
+        query_name (str): Name of the statement in ``utils.queries``.
+        **params: Parameters of the statement.
+
+    Returns:
+        pd.DataFrame: The query result (a copy; callers may modify it).
+    """
+    key = _key(query_name, params)
+    # Read the stamp before the data: a write landing in between leaves an older stamp
+    # on newer rows, which only causes one extra reload.
+    versions = current_versions(source_tables(query_name))
+
+    with _lock:
+        cached = _snapshots.get(key)
+        if cached is not None and cached[0] == versions:
+            _snapshots.move_to_end(key)
+            _stats["hits"] += 1
+            return cached[1].copy()
+        _stats["misses"] += 1
+
+    df = shared_cache.get(query_name, params, versions)
+    if df is None:
+        df = run_query(query_name, **params)
+        shared_cache.put(query_name, params, versions, df)
+    with _lock:
+        _snapshots[key] = (versions, df)
+        _snapshots.move_to_end(key)
+        while len(_snapshots) > MAX_SNAPSHOTS:
+            _snapshots.popitem(last=False)
+    return df.copy()
+
+
+def clear():
+    """Drop every snapshot."""
+    with _lock:
+        _snapshots.clear()
+
+
+def get_snapshot_stats():
+    """Hit and miss counts since the process started."""
+    with _lock:
+        return dict(_stats, size=len(_snapshots))
@@ -0,0 +1,55 @@
+import streamlit as st
+import pandas as pd
+from utils.queries import run_query, execute
+from utils.metrics import query_helper
+
+PERIOD_TYPES = ["week", "month", "quarter"]
+
+
+@query_helper
+def rebuild_capacity_rollup(session):
+    """Recompute the whole capacity rollup from sprint_info.
+
+    Args:
+        session: An open SQLAlchemy session; the caller commits.
+    """
+    execute(session, "capacity_rollup_refresh", project_keys=None)
+
+
+@query_helper
+def refresh_capacity_rollup(session, project_key):
+    """Recompute the capacity rollup rows of a single project.
+
+    Call this in the same transaction as any write to sprint_info so the rollup
+    never drifts from the sprint rows it summarizes. Changes to dim_sprint dates and
+    project divisions are picked up by triggers.
+
+    Args:
+        session: An open SQLAlchemy session; the caller commits.
+        project_key (str): The project whose sprints changed.
+    """
+    execute(session, "capacity_rollup_refresh", project_keys=[project_key])
+
+
+@st.cache_data(ttl=60, show_spinner=False)
+@query_helper
+def get_capacity_rollup(period_type="month", project_keys=None):
+    """Read capacity totals from the rollup table.
+
+    Args:
+        period_type (str): One of 'week', 'month' or 'quarter'.
+        project_keys (tuple[str] | None): Restrict to these projects; None means all.
+
+    Returns:
+        pd.DataFrame: One row per project, division and period. Weeks are ISO weeks and
+        their ``period_year`` is the ISO year.
+    """
+    try:
+        return run_query(
+            "capacity_rollup_read",
+            period_type=period_type,
+            project_keys=list(project_keys) if project_keys is not None else None
+        )
+    except Exception as e:
+        st.error(f"Error loading capacity rollup: {e}")
+        return pd.DataFrame()